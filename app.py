@@ -1,8 +1,11 @@
 from dash import Dash
 import dash_bootstrap_components as dbc
+from flask import jsonify
 
 from components.layout import create_layout
 from components.callbacks import register_callbacks
+from utils.admission import admission_stats
+from utils.tracing import stage_histograms
 from utils.data_loader import setup_fastf1_cache
 
 # Create cache directory if it doesn't exist
@@ -21,6 +24,16 @@ app.layout = create_layout()
 # Register all callbacks
 register_callbacks(app)
 
+# Queue depth and wait times of the load/render admission control, per worker
+@app.server.route('/metrics/admission')
+def admission_metrics():
+    return jsonify(admission_stats())
+
+# Latency histograms of the load, cache and render stages, per worker
+@app.server.route('/metrics/stages')
+def stage_metrics():
+    return jsonify(stage_histograms())
+
 # Run the app
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
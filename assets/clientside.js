@@ -0,0 +1,323 @@
+/*
+ * Client-side callbacks for the F1 dashboard.
+ *
+ * Lap views in line/scatter style are rendered in the browser from the
+ * compact per-session lap dataset the server ships into the 'lap-dataset'
+ * store, so compound filtering, driver selection and plot-style switching
+ * never need a server round-trip.
+ */
+(function () {
+    var CLIENTSIDE_LAP_VIEWS = ['laptimes', 'lap_distribution'];
+    var CLIENTSIDE_PLOT_STYLES = ['line', 'scatter'];
+
+    // Session seconds of one replay-tick interval at 1x speed
+    var REPLAY_TICK_SECONDS = 0.2;
+
+    // Replay windows received from the server, by window index, for one session
+    var replayWindows = {};
+    var replayKey = null;
+
+    function rememberReplayWindow(buffer) {
+        var key = JSON.stringify(buffer.key);
+        if (key !== replayKey) {
+            replayWindows = {};
+            replayKey = key;
+        }
+        replayWindows[buffer.window] = buffer;
+        // Only the current and next windows are needed
+        Object.keys(replayWindows).forEach(function (window) {
+            if (window < buffer.window - 1) {
+                delete replayWindows[window];
+            }
+        });
+    }
+
+    function formatReplayClock(seconds) {
+        var minutes = Math.floor(seconds / 60);
+        var rest = Math.floor(seconds - minutes * 60);
+        return minutes + ':' + (rest < 10 ? '0' : '') + rest;
+    }
+
+    function isClientsideLapView(vizType, plotStyle, drivers, analysisOptions) {
+        if (CLIENTSIDE_LAP_VIEWS.indexOf(vizType) < 0 || CLIENTSIDE_PLOT_STYLES.indexOf(plotStyle) < 0) {
+            return false;
+        }
+        // Lap times colored by weather need the server's weather join
+        if (vizType === 'laptimes' && analysisOptions && analysisOptions.indexOf('track_temp') >= 0) {
+            return false;
+        }
+        // The server shows the "select a driver" message for lap times
+        return vizType !== 'laptimes' || (drivers && drivers.length > 0);
+    }
+
+    function message(text) {
+        return {type: 'Div', namespace: 'dash_html_components', props: {children: text}};
+    }
+
+    // Format seconds like a lap time, e.g. 92.123 -> "1:32.123"
+    function formatLapTime(seconds) {
+        var minutes = Math.floor(seconds / 60);
+        var rest = (seconds - minutes * 60).toFixed(3);
+        return minutes + ':' + (rest < 10 ? '0' : '') + rest;
+    }
+
+    // Decode the laps passing the driver, compound and clean-lap filters into row objects
+    function selectLaps(dataset, drivers, compoundFilter, cleanOnly) {
+        var strings = dataset.strings;
+        var columns = dataset.columns;
+        var driverSet = drivers ? new Set(drivers) : null;
+        var compoundSet = compoundFilter && compoundFilter.length > 0 ? new Set(compoundFilter) : null;
+        var laps = [];
+
+        for (var i = 0; i < columns.lap_time.length; i++) {
+            var driver = strings[columns.driver[i]];
+            var compound = strings[columns.compound[i]];
+            if ((driverSet && !driverSet.has(driver)) || (compoundSet && !compoundSet.has(compound))) {
+                continue;
+            }
+            if (cleanOnly && !columns.clean[i]) {
+                continue;
+            }
+            laps.push({
+                driver: driver,
+                team: strings[columns.team[i]],
+                compound: compound,
+                lapNumber: columns.lap_number[i],
+                lapTime: columns.lap_time[i]
+            });
+        }
+        return laps;
+    }
+
+    // Group rows by key, keeping keys in order of first appearance
+    function groupBy(laps, keyFn) {
+        var groups = new Map();
+        laps.forEach(function (lap) {
+            var key = keyFn(lap);
+            if (!groups.has(key)) {
+                groups.set(key, []);
+            }
+            groups.get(key).push(lap);
+        });
+        return groups;
+    }
+
+    function pluck(laps, field) {
+        return laps.map(function (lap) { return lap[field]; });
+    }
+
+    function lapTimesFigure(dataset, laps, drivers, plotStyle) {
+        var byDriver = groupBy(laps, function (lap) { return lap.driver; });
+        var data = [];
+
+        drivers.forEach(function (driver) {
+            var driverLaps = byDriver.get(driver);
+            if (!driverLaps) {
+                return;
+            }
+            var team = driverLaps[0].team;
+            var teamColor = dataset.team_colors[team] || undefined;
+            var name = team !== 'UNKNOWN' ? driver + ' (' + team + ')' : driver;
+
+            if (plotStyle === 'line') {
+                data.push({
+                    type: 'scatter',
+                    x: pluck(driverLaps, 'lapNumber'),
+                    y: pluck(driverLaps, 'lapTime'),
+                    mode: 'lines+markers',
+                    name: name,
+                    marker: {color: teamColor},
+                    line: {color: teamColor},
+                    hovertemplate: 'Lap %{x}<br>Time: %{text}<extra></extra>',
+                    text: pluck(driverLaps, 'lapTime').map(formatLapTime)
+                });
+                return;
+            }
+
+            groupBy(driverLaps, function (lap) { return lap.compound; }).forEach(function (compoundLaps, compound) {
+                data.push({
+                    type: 'scatter',
+                    x: pluck(compoundLaps, 'lapNumber'),
+                    y: pluck(compoundLaps, 'lapTime'),
+                    mode: 'markers',
+                    name: driver + ' - ' + compound,
+                    marker: {size: 10, symbol: 'circle', color: dataset.compound_colors[compound] || teamColor},
+                    hovertemplate: 'Lap %{x}<br>Time: %{text}<br>Compound: ' + compound + '<extra></extra>',
+                    text: pluck(compoundLaps, 'lapTime').map(formatLapTime)
+                });
+            });
+        });
+
+        return {
+            data: data,
+            layout: {
+                title: {text: 'Lap Times Comparison'},
+                xaxis: {title: {text: 'Lap Number'}},
+                yaxis: {title: {text: 'Lap Time (seconds)'}},
+                legend: {orientation: 'h', yanchor: 'bottom', y: 1.02, xanchor: 'right', x: 1},
+                margin: {l: 40, r: 40, t: 60, b: 40},
+                height: 600
+            }
+        };
+    }
+
+    function lapDistributionFigure(dataset, laps, plotStyle) {
+        var data = [];
+        var byCompound = groupBy(laps, function (lap) { return lap.compound; });
+
+        if (plotStyle === 'line') {
+            // Mean and standard deviation per driver and compound, sorted by mean
+            var stats = [];
+            groupBy(laps, function (lap) { return lap.driver + '\u0000' + lap.compound; }).forEach(function (group) {
+                var times = pluck(group, 'lapTime');
+                var mean = times.reduce(function (a, b) { return a + b; }, 0) / times.length;
+                var variance = times.reduce(function (a, b) { return a + (b - mean) * (b - mean); }, 0);
+                stats.push({
+                    driver: group[0].driver,
+                    compound: group[0].compound,
+                    mean: mean,
+                    std: times.length > 1 ? Math.sqrt(variance / (times.length - 1)) : null
+                });
+            });
+            stats.sort(function (a, b) { return a.mean - b.mean; });
+
+            byCompound.forEach(function (_, compound) {
+                var compoundStats = stats.filter(function (row) { return row.compound === compound; });
+                var color = dataset.compound_colors[compound] || '#333333';
+                data.push({
+                    type: 'scatter',
+                    x: pluck(compoundStats, 'driver'),
+                    y: pluck(compoundStats, 'mean'),
+                    mode: 'lines+markers',
+                    name: compound,
+                    line: {color: color},
+                    marker: {color: color, size: 8},
+                    error_y: {type: 'data', array: pluck(compoundStats, 'std'), visible: true}
+                });
+            });
+        } else {
+            byCompound.forEach(function (compoundLaps, compound) {
+                data.push({
+                    type: 'scatter',
+                    x: pluck(compoundLaps, 'driver'),
+                    y: pluck(compoundLaps, 'lapTime'),
+                    mode: 'markers',
+                    name: compound,
+                    marker: {color: dataset.compound_colors[compound] || '#333333', size: 8},
+                    hovertemplate: 'Driver: %{x}<br>Time: %{y:.3f}s<br>Compound: ' + compound + '<extra></extra>'
+                });
+            });
+        }
+
+        return {
+            data: data,
+            layout: {
+                xaxis: {title: {text: 'Driver'}},
+                yaxis: {title: {text: 'Lap Time (seconds)'}},
+                legend: {orientation: 'h', yanchor: 'bottom', y: 1.02, xanchor: 'right', x: 1},
+                margin: {l: 40, r: 40, t: 60, b: 40},
+                height: 600
+            }
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        f1: {
+            toggleSelectionContainers: function (vizType) {
+                var hidden = {display: 'none'};
+                var shown = {display: 'block'};
+
+                return [
+                    ['team_comparison', 'season_pace'].indexOf(vizType) >= 0 ? shown : hidden,
+                    ['laptimes', 'race_gaps', 'positions', 'strategy', 'sectors', 'telemetry', 'tyre_degradation', 'season_pace'].indexOf(vizType) >= 0 ? shown : hidden,
+                    vizType === 'telemetry' ? shown : hidden,
+                    ['laptimes', 'lap_distribution', 'team_comparison', 'tyre_degradation'].indexOf(vizType) >= 0 ? shown : hidden,
+                    ['laptimes', 'lap_distribution', 'team_comparison', 'telemetry', 'tyre_degradation'].indexOf(vizType) >= 0 ? shown : hidden,
+                    vizType === 'replay' ? shown : hidden
+                ];
+            },
+
+            assignClientId: function (modified, clientId) {
+                if (clientId) {
+                    return window.dash_clientside.no_update;
+                }
+                return Date.now().toString(36) + Math.random().toString(36).slice(2);
+            },
+
+            toggleReplay: function (nClicks, disabled) {
+                return !disabled;
+            },
+
+            // Advance the replay clock and move every car to its interpolated
+            // position with extendData (one point kept per car trace). Windows
+            // of positions are requested from the server one ahead of the clock.
+            advanceReplay: function (nIntervals, buffer, speed, clock, requested) {
+                var noUpdate = window.dash_clientside.no_update;
+                if (!buffer) {
+                    return [noUpdate, noUpdate, noUpdate, noUpdate];
+                }
+                rememberReplayWindow(buffer);
+
+                var current = clock === null || clock === undefined ? buffer.replay_start : clock;
+                var next = Math.min(current + REPLAY_TICK_SECONDS * (speed || 1), buffer.replay_end);
+                var index = Math.floor((next - buffer.replay_start) / buffer.window_length);
+                var positions = replayWindows[index];
+
+                if (!positions) {
+                    // Wait for the window to arrive before moving on
+                    return [noUpdate, noUpdate, requested === index ? noUpdate : index, noUpdate];
+                }
+
+                var frame = Math.min(Math.round((next - positions.start) / positions.step), positions.x[0].length - 1);
+                var traces = positions.drivers.map(function (_, i) { return i + 1; });
+                var update = {
+                    x: positions.x.map(function (row) { return [row[frame]]; }),
+                    y: positions.y.map(function (row) { return [row[frame]]; })
+                };
+
+                var nextWindowStart = buffer.replay_start + (index + 1) * buffer.window_length;
+                var prefetch = !replayWindows[index + 1] && nextWindowStart < buffer.replay_end && requested !== index + 1;
+
+                return [
+                    [update, traces, 1],
+                    next,
+                    prefetch ? index + 1 : noUpdate,
+                    formatReplayClock(next - buffer.replay_start) + ' / ' +
+                        formatReplayClock(buffer.replay_end - buffer.replay_start)
+                ];
+            },
+
+            renderLapFigure: function (dataset, vizType, drivers, plotStyle, compoundFilter, analysisOptions,
+                                       template, season, event, sessionType) {
+                var noUpdate = window.dash_clientside.no_update;
+                var cleanOnly = (analysisOptions || []).indexOf('clean_only') >= 0;
+
+                if (!dataset || !isClientsideLapView(vizType, plotStyle, drivers, analysisOptions)) {
+                    return noUpdate;
+                }
+                // Wait for the dataset of the session that is currently selected
+                if (dataset.key[0] !== season || dataset.key[1] !== event || dataset.key[2] !== sessionType) {
+                    return noUpdate;
+                }
+
+                var figure;
+                if (vizType === 'laptimes') {
+                    var laps = selectLaps(dataset, drivers, compoundFilter, cleanOnly);
+                    if (laps.length === 0) {
+                        return message('No valid lap data available for the selected drivers and compound filter');
+                    }
+                    figure = lapTimesFigure(dataset, laps, drivers, plotStyle);
+                } else {
+                    var allLaps = selectLaps(dataset, null, compoundFilter, cleanOnly);
+                    if (allLaps.length === 0) {
+                        return message('No valid lap data available');
+                    }
+                    figure = lapDistributionFigure(dataset, allLaps, plotStyle);
+                }
+
+                figure.layout.template = template;
+                return {type: 'Graph', namespace: 'dash_core_components', props: {figure: figure}};
+            }
+        }
+    });
+})();
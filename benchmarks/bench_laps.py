@@ -0,0 +1,149 @@
+"""Micro-benchmarks of the lap data paths, on synthetic sessions.
+
+Run from the repository root:
+
+    python benchmarks/bench_laps.py
+
+Sessions are synthetic (laps and results only, like a loaded fastf1
+session), so nothing is downloaded and the numbers are reproducible.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.session_context import session_context
+from utils.visualization import (
+    create_lap_distribution, create_lap_distribution_table, create_laptimes_chart, create_team_comparison
+)
+
+COMPOUNDS = ['SOFT', 'MEDIUM', 'HARD']
+
+# Timed runs per measurement; the best run is reported
+REPEATS = 5
+
+
+class SyntheticSession:
+    """Stand-in for a loaded fastf1 session with laps and results only."""
+
+    def __init__(self, n_drivers=20, n_laps=60, seed=0):
+        rng = np.random.default_rng(seed)
+        drivers = [f"D{i:02d}" for i in range(n_drivers)]
+        teams = [f"Team {i // 2}" for i in range(n_drivers)]
+
+        lap_times = 90 + rng.normal(0, 0.8, n_drivers * n_laps) + np.tile(np.linspace(1, 0, n_laps), n_drivers)
+        self.laps = pd.DataFrame({
+            'Driver': np.repeat(drivers, n_laps),
+            'Team': np.repeat(teams, n_laps),
+            'LapNumber': np.tile(np.arange(1, n_laps + 1), n_drivers),
+            'Compound': rng.choice(COMPOUNDS, n_drivers * n_laps),
+            'LapTime': pd.to_timedelta(lap_times, unit='s'),
+            'Stint': 1,
+            'TyreLife': np.tile(np.arange(1, n_laps + 1), n_drivers).astype(float),
+            'TrackStatus': '1',
+        })
+        self.results = pd.DataFrame({
+            'Abbreviation': drivers,
+            'TeamName': teams,
+            'TeamColor': ['3671c6'] * n_drivers,
+        })
+
+
+def best_time(function, repeats=REPEATS):
+    """Best wall time of function() over repeats runs, in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def iterrows_lap_rows(laps):
+    """The per-row lap assembly create_lap_distribution used before user-030."""
+    rows = []
+    for _, lap in laps[laps['LapTime'].notna()].iterrows():
+        rows.append({
+            'Driver': lap['Driver'],
+            'Team': lap['Team'],
+            'Compound': lap['Compound'] if pd.notna(lap['Compound']) else 'UNKNOWN',
+            'LapTime': lap['LapTime'].total_seconds(),
+        })
+    return pd.DataFrame(rows)
+
+
+def bench_lap_distribution():
+    """Lap distribution data preparation cost per lap as sessions grow.
+
+    The vectorized lap frame should cost a roughly constant (and small)
+    time per lap, while the old per-row assembly pays Python overhead on
+    every lap.
+    """
+    print("Lap distribution data preparation (best of %d)" % REPEATS)
+    print(f"{'laps':>8} {'lap frame':>12} {'per lap':>10} {'iterrows':>12} {'per lap':>10} {'figure+table':>14}")
+
+    for n_laps in [20, 60, 250, 1000]:
+        laps_total = 20 * n_laps
+
+        # A fresh session per run, so the lap frame is built every time. The
+        # context only holds a weak reference, so keep the session alive
+        def build_frame():
+            fresh = SyntheticSession(n_laps=n_laps)
+            return session_context(fresh).lap_frame
+        frame_time = best_time(build_frame)
+        session_time = best_time(lambda: SyntheticSession(n_laps=n_laps))
+        frame_time = max(frame_time - session_time, 0.0)
+
+        session = SyntheticSession(n_laps=n_laps)
+        iterrows_time = best_time(lambda: iterrows_lap_rows(session.laps), repeats=1 if laps_total > 5000 else REPEATS)
+
+        def render():
+            fresh = SyntheticSession(n_laps=n_laps)
+            create_lap_distribution(fresh, plot_style='box')
+            create_lap_distribution_table(fresh, None)
+        render_time = best_time(render)
+
+        print(f"{laps_total:>8} {frame_time * 1e3:>10.2f}ms {frame_time / laps_total * 1e6:>8.2f}us "
+              f"{iterrows_time * 1e3:>10.2f}ms {iterrows_time / laps_total * 1e6:>8.2f}us "
+              f"{render_time * 1e3:>12.2f}ms")
+    print()
+
+
+def bench_selection_scaling():
+    """Box/violin cost as the selection grows from two drivers to the whole field.
+
+    The distribution frame is one isin() selection over the cached lap
+    frame, so its cost should stay flat; only the figure itself grows with
+    the number of groups drawn.
+    """
+    session = SyntheticSession(n_laps=60)
+    context = session_context(session)
+    frame = context.lap_frame
+    drivers = sorted(frame['Driver'].unique())
+    teams = sorted(frame['Team'].unique())
+
+    print("Box/violin selection scaling, 20 drivers x 60 laps (best of %d)" % REPEATS)
+    print(f"{'selected':>10} {'selection':>12} {'driver box':>12} {'driver violin':>14} {'team box':>12}")
+
+    for n_drivers in [2, 5, 10, 20]:
+        selected = drivers[:n_drivers]
+        selected_teams = teams[:max(1, n_drivers // 2)]
+
+        selection_time = best_time(lambda: frame.loc[frame['Driver'].isin(selected),
+                                                     ['Driver', 'Team', 'Compound', 'LapTime']])
+        box_time = best_time(lambda: create_laptimes_chart(session, selected, 'box'))
+        violin_time = best_time(lambda: create_laptimes_chart(session, selected, 'violin'))
+        team_time = best_time(lambda: create_team_comparison(session, selected_teams, 'box'))
+
+        print(f"{n_drivers:>10} {selection_time * 1e3:>10.2f}ms {box_time * 1e3:>10.2f}ms "
+              f"{violin_time * 1e3:>12.2f}ms {team_time * 1e3:>10.2f}ms")
+    print()
+
+
+if __name__ == '__main__':
+    bench_lap_distribution()
+    bench_selection_scaling()
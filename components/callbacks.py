@@ -1,11 +1,75 @@
-from dash import Output, Input, html
-from utils.data_loader import load_session, get_events_for_season
+import functools
+import threading
+
+from dash import Output, Input, State, Patch, ClientsideFunction, ALL, ctx, html, dcc, no_update
+from dash.exceptions import PreventUpdate
+from utils.admission import ServerBusy, admit
+from utils.cancellation import RequestCancelled, begin_request, end_request, check_cancelled
+from utils.data_loader import (
+    SessionNotCached, load_session, get_events_for_season, get_sessions_for_event, build_lap_dataset
+)
+from utils.result_cache import get_result_cache, make_result_key
+from utils.season import SEASON_VIEWS, get_season_results
+from utils.tracing import span
+from utils.session_context import session_context
 from utils.visualization import (
     create_laptimes_chart, create_team_comparison, create_telemetry_visualization,
     create_lap_distribution, create_laptimes_table, create_team_comparison_table,
-    create_telemetry_table, create_lap_distribution_table
+    create_telemetry_table, create_lap_distribution_table, create_tyre_degradation_chart,
+    create_tyre_degradation_table, create_race_gaps_chart, create_race_gaps_table,
+    create_positions_chart, create_positions_table, create_season_pace_chart, create_season_pace_table,
+    create_teammate_h2h_chart, create_teammate_h2h_table, create_strategy_chart, create_strategy_table,
+    create_sector_chart, create_sector_table, create_replay_chart,
+    compound_visible, TELEMETRY_MODES
 )
 
+# Inputs the figure of each visualization type actually depends on. Anything
+# not listed is left out of the result cache key so unrelated controls don't
+# fragment it, and changing it doesn't rebuild the figure.
+FIGURE_INPUTS = {
+    'laptimes': ('drivers', 'plot_style', 'compound_filter', 'clean_only', 'color_by', 'show_points'),
+    'race_gaps': ('drivers',),
+    'positions': ('drivers',),
+    'strategy': ('drivers',),
+    'sectors': ('drivers',),
+    'replay': (),
+    'team_comparison': ('teams', 'plot_style', 'compound_filter', 'clean_only', 'show_points'),
+    'telemetry': ('drivers', 'plot_style', 'telemetry_channel', 'telemetry_track_map', 'clean_only'),
+    'lap_distribution': ('plot_style', 'compound_filter', 'clean_only', 'show_points'),
+    'tyre_degradation': ('drivers', 'compound_filter', 'clean_only', 'fuel_corrected'),
+}
+
+# Inputs the data table of each visualization type actually depends on
+TABLE_INPUTS = {
+    'laptimes': ('drivers', 'compound_filter', 'clean_only'),
+    'race_gaps': ('drivers',),
+    'positions': ('drivers',),
+    'strategy': ('drivers',),
+    'sectors': ('drivers',),
+    'replay': (),
+    'team_comparison': ('teams', 'compound_filter', 'clean_only'),
+    'telemetry': ('drivers', 'telemetry_channel', 'clean_only'),
+    'lap_distribution': ('compound_filter', 'clean_only'),
+    'tyre_degradation': ('drivers', 'compound_filter', 'clean_only', 'fuel_corrected'),
+}
+
+# Views and plot styles rendered in the browser from the lap dataset store
+# (see assets/clientside.js); the server only builds their data tables.
+CLIENTSIDE_LAP_VIEWS = ['laptimes', 'lap_distribution']
+CLIENTSIDE_PLOT_STYLES = ['line', 'scatter']
+
+# Views that only make sense for sessions run as a race
+RACE_VIEWS = ['race_gaps', 'positions']
+RACE_SESSIONS = ['R', 'S']
+
+# Views drawing one trace per selected driver, tagged with the driver, so
+# adding or removing drivers patches their traces instead of a rebuild
+DRIVER_TRACE_VIEWS = ['telemetry']
+
+# Colors of the season views by (season, session type), see season_palette
+_season_palettes = {}
+_season_palettes_lock = threading.Lock()
+
 def register_callbacks(app):
     """Register all callbacks for the Dash app."""
 
@@ -20,20 +84,40 @@ def register_callbacks(app):
             return [], None
 
         event_options = get_events_for_season(selected_season)
-        # Return the options and select the first event
-        return event_options, event_options[0]['value'] if event_options else None
+        # Return the options and select the first event that can be loaded
+        selectable = [option['value'] for option in event_options if not option['disabled']]
+        return event_options, selectable[0] if selectable else None
+
+    # Callback to mark the sessions of the selected event that are cached locally
+    @app.callback(
+        Output('session-dropdown', 'options'),
+        Input('event-dropdown', 'value'),
+        State('season-dropdown', 'value')
+    )
+    def update_sessions(selected_event, selected_season):
+        if not (selected_season and selected_event):
+            raise PreventUpdate
+
+        return get_sessions_for_event(selected_season, selected_event)
 
     # Callback to update driver options when event/session changes
     @app.callback(
         Output('driver-dropdown', 'options'),
         Output('driver-dropdown', 'value'),
+        Output('drivers-retry', 'children'),
         Input('season-dropdown', 'value'),
         Input('event-dropdown', 'value'),
-        Input('session-dropdown', 'value')
+        Input('session-dropdown', 'value'),
+        Input(retry_timer_id('drivers', ALL), 'n_intervals'),
+        State('client-id', 'data')
     )
-    def update_drivers(selected_season, selected_event, selected_session):
+    @cancellable('drivers')
+    def update_drivers(selected_season, selected_event, selected_session, retries, client_id):
+        if waiting_for_retry(retries):
+            raise PreventUpdate
+
         if not (selected_season and selected_event and selected_session):
-            return [], []
+            return [], [], None
 
         try:
             # Load session data
@@ -51,22 +135,33 @@ def register_callbacks(app):
             # Select first two drivers by default
             default_selected = drivers[:2] if len(drivers) >= 2 else drivers
 
-            return driver_options, default_selected
+            return driver_options, default_selected, None
+        except RequestCancelled:
+            raise
+        except ServerBusy as e:
+            return [], [], retry_timer('drivers', e)
         except Exception as e:
             print(f"Error loading drivers: {e}")
-            return [], []
+            return [], [], None
 
     # Callback to update team options when event/session changes
     @app.callback(
         Output('team-dropdown', 'options'),
         Output('team-dropdown', 'value'),
+        Output('teams-retry', 'children'),
         Input('season-dropdown', 'value'),
         Input('event-dropdown', 'value'),
-        Input('session-dropdown', 'value')
+        Input('session-dropdown', 'value'),
+        Input(retry_timer_id('teams', ALL), 'n_intervals'),
+        State('client-id', 'data')
     )
-    def update_teams(selected_season, selected_event, selected_session):
+    @cancellable('teams')
+    def update_teams(selected_season, selected_event, selected_session, retries, client_id):
+        if waiting_for_retry(retries):
+            raise PreventUpdate
+
         if not (selected_season and selected_event and selected_session):
-            return [], []
+            return [], [], None
 
         try:
             # Load session data
@@ -84,93 +179,680 @@ def register_callbacks(app):
             # Select first two teams by default
             default_selected = teams[:2] if len(teams) >= 2 else teams
 
-            return team_options, default_selected
+            return team_options, default_selected, None
+        except RequestCancelled:
+            raise
+        except ServerBusy as e:
+            return [], [], retry_timer('teams', e)
         except Exception as e:
             print(f"Error loading teams: {e}")
-            return [], []
+            return [], [], None
 
-    # Callback to show/hide container based on visualization type
+    # Callback to ship a compact copy of the session laps to the browser
     @app.callback(
+        Output('lap-dataset', 'data'),
+        Output('lap-dataset-retry', 'children'),
+        Input('season-dropdown', 'value'),
+        Input('event-dropdown', 'value'),
+        Input('session-dropdown', 'value'),
+        Input(retry_timer_id('lap_dataset', ALL), 'n_intervals'),
+        State('client-id', 'data')
+    )
+    @cancellable('lap_dataset')
+    def update_lap_dataset(selected_season, selected_event, selected_session, retries, client_id):
+        if waiting_for_retry(retries):
+            raise PreventUpdate
+
+        if not (selected_season and selected_event and selected_session):
+            return None, None
+
+        result_cache = get_result_cache()
+        cache_key = make_result_key(dataset='laps', season=selected_season, event=selected_event,
+                                    session_type=selected_session)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached, None
+
+        try:
+            session = load_session(selected_season, selected_event, selected_session)
+            dataset = build_lap_dataset(selected_season, selected_event, selected_session, session)
+            result_cache.set(cache_key, dataset)
+            return dataset, None
+        except RequestCancelled:
+            raise
+        except ServerBusy as e:
+            return None, retry_timer('lap_dataset', e)
+        except Exception as e:
+            print(f"Error building lap dataset: {e}")
+            return None, None
+
+    # Give every browser tab an id, so superseded requests of a client can be cancelled
+    app.clientside_callback(
+        ClientsideFunction(namespace='f1', function_name='assignClientId'),
+        Output('client-id', 'data'),
+        Input('client-id', 'modified_timestamp'),
+        State('client-id', 'data')
+    )
+
+    # Show/hide containers based on visualization type, in the browser
+    app.clientside_callback(
+        ClientsideFunction(namespace='f1', function_name='toggleSelectionContainers'),
         Output('team-selection-container', 'style'),
         Output('driver-selection-container', 'style'),
         Output('telemetry-options-container', 'style'),
         Output('compound-filter-container', 'style'),
+        Output('analysis-options-container', 'style'),
+        Output('replay-options-container', 'style'),
         Input('viz-type', 'value')
     )
-    def toggle_selection_containers(viz_type):
-        # Default all to hidden
-        team_style = {'display': 'none'}
-        driver_style = {'display': 'none'}
-        telemetry_style = {'display': 'none'}
-        compound_style = {'display': 'none'}
 
-        # Show appropriate containers based on visualization type
-        if viz_type == 'team_comparison':
-            team_style = {'display': 'block'}
-        elif viz_type in ['laptimes', 'telemetry']:
-            driver_style = {'display': 'block'}
+    # Render lap views in line/scatter style in the browser from the lap dataset
+    app.clientside_callback(
+        ClientsideFunction(namespace='f1', function_name='renderLapFigure'),
+        Output('visualization-container', 'children', allow_duplicate=True),
+        Input('lap-dataset', 'data'),
+        Input('viz-type', 'value'),
+        Input('driver-dropdown', 'value'),
+        Input('plot-style', 'value'),
+        Input('compound-filter', 'value'),
+        Input('analysis-options', 'value'),
+        State('figure-template', 'data'),
+        State('season-dropdown', 'value'),
+        State('event-dropdown', 'value'),
+        State('session-dropdown', 'value'),
+        prevent_initial_call=True
+    )
+
+    # Callback to update the visualization. It shares the loaded session and
+    # its per-session computation context with the data table callback below.
+    @app.callback(
+        Output('visualization-container', 'children'),
+        Output('figure-state', 'data'),
+        Input('season-dropdown', 'value'),
+        Input('event-dropdown', 'value'),
+        Input('session-dropdown', 'value'),
+        Input('viz-type', 'value'),
+        Input('driver-dropdown', 'value'),
+        Input('team-dropdown', 'value'),
+        Input('plot-style', 'value'),
+        Input('telemetry-channel', 'value'),
+        Input('telemetry-track-map', 'value'),
+        Input('compound-filter', 'value'),
+        Input('analysis-options', 'value'),
+        Input(retry_timer_id('figure', ALL), 'n_intervals'),
+        State('figure-state', 'data'),
+        State('client-id', 'data')
+    )
+    @cancellable('figure')
+    def update_visualization(season, event, session_type, viz_type, selected_drivers, selected_teams,
+                             plot_style, telemetry_channel, telemetry_track_map, compound_filter,
+                             analysis_options, retries, figure_state, client_id):
+        if waiting_for_retry(retries):
+            raise PreventUpdate
+
+        # Season views are rendered incrementally by update_season_view
+        if viz_type in SEASON_VIEWS:
+            return no_update, None
+
+        clean_only = 'clean_only' in (analysis_options or [])
+        fuel_corrected = 'fuel_correct' in (analysis_options or [])
+        color_by = 'track_temp' if 'track_temp' in (analysis_options or []) else None
+        show_points = 'show_points' in (analysis_options or [])
+
+        message = selection_message(season, event, session_type, viz_type, selected_drivers, selected_teams)
+        if message:
+            return html.Div(message), None
 
-        if viz_type == 'telemetry':
-            telemetry_style = {'display': 'block'}
+        # The browser renders these from the lap dataset, except lap times
+        # colored by weather, which the lap dataset doesn't carry
+        if (viz_type in CLIENTSIDE_LAP_VIEWS and plot_style in CLIENTSIDE_PLOT_STYLES
+                and not (viz_type == 'laptimes' and color_by)):
+            return no_update, None
 
-        if viz_type in ['laptimes', 'lap_distribution', 'team_comparison']:
-            compound_style = {'display': 'block'}
+        # Cache and view keys treat selections as sets, so every output is
+        # built from them in a fixed order
+        selected_drivers = sorted(selected_drivers or [])
+        selected_teams = sorted(selected_teams or [])
 
-        return team_style, driver_style, telemetry_style, compound_style
+        inputs = {
+            'drivers': selected_drivers,
+            'teams': selected_teams,
+            'plot_style': plot_style,
+            'telemetry_channel': telemetry_channel,
+            'telemetry_track_map': telemetry_track_map,
+            'compound_filter': compound_filter or [],
+            'clean_only': clean_only,
+            'fuel_corrected': fuel_corrected,
+            'color_by': color_by,
+            'show_points': show_points,
+        }
+        relevant = {name: inputs[name] for name in FIGURE_INPUTS.get(viz_type, inputs)}
 
-    # Main callback to update visualization and data table
+        # Everything except plot style, compound filter and, for views with a
+        # trace per driver, the drivers identifies the figure on screen; if
+        # only those changed, try to patch it in place
+        driver_traces = viz_type in DRIVER_TRACE_VIEWS
+        patchable = ('plot_style', 'compound_filter') + (('drivers',) if driver_traces else ())
+        view = make_result_key(season=season, event=event, session_type=session_type, viz_type=viz_type,
+                               **{name: value for name, value in relevant.items() if name not in patchable})
+        compounds = sorted(compound_filter or []) if 'compound_filter' in relevant else []
+        style = plot_style if 'plot_style' in relevant else None
+        drivers = selected_drivers if driver_traces else None
+
+        if figure_state and figure_state['view'] == view:
+            if (figure_state['plot_style'] == style and figure_state['compound_filter'] == compounds
+                    and figure_state.get('drivers') == drivers):
+                # Only controls this view doesn't use have changed
+                raise PreventUpdate
+
+            def build_driver_traces(added):
+                # Traces of newly selected drivers, built like a full rebuild would
+                session = load_session(season, event, session_type)
+                check_cancelled()
+                with admit('render'), span('figure.patch', viz_type=viz_type):
+                    visualization = create_telemetry_visualization(session, added, telemetry_channel,
+                                                                   telemetry_track_map, plot_style, clean_only)
+                return list(visualization.figure.data) if isinstance(visualization, dcc.Graph) else None
+
+            try:
+                patched = build_figure_patch(figure_state, style, compounds, drivers,
+                                             build_driver_traces if driver_traces else None)
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                # Fall back to a full rebuild, which reports the error
+                print(f"Error patching figure: {e}")
+                patched = None
+
+            if patched is not None:
+                patch, traces = patched
+                return patch, dict(figure_state, plot_style=style, compound_filter=compounds, drivers=drivers,
+                                   traces=traces)
+
+        # Serve previously rendered figures straight from the result cache
+        cache_key = make_result_key(output='figure', season=season, event=event, session_type=session_type,
+                                    viz_type=viz_type, **relevant)
+        result_cache = get_result_cache()
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            # Load session data
+            session = load_session(season, event, session_type)
+            check_cancelled()
+
+            # Building figures and tables is bounded like loads are
+            with admit('render'), span('figure.build', viz_type=viz_type):
+                visualization = None
+
+                if viz_type == 'laptimes':
+                    visualization = create_laptimes_chart(session, selected_drivers, plot_style, compound_filter,
+                                                          clean_only, color_by, show_points)
+
+                elif viz_type == 'race_gaps':
+                    visualization = create_race_gaps_chart(session, selected_drivers)
+
+                elif viz_type == 'positions':
+                    visualization = create_positions_chart(session, selected_drivers)
+
+                elif viz_type == 'strategy':
+                    visualization = create_strategy_chart(session, selected_drivers)
+
+                elif viz_type == 'sectors':
+                    visualization = create_sector_chart(session, selected_drivers)
+
+                elif viz_type == 'replay':
+                    visualization = create_replay_chart(session)
+
+                elif viz_type == 'team_comparison':
+                    visualization = create_team_comparison(session, selected_teams, plot_style, compound_filter,
+                                                           clean_only, show_points)
+
+                elif viz_type == 'telemetry':
+                    visualization = create_telemetry_visualization(session, selected_drivers, telemetry_channel,
+                                                                   telemetry_track_map, plot_style, clean_only)
+
+                elif viz_type == 'lap_distribution':
+                    visualization = create_lap_distribution(session, compound_filter, plot_style, clean_only,
+                                                            show_points)
+
+                elif viz_type == 'tyre_degradation':
+                    visualization = create_tyre_degradation_chart(session, selected_drivers, compound_filter,
+                                                                  fuel_corrected, clean_only)
+
+            # Don't serialize and cache a figure nobody is waiting for any more
+            check_cancelled()
+
+            # Remember the traces on screen so later filter changes can be patched
+            new_state = None
+            if isinstance(visualization, dcc.Graph):
+                new_state = {
+                    'view': view,
+                    'plot_style': style,
+                    'compound_filter': compounds,
+                    'drivers': drivers,
+                    'traces': [trace.meta if isinstance(trace.meta, dict) else None
+                               for trace in visualization.figure.data]
+                }
+
+            result_cache.set(cache_key, [visualization, new_state])
+
+            return visualization, new_state
+
+        except RequestCancelled:
+            raise
+        except ServerBusy as e:
+            # Shown until the retry timer re-runs this callback
+            return html.Div([html.Div(str(e)), retry_timer('figure', e)]), None
+        except SessionNotCached as e:
+            return html.Div(str(e)), None
+        except Exception as e:
+            return html.Div(f"Error: {str(e)}"), None
+
+    # Callback to update the raw data table. It only listens to the inputs
+    # tables depend on, so e.g. plot style changes never rebuild it.
     @app.callback(
-        [Output('visualization-container', 'children'),
-         Output('data-table-container', 'children')],
-        [Input('season-dropdown', 'value'),
-         Input('event-dropdown', 'value'),
-         Input('session-dropdown', 'value'),
-         Input('viz-type', 'value'),
-         Input('driver-dropdown', 'value'),
-         Input('team-dropdown', 'value'),
-         Input('plot-style', 'value'),
-         Input('telemetry-channel', 'value'),
-         Input('telemetry-track-map', 'value'),
-         Input('compound-filter', 'value')]
+        Output('data-table-container', 'children'),
+        Output('table-state', 'data'),
+        Input('season-dropdown', 'value'),
+        Input('event-dropdown', 'value'),
+        Input('session-dropdown', 'value'),
+        Input('viz-type', 'value'),
+        Input('driver-dropdown', 'value'),
+        Input('team-dropdown', 'value'),
+        Input('telemetry-channel', 'value'),
+        Input('compound-filter', 'value'),
+        Input('analysis-options', 'value'),
+        Input(retry_timer_id('table', ALL), 'n_intervals'),
+        State('table-state', 'data'),
+        State('client-id', 'data')
     )
-    def update_visualization_and_table(season, event, session_type, viz_type, selected_drivers,
-                                       selected_teams, plot_style, telemetry_channel, telemetry_track_map,
-                                       compound_filter):
-        if not (season and event and session_type and viz_type):
-            return html.Div("Please select all required options"), html.Div("No data to display")
+    @cancellable('table')
+    def update_table(season, event, session_type, viz_type, selected_drivers, selected_teams,
+                     telemetry_channel, compound_filter, analysis_options, retries, table_state, client_id):
+        if waiting_for_retry(retries):
+            raise PreventUpdate
+
+        if viz_type in SEASON_VIEWS:
+            return no_update, None
+
+        clean_only = 'clean_only' in (analysis_options or [])
+        fuel_corrected = 'fuel_correct' in (analysis_options or [])
+
+        if selection_message(season, event, session_type, viz_type, selected_drivers, selected_teams):
+            return html.Div("No data to display"), None
+
+        # Cache and view keys treat selections as sets, so every output is
+        # built from them in a fixed order
+        selected_drivers = sorted(selected_drivers or [])
+        selected_teams = sorted(selected_teams or [])
+
+        inputs = {
+            'drivers': selected_drivers,
+            'teams': selected_teams,
+            'telemetry_channel': telemetry_channel,
+            'compound_filter': compound_filter or [],
+            'clean_only': clean_only,
+            'fuel_corrected': fuel_corrected,
+        }
+        cache_key = make_result_key(output='table', season=season, event=event, session_type=session_type,
+                                    viz_type=viz_type,
+                                    **{name: inputs[name] for name in TABLE_INPUTS.get(viz_type, inputs)})
+
+        # Only controls this table doesn't use have changed
+        if cache_key == table_state:
+            raise PreventUpdate
+
+        # Serve previously built tables straight from the result cache
+        result_cache = get_result_cache()
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached, cache_key
 
         try:
             # Load session data
             session = load_session(season, event, session_type)
+            check_cancelled()
 
-            # Prepare data for visualization
-            visualization = None
-            data_table = None
+            # Building figures and tables is bounded like loads are
+            with admit('render'), span('table.build', viz_type=viz_type):
+                data_table = None
 
-            if viz_type == 'laptimes':
-                if not selected_drivers:
-                    return html.Div("Please select at least one driver"), html.Div("No data to display")
-                visualization = create_laptimes_chart(session, selected_drivers, plot_style, compound_filter)
-                data_table = create_laptimes_table(session, selected_drivers, compound_filter)
+                if viz_type == 'laptimes':
+                    data_table = create_laptimes_table(session, selected_drivers, compound_filter, clean_only)
 
-            elif viz_type == 'team_comparison':
-                if not selected_teams or len(selected_teams) < 1:
-                    return html.Div("Please select at least one team"), html.Div("No data to display")
-                visualization = create_team_comparison(session, selected_teams, plot_style, compound_filter)
-                data_table = create_team_comparison_table(session, selected_teams, compound_filter)
+                elif viz_type == 'race_gaps':
+                    data_table = create_race_gaps_table(session, selected_drivers)
 
-            elif viz_type == 'telemetry':
-                if not selected_drivers:
-                    return html.Div("Please select at least one driver"), html.Div("No data to display")
-                visualization = create_telemetry_visualization(session, selected_drivers, telemetry_channel,
-                                                               telemetry_track_map, plot_style)
-                data_table = create_telemetry_table(session, selected_drivers, telemetry_channel)
+                elif viz_type == 'positions':
+                    data_table = create_positions_table(session, selected_drivers)
 
-            elif viz_type == 'lap_distribution':
-                visualization = create_lap_distribution(session, compound_filter, plot_style)
-                data_table = create_lap_distribution_table(session, compound_filter)
+                elif viz_type == 'strategy':
+                    data_table = create_strategy_table(session, selected_drivers)
 
-            return visualization, data_table
+                elif viz_type == 'sectors':
+                    data_table = create_sector_table(session, selected_drivers)
 
+                elif viz_type == 'replay':
+                    data_table = html.Div("The replay has no data table")
+
+                elif viz_type == 'team_comparison':
+                    data_table = create_team_comparison_table(session, selected_teams, compound_filter, clean_only)
+
+                elif viz_type == 'telemetry':
+                    data_table = create_telemetry_table(session, selected_drivers, telemetry_channel, clean_only)
+
+                elif viz_type == 'lap_distribution':
+                    data_table = create_lap_distribution_table(session, compound_filter, clean_only)
+
+                elif viz_type == 'tyre_degradation':
+                    data_table = create_tyre_degradation_table(session, selected_drivers, compound_filter,
+                                                               fuel_corrected, clean_only)
+
+            check_cancelled()
+            result_cache.set(cache_key, data_table)
+
+            return data_table, cache_key
+
+        except RequestCancelled:
+            raise
+        except ServerBusy as e:
+            return html.Div([html.Div(str(e)), retry_timer('table', e)]), None
+        except SessionNotCached as e:
+            return html.Div(str(e)), None
         except Exception as e:
-            return html.Div(f"Error: {str(e)}"), html.Div("Error loading data")
\ No newline at end of file
+            print(f"Error loading data table: {e}")
+            return html.Div("Error loading data"), None
+
+    # Callback to rewind the replay to its first window whenever it is opened
+    @app.callback(
+        Output('replay-buffer', 'data'),
+        Output('replay-clock', 'data'),
+        Output('replay-tick', 'disabled', allow_duplicate=True),
+        Output('replay-window-request', 'data', allow_duplicate=True),
+        Input('season-dropdown', 'value'),
+        Input('event-dropdown', 'value'),
+        Input('session-dropdown', 'value'),
+        Input('viz-type', 'value'),
+        State('client-id', 'data'),
+        prevent_initial_call=True
+    )
+    @cancellable('replay')
+    def reset_replay(season, event, session_type, viz_type, client_id):
+        # Leaving the replay pauses it
+        if viz_type != 'replay' or not (season and event and session_type):
+            return no_update, no_update, True, no_update
+
+        try:
+            session = load_session(season, event, session_type)
+            replay_window = session_context(session).replay_window(0)
+            if replay_window is None:
+                return None, None, True, None
+
+            replay_window['key'] = [season, event, session_type]
+            return replay_window, replay_window['replay_start'], True, None
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            print(f"Error loading replay: {e}")
+            return None, None, True, None
+
+    # Callback to send the window of positions the replay asks for next
+    @app.callback(
+        Output('replay-buffer', 'data', allow_duplicate=True),
+        Input('replay-window-request', 'data'),
+        State('season-dropdown', 'value'),
+        State('event-dropdown', 'value'),
+        State('session-dropdown', 'value'),
+        prevent_initial_call=True
+    )
+    def update_replay_buffer(window, season, event, session_type):
+        if window is None or not (season and event and session_type):
+            raise PreventUpdate
+
+        try:
+            session = load_session(season, event, session_type)
+            replay_window = session_context(session).replay_window(window)
+        except Exception as e:
+            print(f"Error loading replay window: {e}")
+            raise PreventUpdate
+
+        if replay_window is None:
+            raise PreventUpdate
+
+        replay_window['key'] = [season, event, session_type]
+        return replay_window
+
+    # Play/pause and advance the replay in the browser
+    app.clientside_callback(
+        ClientsideFunction(namespace='f1', function_name='toggleReplay'),
+        Output('replay-tick', 'disabled'),
+        Input('replay-play', 'n_clicks'),
+        State('replay-tick', 'disabled'),
+        prevent_initial_call=True
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='f1', function_name='advanceReplay'),
+        Output('replay-graph', 'extendData'),
+        Output('replay-clock', 'data', allow_duplicate=True),
+        Output('replay-window-request', 'data'),
+        Output('replay-clock-display', 'children'),
+        Input('replay-tick', 'n_intervals'),
+        State('replay-buffer', 'data'),
+        State('replay-speed', 'value'),
+        State('replay-clock', 'data'),
+        State('replay-window-request', 'data'),
+        prevent_initial_call=True
+    )
+
+    # Callback to render the season views, polled while their sessions are loading
+    @app.callback(
+        Output('visualization-container', 'children', allow_duplicate=True),
+        Output('data-table-container', 'children', allow_duplicate=True),
+        Output('season-poll', 'disabled'),
+        Input('season-dropdown', 'value'),
+        Input('session-dropdown', 'value'),
+        Input('viz-type', 'value'),
+        Input('driver-dropdown', 'value'),
+        Input('team-dropdown', 'value'),
+        Input('season-poll', 'n_intervals'),
+        State('event-dropdown', 'value'),
+        State('client-id', 'data'),
+        prevent_initial_call=True
+    )
+    @cancellable('season')
+    def update_season_view(season, session_type, viz_type, selected_drivers, selected_teams, n_intervals, event,
+                           client_id):
+        if viz_type not in SEASON_VIEWS:
+            return no_update, no_update, True
+
+        if not (season and session_type):
+            return html.Div("Please select all required options"), html.Div("No data to display"), True
+
+        if viz_type == 'quali_h2h':
+            try:
+                results, done = get_season_results(viz_type, season, session_type)
+                return (create_teammate_h2h_chart(results, season, done), create_teammate_h2h_table(results),
+                        done)
+            except Exception as e:
+                return html.Div(f"Error: {str(e)}"), html.Div("Error loading data"), True
+
+        if not (selected_drivers or selected_teams):
+            return html.Div("Please select at least one driver or team"), html.Div("No data to display"), True
+
+        try:
+            results, done = get_season_results(viz_type, season, session_type)
+
+            # Colors come from the results of the event on screen, once per season
+            palette = None
+            if event:
+                try:
+                    palette = season_palette(season, event, session_type)
+                except RequestCancelled:
+                    raise
+                except Exception as e:
+                    print(f"Error loading session colors: {e}")
+
+            visualization = create_season_pace_chart(results, season, session_type, palette,
+                                                     selected_drivers, selected_teams, done)
+            data_table = create_season_pace_table(results, selected_drivers, selected_teams)
+
+            # Keep polling until every event has been loaded
+            return visualization, data_table, done
+
+        except Exception as e:
+            return html.Div(f"Error: {str(e)}"), html.Div("Error loading data"), True
+
+
+def season_palette(season, event, session_type):
+    """Team and driver colors of the season views.
+
+    Only the results of the event on screen are loaded (a lookup when the
+    session is already loaded), once per season and session type, so the
+    polls of a season view that is still loading don't reload anything.
+
+    Args:
+        season (int): Season of the view
+        event (str): Event whose results provide the colors
+        session_type (str): Session type of the view
+
+    Returns:
+        SessionPalette: Colors of the season
+    """
+    key = (season, session_type)
+    with _season_palettes_lock:
+        palette = _season_palettes.get(key)
+    if palette is None:
+        session = load_session(season, event, session_type, profile='results')
+        palette = session_context(session).palette
+        with _season_palettes_lock:
+            _season_palettes[key] = palette
+    return palette
+
+def cancellable(channel):
+    """Run a callback as the latest request of its client on a channel.
+
+    The client id must be the callback's last argument. A newer call from
+    the same client supersedes this one: load_session and the figure/table
+    builders stop at their next stage boundary and the callback leaves its
+    outputs unchanged.
+    """
+    def decorator(callback):
+        @functools.wraps(callback)
+        def wrapper(*args):
+            token = begin_request(args[-1], channel)
+            try:
+                return callback(*args)
+            except RequestCancelled:
+                raise PreventUpdate
+            finally:
+                end_request(token)
+        return wrapper
+    return decorator
+
+def retry_timer_id(channel, index):
+    """Id of the timer that retries a callback turned away with ServerBusy."""
+    return {'type': 'busy-retry', 'channel': channel, 'index': index}
+
+def retry_timer(channel, error):
+    """One-shot timer re-running the callback of a channel after error.retry_after."""
+    return dcc.Interval(id=retry_timer_id(channel, 0), interval=int(error.retry_after * 1000),
+                        n_intervals=0, max_intervals=1)
+
+def waiting_for_retry(retries):
+    """Whether a callback only ran because its retry timer was added to the page.
+
+    Dash runs a callback when a component matching one of its wildcard
+    inputs appears; the retry itself is the timer's first tick.
+    """
+    triggered = ctx.triggered_id
+    return (triggered is None or isinstance(triggered, dict)) and bool(retries) and not any(retries)
+
+def selection_message(season, event, session_type, viz_type, selected_drivers, selected_teams):
+    """Return the message to show when required selections are missing, else None."""
+    if not (season and event and session_type and viz_type):
+        return "Please select all required options"
+
+    if viz_type in ['laptimes', 'telemetry'] and not selected_drivers:
+        return "Please select at least one driver"
+
+    if viz_type == 'team_comparison' and not selected_teams:
+        return "Please select at least one team"
+
+    if viz_type in RACE_VIEWS and session_type not in RACE_SESSIONS:
+        return "This view is only available for race and sprint sessions"
+
+    return None
+
+def build_figure_patch(figure_state, plot_style, compound_filter, drivers=None, build_driver_traces=None):
+    """Build a partial update for the figure on screen.
+
+    Compound filter changes become visibility toggles on the traces tagged
+    with a compound, line/scatter switches become mode changes on traces
+    drawn in both styles, and driver selection changes delete and insert
+    the traces tagged with a driver.
+
+    Args:
+        figure_state (dict): State of the figure on screen, see update_visualization
+        plot_style (str): Plot style to show
+        compound_filter (list): Compounds to show (empty for all)
+        drivers (list): Sorted drivers to show, for views with a trace per driver
+        build_driver_traces (callable): Builds the traces of a list of added drivers
+
+    Returns:
+        tuple: The Patch and the trace metadata of the patched figure, or None
+            when the change needs a full rebuild
+    """
+    traces = figure_state['traces']
+    if not (traces and all(traces)):
+        return None
+
+    patch = Patch()
+    data = patch['props']['figure']['data']
+
+    if plot_style != figure_state['plot_style']:
+        # Switching to or from box and violin changes the traces; line and
+        # scatter traces drawn with both styles only change mode
+        if not (plot_style in TELEMETRY_MODES and figure_state['plot_style'] in TELEMETRY_MODES
+                and all(trace.get('modes') for trace in traces)):
+            return None
+        for i in range(len(traces)):
+            data[i]['mode'] = TELEMETRY_MODES[plot_style]
+
+    if compound_filter != figure_state['compound_filter']:
+        # Only figures whose traces are all split by compound can be filtered in place
+        if not all('compound' in trace for trace in traces):
+            return None
+        for i, trace in enumerate(traces):
+            data[i]['visible'] = compound_visible(trace['compound'], compound_filter)
+
+    if drivers != figure_state.get('drivers'):
+        if build_driver_traces is None or not all('driver' in trace for trace in traces):
+            return None
+
+        # Delete from the end, so the indices of the traces before stay valid
+        kept = [trace for trace in traces if trace['driver'] in drivers]
+        for i in reversed(range(len(traces))):
+            if traces[i]['driver'] not in drivers:
+                del data[i]
+
+        added = [driver for driver in drivers if driver not in figure_state['drivers']]
+        new_traces = build_driver_traces(added) if added else []
+        if new_traces is None:
+            return None
+
+        # Insert each new trace at its place in the driver order a rebuild would draw
+        for trace in new_traces:
+            meta = trace.meta
+            position = sum(1 for kept_trace in kept if kept_trace['driver'] <= meta['driver'])
+            data.insert(position, trace.to_plotly_json())
+            kept.insert(position, meta)
+        traces = kept
+
+        # Every driver removed: rebuild to show the selection message
+        if not traces:
+            return None
+
+    return patch, traces
@@ -1,5 +1,8 @@
 from dash import html, dcc, dash_table
 import dash_bootstrap_components as dbc
+import plotly.io as pio
+
+from utils.data_loader import SESSION_NAMES
 
 def create_layout():
     """Create the main layout for the F1 dashboard."""
@@ -9,6 +12,16 @@ def create_layout():
 
     # Main layout
     layout = html.Div([
+        # Id of this page load, used to cancel its superseded requests. Kept in
+        # memory: browsers copy sessionStorage into duplicated tabs, which
+        # would then share an id and cancel each other's requests
+        dcc.Store(id='client-id', storage_type='memory'),
+
+        # Timers retrying the option and lap dataset callbacks when the server is busy
+        html.Div(id='drivers-retry'),
+        html.Div(id='teams-retry'),
+        html.Div(id='lap-dataset-retry'),
+
         html.H1("Formula 1 Data Analysis Dashboard", className="text-center my-4"),
 
         html.Div([
@@ -38,15 +51,9 @@ def create_layout():
                         html.Label("Select Session:"),
                         dcc.Dropdown(
                             id='session-dropdown',
-                            options=[
-                                {'label': 'Practice 1', 'value': 'FP1'},
-                                {'label': 'Practice 2', 'value': 'FP2'},
-                                {'label': 'Practice 3', 'value': 'FP3'},
-                                {'label': 'Qualifying', 'value': 'Q'},
-                                {'label': 'Sprint', 'value': 'S'},
-                                {'label': 'Sprint Qualifying', 'value': 'SQ'},
-                                {'label': 'Race', 'value': 'R'}
-                            ],
+                            # Marked as cached or not once an event is selected
+                            options=[{'label': name, 'value': session_type}
+                                     for session_type, name in SESSION_NAMES.items()],
                             value='Q',
                             className="mb-3",
                             style={'color': 'black', 'background-color': 'white'}
@@ -61,9 +68,17 @@ def create_layout():
                             id='viz-type',
                             options=[
                                 {'label': 'Lap Times', 'value': 'laptimes'},
+                                {'label': 'Race Gaps', 'value': 'race_gaps'},
+                                {'label': 'Positions', 'value': 'positions'},
+                                {'label': 'Tyre Strategy', 'value': 'strategy'},
+                                {'label': 'Sector Analysis', 'value': 'sectors'},
+                                {'label': 'Replay', 'value': 'replay'},
                                 {'label': 'Team Comparison', 'value': 'team_comparison'},
                                 {'label': 'Telemetry', 'value': 'telemetry'},
-                                {'label': 'Lap Distribution', 'value': 'lap_distribution'}
+                                {'label': 'Lap Distribution', 'value': 'lap_distribution'},
+                                {'label': 'Tyre Degradation', 'value': 'tyre_degradation'},
+                                {'label': 'Season Pace', 'value': 'season_pace'},
+                                {'label': 'Quali Teammate H2H', 'value': 'quali_h2h'}
                             ],
                             value='laptimes',
                             className="mb-3",
@@ -148,6 +163,36 @@ def create_layout():
                                 className="mb-3",
                                 labelStyle={'color': 'white', 'display': 'inline-block', 'margin-right': '15px', 'margin-bottom': '5px'}
                             )
+                        ]),
+
+                        html.Div(id='replay-options-container', style={'display': 'none'}, children=[
+                            html.Button("Play / Pause", id='replay-play', n_clicks=0, className="btn btn-secondary mb-3"),
+                            html.Div(id='replay-clock-display', className="mb-2", style={'color': 'white'}),
+
+                            html.Label("Replay Speed:"),
+                            dcc.RadioItems(
+                                id='replay-speed',
+                                options=[{'label': f"{speed}x", 'value': speed} for speed in [1, 2, 5, 10, 20, 50]],
+                                value=10,
+                                className="mb-3",
+                                labelStyle={'color': 'white', 'display': 'inline-block', 'margin-right': '15px'}
+                            )
+                        ]),
+
+                        html.Div(id='analysis-options-container', style={'display': 'none'}, children=[
+                            html.Label("Analysis Options:"),
+                            dcc.Checklist(
+                                id='analysis-options',
+                                options=[
+                                    {'label': 'Clean laps only', 'value': 'clean_only'},
+                                    {'label': 'Fuel-correct lap times', 'value': 'fuel_correct'},
+                                    {'label': 'Color by track temperature', 'value': 'track_temp'},
+                                    {'label': 'Show all laps on box/violin plots', 'value': 'show_points'}
+                                ],
+                                value=[],
+                                className="mb-3",
+                                labelStyle={'color': 'white', 'display': 'block', 'margin-bottom': '5px'}
+                            )
                         ])
                     ], className="controls-section"),
                 ], width=3),
@@ -162,13 +207,28 @@ def create_layout():
                                 id="loading-visualization",
                                 type="circle",
                                 children=[html.Div(id='visualization-container')]
-                            )
+                            ),
+                            # Traces currently on screen, used to patch the figure in place
+                            dcc.Store(id='figure-state'),
+                            # Compact per-session lap data for figures rendered in the browser
+                            dcc.Store(id='lap-dataset'),
+                            dcc.Store(id='figure-template', data=pio.templates['plotly_dark'].to_plotly_json()),
+                            # Polls for season events that finished loading
+                            dcc.Interval(id='season-poll', interval=2000, disabled=True),
+                            # Replay clock (session seconds), the latest window of interpolated
+                            # positions from the server and the window the browser wants next
+                            dcc.Interval(id='replay-tick', interval=200, disabled=True),
+                            dcc.Store(id='replay-clock'),
+                            dcc.Store(id='replay-buffer'),
+                            dcc.Store(id='replay-window-request')
                         ], className="mb-4"),
 
                         # Raw data table container
                         html.Div([
                             html.H4("Raw Data", className="section-title"),
-                            html.Div(id='data-table-container')
+                            html.Div(id='data-table-container'),
+                            # Result cache key of the table on screen
+                            dcc.Store(id='table-state')
                         ])
                     ], className="p-3")
                 ], width=9)
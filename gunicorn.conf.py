@@ -0,0 +1,25 @@
+import os
+
+# Serve the WSGI app exposed by wsgi.py
+wsgi_app = 'wsgi:server'
+
+bind = os.environ.get('F1_BIND', '0.0.0.0:8050')
+
+# Worker processes and threads per worker. The load/render limits of
+# utils/admission.py apply per worker, so they are multiplied by F1_WORKERS.
+workers = int(os.environ.get('F1_WORKERS', '2'))
+threads = int(os.environ.get('F1_THREADS', '4'))
+
+# Import the app and warm sessions in the master before forking, so workers
+# share them copy-on-write
+preload_app = True
+
+# Loading a session that isn't in the fastf1 cache yet can take over a minute
+timeout = int(os.environ.get('F1_TIMEOUT', '180'))
+
+
+def post_fork(server, worker):
+    # Give each worker its own fastf1 HTTP cache connection instead of the
+    # sqlite handle inherited from the master
+    from utils.data_loader import setup_fastf1_cache
+    setup_fastf1_cache()
@@ -0,0 +1,10 @@
+import pytest
+
+from utils import tracing
+
+
+@pytest.fixture(autouse=True)
+def trace_to_tmp_path(tmp_path, monkeypatch):
+    """Keep the spans recorded by the code under test out of the working tree."""
+    monkeypatch.setattr(tracing, 'TRACE_FILE', str(tmp_path / 'traces.jsonl'))
+    monkeypatch.setattr(tracing, '_trace', None)
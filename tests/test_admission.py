@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from utils.admission import AdmissionController, ServerBusy
+
+
+def hold_slot(controller, entered, release):
+    with controller.admit():
+        entered.set()
+        release.wait(5)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_full_queue_is_turned_away():
+    controller = AdmissionController('cold_load', limit=1, queue_size=1, timeout=5)
+    release = threading.Event()
+    running, queued = threading.Event(), threading.Event()
+
+    holder = threading.Thread(target=hold_slot, args=(controller, running, release))
+    holder.start()
+    assert running.wait(5)
+    waiter = threading.Thread(target=hold_slot, args=(controller, queued, release))
+    waiter.start()
+    wait_for(lambda: controller.stats()['waiting'] == 1)
+
+    try:
+        with pytest.raises(ServerBusy) as busy:
+            with controller.admit():
+                pass
+        assert busy.value.resource == 'cold_load'
+        assert busy.value.retry_after > 0
+    finally:
+        release.set()
+        holder.join()
+        waiter.join()
+
+    # The queued operation ran once the slot was freed
+    assert queued.is_set()
+    stats = controller.stats()
+    assert (stats['admitted'], stats['rejected'], stats['active'], stats['waiting']) == (2, 1, 0, 0)
+    assert stats['peak_waiting'] == 1
+
+
+def test_wait_is_bounded_by_the_timeout():
+    controller = AdmissionController('render', limit=1, queue_size=4, timeout=0.05)
+    release, running = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, running, release))
+    holder.start()
+    assert running.wait(5)
+
+    try:
+        start = time.monotonic()
+        with pytest.raises(ServerBusy):
+            with controller.admit():
+                pass
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+        holder.join()
+
+    assert controller.stats()['rejected'] == 1
+
+
+def test_slot_is_released_when_the_operation_fails():
+    controller = AdmissionController('warm_load', limit=1, queue_size=0, timeout=0)
+
+    with pytest.raises(ValueError):
+        with controller.admit():
+            raise ValueError('parse error')
+
+    with controller.admit():
+        assert controller.stats()['active'] == 1
+    assert controller.stats()['active'] == 0
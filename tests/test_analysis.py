@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.analysis import (
+    KDE_GRID_SIZE, KDE_SPAN, LAP_REASONS, MIN_STINT_LAPS, classify_laps, compute_race_gaps, compute_race_positions,
+    fit_tyre_degradation, lap_time_distributions
+)
+
+
+def stint_laps(seed=0):
+    """Two drivers with two stints each, one of them too short to fit."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    stints = [('VER', 1, 'SOFT', 12, 0.08), ('VER', 2, 'HARD', 20, 0.03),
+              ('HAM', 1, 'MEDIUM', 18, 0.05), ('HAM', 2, 'SOFT', MIN_STINT_LAPS - 1, 0.1)]
+    lap_number = {'VER': 1, 'HAM': 1}
+    for driver, stint, compound, length, slope in stints:
+        for tyre_life in range(1, length + 1):
+            rows.append({
+                'Driver': driver, 'Team': 'Red Bull Racing' if driver == 'VER' else 'Mercedes',
+                'Stint': float(stint), 'Compound': compound, 'LapNumber': lap_number[driver],
+                'TyreLife': float(tyre_life),
+                'LapTime': 90 + slope * tyre_life + rng.normal(0, 0.2),
+                'PitInTime': pd.NaT, 'PitOutTime': pd.NaT,
+            })
+            lap_number[driver] += 1
+    laps = pd.DataFrame(rows)
+    laps['LapTime'] = pd.to_timedelta(laps['LapTime'], unit='s')
+    # An out lap, which the fit leaves out
+    laps.loc[0, 'PitOutTime'] = pd.Timedelta(seconds=3600)
+    return laps
+
+
+def race_laps(rows):
+    """Laps from (driver, lap number, session time at the line or None, lap start, lap time) rows."""
+    laps = pd.DataFrame(rows, columns=['Driver', 'LapNumber', 'Time', 'LapStartTime', 'LapTime'])
+    for column in ['Time', 'LapStartTime', 'LapTime']:
+        laps[column] = pd.to_timedelta(laps[column], unit='s')
+    return laps
+
+
+def test_batched_fit_matches_polyfit_per_stint():
+    laps = stint_laps()
+    stints, points = fit_tyre_degradation(laps)
+
+    assert len(points) == len(laps) - 1
+    for _, stint in stints.iterrows():
+        fitted = points[(points['Driver'] == stint['Driver']) & (points['Stint'] == stint['Stint'])]
+        if len(fitted) < MIN_STINT_LAPS:
+            assert np.isnan(stint['Slope']) and np.isnan(stint['Intercept'])
+            continue
+
+        slope, intercept = np.polyfit(fitted['TyreLife'], fitted['LapTime'], 1)
+        assert stint['Slope'] == pytest.approx(slope, rel=1e-9)
+        assert stint['Intercept'] == pytest.approx(intercept, rel=1e-9)
+
+        residuals = fitted['LapTime'] - (intercept + slope * fitted['TyreLife'])
+        r2 = 1 - (residuals ** 2).sum() / ((fitted['LapTime'] - fitted['LapTime'].mean()) ** 2).sum()
+        assert stint['R2'] == pytest.approx(r2, rel=1e-9)
+
+
+def test_fuel_correction_removes_the_fuel_effect():
+    laps = stint_laps()
+    # A stint losing exactly the fuel effect per lap looks flat once corrected
+    laps['LapTime'] = pd.to_timedelta(90 + 0.06 * (laps['LapNumber'].max() - laps['LapNumber']), unit='s')
+
+    stints, _ = fit_tyre_degradation(laps, fuel_corrected=True)
+
+    fitted = stints.dropna(subset=['Slope'])
+    assert np.allclose(fitted['Slope'], 0, atol=1e-9)
+
+
+def test_race_gaps_and_intervals():
+    laps = race_laps([
+        ('VER', 1, 100.0, 0.0, 100.0), ('VER', 2, 190.0, 100.0, 90.0), ('VER', 3, 280.0, 190.0, 90.0),
+        # Missing Time stamp, rebuilt from LapStartTime + LapTime
+        ('LEC', 1, 101.5, 0.0, 101.5), ('LEC', 2, None, 101.5, 90.0), ('LEC', 3, 283.0, 191.5, 91.5),
+        # Passes LEC on lap 2, retires after it
+        ('HAM', 1, 102.0, 0.0, 102.0), ('HAM', 2, 191.0, 102.0, 89.0),
+    ])
+
+    gaps = compute_race_gaps(laps)
+
+    assert gaps['drivers'] == ['HAM', 'LEC', 'VER']
+    assert list(gaps['laps']) == [1, 2, 3]
+    np.testing.assert_allclose(gaps['gap'], [[2.0, 1.0, np.nan],
+                                             [1.5, 1.5, 3.0],
+                                             [0.0, 0.0, 0.0]])
+    # The interval is to the car that crossed the line just before, never negative
+    np.testing.assert_allclose(gaps['interval'], [[0.5, 1.0, np.nan],
+                                                  [1.5, 0.5, 3.0],
+                                                  [0.0, 0.0, 0.0]])
+
+
+def test_race_gaps_without_laps():
+    gaps = compute_race_gaps(race_laps([]))
+
+    assert gaps['drivers'] == []
+    assert gaps['gap'].size == 0
+
+
+def test_race_positions_and_swaps():
+    laps = pd.DataFrame({
+        'Driver': ['VER', 'VER', 'VER', 'LEC', 'LEC', 'LEC', 'HAM', 'HAM', 'HAM'],
+        'LapNumber': [1, 2, 3] * 3,
+        'Position': [1, 1, 2, 2, 3, 1, 3, 2, 3],
+        'PitInTime': pd.to_timedelta([None, 200.0, None, None, None, None, None, None, None], unit='s'),
+        'PitOutTime': pd.to_timedelta([None, None, 210.0, None, None, None, None, None, None], unit='s'),
+    })
+
+    positions = compute_race_positions(laps)
+
+    assert positions['drivers'] == ['HAM', 'LEC', 'VER']
+    np.testing.assert_array_equal(positions['positions'], [[3, 2, 3], [2, 3, 1], [1, 1, 2]])
+
+    # HAM passes LEC on lap 2; on lap 3 LEC passes HAM back on track and
+    # gets ahead of VER, whose stop makes that swap pit related
+    events = positions['events']
+    assert events[['Lap', 'Driver', 'Overtaken', 'Position', 'Pit']].values.tolist() == [
+        [2, 'HAM', 'LEC', 2, False],
+        [3, 'LEC', 'HAM', 1, False],
+        [3, 'LEC', 'VER', 1, True],
+    ]
+
+
+def test_classify_laps_reasons():
+    # (driver, lap number, lap time, pit in, pit out, track status, deleted)
+    rows = [
+        ('VER', 1, 95.0, None, None, '1', False),
+        ('VER', 2, 90.0, None, None, '1', False),
+        ('VER', 3, 90.2, 300.0, None, '1', True),
+        ('VER', 4, 89.9, None, 330.0, '1', False),
+        ('VER', 5, 90.1, None, None, '4', False),
+        ('VER', 6, 90.3, None, None, '1', False),
+        ('LEC', 1, 90.0, None, None, '1', False),
+        ('LEC', 2, 120.0, None, None, '1', False),
+        ('LEC', 3, 90.4, None, None, '1', True),
+        ('LEC', 4, 89.8, None, None, '671', False),
+        ('LEC', 5, None, None, None, '1', False),
+        ('LEC', 6, 90.1, None, None, '1', False),
+        ('LEC', 7, 90.2, None, None, '1', False),
+        ('LEC', 8, 90.0, None, None, '1', False),
+        ('LEC', 9, 91.9, None, None, '1', False),
+    ]
+    laps = pd.DataFrame(rows, columns=['Driver', 'LapNumber', 'LapTime', 'PitInTime', 'PitOutTime',
+                                       'TrackStatus', 'Deleted'])
+    for column in ['LapTime', 'PitInTime', 'PitOutTime']:
+        laps[column] = pd.to_timedelta(laps[column], unit='s')
+
+    classes = classify_laps(laps)
+
+    assert list(classes.columns) == LAP_REASONS + ['Clean', 'Reason']
+    assert classes['Reason'].tolist() == [
+        'first_lap', '', 'pit', 'pit', 'safety_car', '',
+        # 120s is beyond 107% of the fastest lap, 91.9s far off LEC's median
+        'first_lap', 'outlier', 'deleted', 'safety_car', 'no_time', '', '', '', 'outlier',
+    ]
+    assert classes['Clean'].tolist() == [reason == '' for reason in classes['Reason']]
+    # Every reason that applies is flagged, the first one is reported
+    assert classes.loc[2, 'pit'] and classes.loc[2, 'deleted']
+
+
+def test_classify_laps_without_optional_columns():
+    laps = pd.DataFrame({
+        'Driver': ['VER', 'VER', 'VER'],
+        'LapNumber': [2, 3, 4],
+        'LapTime': pd.to_timedelta([90.0, 90.5, 90.2], unit='s'),
+    })
+
+    classes = classify_laps(laps)
+
+    assert classes['Clean'].all()
+    assert not classes[LAP_REASONS].any().any()
+
+
+def test_lap_time_distributions_match_per_group_statistics():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([90 + rng.normal(0, 0.4, 30), 91 + rng.normal(0, 0.8, 12), [92.5, 92.5]])
+    values[29] = 96.0
+    codes = np.repeat([0, 1, 2], [30, 12, 2])
+    # Groups don't have to be contiguous
+    shuffle = rng.permutation(len(values))
+    values, codes = values[shuffle], codes[shuffle]
+
+    distributions = lap_time_distributions(values, codes, 3)
+    stats = distributions['stats']
+
+    assert distributions['grid'].shape == distributions['density'].shape == (3, KDE_GRID_SIZE)
+    for group in range(3):
+        laps = pd.Series(values[codes == group])
+        q1, median, q3 = laps.quantile([0.25, 0.5, 0.75])
+        assert stats.loc[group, 'count'] == len(laps)
+        assert stats.loc[group, ['mean', 'q1', 'median', 'q3']].tolist() == pytest.approx(
+            [laps.mean(), q1, median, q3])
+        # Whiskers stop at the last lap within 1.5 IQR of the box
+        assert stats.loc[group, 'lowerfence'] == laps[laps >= q1 - 1.5 * (q3 - q1)].min()
+        assert stats.loc[group, 'upperfence'] == laps[laps <= q3 + 1.5 * (q3 - q1)].max()
+
+    # The 96s lap lies outside the whiskers of its group
+    assert stats.loc[0, 'upperfence'] < 96.0
+
+    # Silverman's bandwidth and a direct Gaussian KDE on the group's grid
+    laps = values[codes == 1]
+    iqr = np.subtract(*np.percentile(laps, [75, 25]))
+    bandwidth = 0.9 * min(laps.std(ddof=1), iqr / 1.34) * len(laps) ** -0.2
+    grid = distributions['grid'][1]
+    assert grid[0] == pytest.approx(laps.min() - KDE_SPAN * bandwidth)
+    assert grid[-1] == pytest.approx(laps.max() + KDE_SPAN * bandwidth)
+    density = np.exp(-0.5 * ((grid[:, None] - laps[None, :]) / bandwidth) ** 2).sum(axis=1)
+    np.testing.assert_allclose(distributions['density'][1], density / density.max())
+
+
+def test_lap_time_distributions_of_identical_laps():
+    distributions = lap_time_distributions(np.array([92.5, 92.5]), np.array([0, 0]), 1)
+
+    # No spread: a 0.1s bandwidth instead of a zero-width kernel
+    grid = distributions['grid'][0]
+    assert grid[0] == pytest.approx(92.5 - KDE_SPAN * 0.1)
+    assert np.isfinite(distributions['density']).all()
+    assert distributions['density'].max() == 1
@@ -0,0 +1,76 @@
+import contextvars
+
+import pytest
+
+from utils import cancellation
+from utils.cancellation import RequestCancelled, begin_request, check_cancelled, end_request, is_cancelled
+
+
+def in_new_callback(function, *args):
+    """Run function in its own context, like a concurrent Dash callback."""
+    return contextvars.copy_context().run(function, *args)
+
+
+@pytest.fixture(autouse=True)
+def fresh_generations(monkeypatch):
+    monkeypatch.setattr(cancellation, '_generations', cancellation.OrderedDict())
+
+
+def test_newer_request_cancels_older_one():
+    token = begin_request('client-a', 'figure')
+    try:
+        assert not is_cancelled()
+        in_new_callback(begin_request, 'client-a', 'figure')
+        assert is_cancelled()
+        with pytest.raises(RequestCancelled):
+            check_cancelled()
+    finally:
+        end_request(token)
+
+
+def test_other_channels_and_clients_are_independent():
+    token = begin_request('client-a', 'figure')
+    try:
+        in_new_callback(begin_request, 'client-a', 'table')
+        in_new_callback(begin_request, 'client-b', 'figure')
+        assert not is_cancelled()
+    finally:
+        end_request(token)
+
+
+def test_requests_without_client_id_are_never_cancelled():
+    token = begin_request(None, 'figure')
+    try:
+        in_new_callback(begin_request, None, 'figure')
+        check_cancelled()
+    finally:
+        end_request(token)
+
+    # Outside of any request too
+    check_cancelled()
+
+
+def test_forgotten_channels_are_not_cancelled(monkeypatch):
+    monkeypatch.setattr(cancellation, 'MAX_TRACKED_CHANNELS', 2)
+    token = begin_request('client-a', 'figure')
+    try:
+        # Two more active channels push the oldest one out
+        in_new_callback(begin_request, 'client-b', 'figure')
+        in_new_callback(begin_request, 'client-c', 'figure')
+
+        assert ('client-a', 'figure') not in cancellation._generations
+        assert len(cancellation._generations) == 2
+        assert not is_cancelled()
+    finally:
+        end_request(token)
+
+
+def test_end_request_restores_the_outer_request():
+    outer = begin_request('client-a', 'figure')
+    inner = begin_request(None, 'figure')
+    end_request(inner)
+    try:
+        in_new_callback(begin_request, 'client-a', 'figure')
+        assert is_cancelled()
+    finally:
+        end_request(outer)
@@ -0,0 +1,53 @@
+import contextvars
+from contextlib import nullcontext
+
+import pandas as pd
+import pytest
+
+from utils import data_loader
+from utils.cancellation import RequestCancelled, begin_request, end_request
+
+
+class FakeSession:
+    """Stand-in for a fastf1 session, counting its loads."""
+
+    def __init__(self):
+        self.loads = []
+        self.laps = pd.DataFrame({'Driver': ['VER'], 'Team': ['Red Bull Racing'], 'LapNumber': [2],
+                                  'Compound': ['SOFT'], 'LapTime': pd.to_timedelta([91.2], unit='s')})
+
+    def load(self, **options):
+        self.loads.append(options)
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(data_loader, '_sessions', data_loader.OrderedDict())
+    monkeypatch.setattr(data_loader.fastf1, 'get_session', lambda season, event, session_type: session)
+    monkeypatch.setattr(data_loader, 'is_session_cached', lambda session, profile: True)
+    monkeypatch.setattr(data_loader, 'session_file_lock', lambda *args, **kwargs: nullcontext())
+    return session
+
+
+@pytest.mark.parametrize('profile', ['full', 'laps', 'results'])
+def test_each_profile_loads_once(fake_session, profile):
+    loaded = data_loader.load_session(2023, 'Bahrain', 'R', profile)
+
+    assert loaded is fake_session
+    assert fake_session.loads == [data_loader.LOAD_PROFILES[profile]]
+    assert data_loader.load_session(2023, 'Bahrain', 'R', profile) is fake_session
+    assert len(fake_session.loads) == 1
+
+
+def test_superseded_load_is_not_kept(fake_session):
+    token = begin_request('client', 'figure')
+    # A newer request from the same client arrives, in its own callback, while this one loads
+    fake_session.load = lambda **options: contextvars.copy_context().run(begin_request, 'client', 'figure')
+    try:
+        with pytest.raises(RequestCancelled):
+            data_loader.load_session(2023, 'Bahrain', 'R')
+    finally:
+        end_request(token)
+
+    assert not data_loader._sessions
@@ -0,0 +1,53 @@
+import os
+
+from utils.result_cache import ResultCache, make_result_key
+
+
+def test_key_treats_lists_as_sets():
+    assert make_result_key(drivers=['VER', 'HAM']) == make_result_key(drivers=['HAM', 'VER'])
+    assert make_result_key(drivers=['VER']) != make_result_key(drivers=['HAM'])
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'), memory_size=2)
+    for key in ['a1', 'b2', 'c3']:
+        cache.set(key, {'key': key})
+
+    assert list(cache._memory) == ['b2', 'c3']
+
+    # A hit makes an entry the most recently used one
+    cache.get('b2')
+    cache.set('d4', {'key': 'd4'})
+    assert list(cache._memory) == ['b2', 'd4']
+
+
+def test_evicted_entries_are_served_from_disk(tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'), memory_size=1)
+    cache.set('a1', {'figure': [1, 2, 3]})
+    cache.set('b2', {'figure': [4]})
+
+    assert 'a1' not in cache._memory
+    assert cache.get('a1') == {'figure': [1, 2, 3]}
+    # Other processes share the disk tier
+    assert ResultCache(str(tmp_path / 'results')).get('b2') == {'figure': [4]}
+    assert cache.get('missing') is None
+
+
+def test_disk_is_pruned_to_the_most_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'), disk_size=150)
+    keys = [f"{i:04x}" for i in range(199)]
+    for age, key in enumerate(keys):
+        cache.set(key, age)
+        # Oldest first, a second apart
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+
+    # Reading an old entry touches it, so it survives pruning
+    cache.get(keys[0])
+
+    # The 200th write prunes the disk tier
+    cache.set('ffff', 'newest')
+
+    on_disk = {name[:-len('.json')] for _, _, files in os.walk(cache.cache_dir) for name in files}
+    assert len(on_disk) == 150
+    assert keys[0] in on_disk and 'ffff' in on_disk
+    assert not on_disk & set(keys[1:50])
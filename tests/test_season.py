@@ -0,0 +1,59 @@
+from concurrent.futures import Future
+
+import pytest
+
+from utils import season
+
+
+class InlineExecutor:
+    """Runs submitted work right away, in the calling thread."""
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+class MemoryCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+@pytest.fixture
+def season_jobs(monkeypatch):
+    cache = MemoryCache()
+    monkeypatch.setattr(season, '_jobs', {})
+    monkeypatch.setattr(season, '_get_executor', InlineExecutor)
+    monkeypatch.setattr(season, 'get_result_cache', lambda: cache)
+    monkeypatch.setitem(season.SEASON_VIEWS, 'season_pace',
+                        (lambda year, event, session_type: {'event': event}, None))
+    return cache
+
+
+def test_events_are_fetched_outside_the_jobs_lock(season_jobs, monkeypatch):
+    def get_events_for_season(year):
+        assert not season._jobs_lock.locked()
+        return [{'label': 'Bahrain', 'value': 'Bahrain'}, {'label': 'Jeddah', 'value': 'Jeddah'}]
+    monkeypatch.setattr(season, 'get_events_for_season', get_events_for_season)
+
+    results, done = season.get_season_results('season_pace', 2023, 'R')
+
+    assert results == [{'event': 'Bahrain'}, {'event': 'Jeddah'}]
+    assert done
+
+
+def test_failed_schedule_lets_the_next_poll_start_over(season_jobs, monkeypatch):
+    def get_events_for_season(year):
+        raise ConnectionError('schedule unavailable')
+    monkeypatch.setattr(season, 'get_events_for_season', get_events_for_season)
+
+    with pytest.raises(ConnectionError):
+        season.get_season_results('season_pace', 2023, 'R')
+
+    assert season._jobs == {}
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.session_context import SessionContext
+
+
+class LapSession:
+    """Stand-in for a loaded fastf1 session with laps only."""
+
+    def __init__(self, laps):
+        self.laps = laps
+
+
+def make_laps(seed=0):
+    rng = np.random.default_rng(seed)
+    n = 240
+    return pd.DataFrame({
+        'Driver': rng.choice(['VER', 'PER', 'HAM', 'RUS'], n),
+        'Team': None,
+        'LapNumber': rng.integers(2, 8, n),
+        'Compound': rng.choice(['SOFT', 'MEDIUM', 'HARD'], n),
+        'LapTime': pd.to_timedelta(90 + rng.normal(0, 0.5, n), unit='s'),
+        'Stint': 1,
+        'TrackStatus': '1',
+    }).assign(Team=lambda laps: laps['Driver'].map({'VER': 'Red Bull', 'PER': 'Red Bull',
+                                                      'HAM': 'Mercedes', 'RUS': 'Mercedes'}))
+
+
+@pytest.mark.parametrize('keys, by_compound', [
+    (['Team', 'LapNumber'], False),
+    (['Team', 'Compound', 'LapNumber'], True),
+])
+def test_team_lap_stats_match_groupby(keys, by_compound):
+    session = LapSession(make_laps())
+    context = SessionContext(session)
+    frame = context.lap_frame
+
+    stats = context.team_lap_stats(['SOFT', 'MEDIUM'], by_compound=by_compound)
+
+    selected = frame[frame['Compound'].isin(['SOFT', 'MEDIUM'])]
+    expected = selected.groupby(keys)['LapTime'].agg(['mean', 'min', 'max', 'std'])
+    pd.testing.assert_frame_equal(stats, expected, check_exact=False, rtol=1e-9, check_names=False)
+
+
+def test_team_lap_stats_variants_share_one_computation():
+    session = LapSession(make_laps())
+    context = SessionContext(session)
+
+    context.team_lap_stats()
+    computed = dict(context._values)
+    context.team_lap_stats(by_compound=True)
+
+    assert context._values.keys() == computed.keys()
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+pytest.importorskip('fastf1')
+
+from fastf1 import api
+
+from utils import tracing
+
+
+def fake_session_load():
+    """Make the fastf1 API calls Session.load() makes, looked up on the module like it does."""
+    api._extended_timing_data('/static/2023/2023-03-05_Bahrain_Grand_Prix/2023-03-05_Race/')
+    api.car_data('/static/2023/2023-03-05_Bahrain_Grand_Prix/2023-03-05_Race/')
+
+
+def test_patched_load_emits_stage_spans(tmp_path, monkeypatch):
+    trace_file = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(tracing, 'TRACE_FILE', str(trace_file))
+    monkeypatch.setattr(tracing, 'TRACING', True)
+    monkeypatch.setattr(tracing, '_histograms', {})
+
+    # Stand-ins for the network calls; monkeypatch restores the real ones
+    monkeypatch.setattr(api, '_extended_timing_data', lambda path, **kwargs: ([], []), raising=False)
+    monkeypatch.setattr(api, 'car_data', lambda path, **kwargs: {}, raising=False)
+
+    tracing.instrument_fastf1()
+    fake_session_load()
+
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert [(span['stage'], span['call']) for span in spans] == [
+        ('laps', '_extended_timing_data'),
+        ('car_data', 'car_data'),
+    ]
+
+    histograms = tracing.stage_histograms()
+    assert histograms['laps']['count'] == 1
+    assert histograms['car_data']['count'] == 1
+
+
+def test_instrument_fastf1_wraps_once(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACING', True)
+    monkeypatch.setattr(api, '_extended_timing_data', lambda path, **kwargs: ([], []), raising=False)
+
+    tracing.instrument_fastf1()
+    wrapped = api._extended_timing_data
+    tracing.instrument_fastf1()
+
+    assert api._extended_timing_data is wrapped
+
+
+def test_trace_file_is_rotated(tmp_path, monkeypatch):
+    trace_file = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(tracing, 'TRACE_FILE', str(trace_file))
+    monkeypatch.setattr(tracing, 'TRACING', True)
+    monkeypatch.setattr(tracing, 'TRACE_MAX_BYTES', 500)
+    monkeypatch.setattr(tracing, '_histograms', {})
+
+    for _ in range(20):
+        tracing.record('result_cache.hit', 0.001)
+
+    # The last write may just have rotated the file away
+    size = trace_file.stat().st_size if trace_file.exists() else 0
+    assert (tmp_path / 'traces.jsonl.1').exists()
+    assert size <= 500
+
+
+def test_trace_file_is_opened_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACE_FILE', str(tmp_path / 'traces.jsonl'))
+    monkeypatch.setattr(tracing, 'TRACING', True)
+    monkeypatch.setattr(tracing, '_histograms', {})
+    monkeypatch.setattr(tracing, '_trace', None)
+
+    tracing.record('render', 0.01)
+    handle = tracing._trace[2]
+    tracing.record('render', 0.02)
+
+    assert tracing._trace[2] is handle
+    # Line buffered, so every span is on disk as soon as it is recorded
+    assert len((tmp_path / 'traces.jsonl').read_text().splitlines()) == 2
+
+
+def test_tracing_off_touches_no_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACE_FILE', str(tmp_path / 'cache' / 'traces.jsonl'))
+    monkeypatch.setattr(tracing, 'TRACING', False)
+    monkeypatch.setattr(tracing, '_trace', None)
+
+    with tracing.span('render'):
+        pass
+
+    assert tracing._trace is None
+    assert not (tmp_path / 'cache').exists()
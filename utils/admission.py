@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# Concurrent operations allowed per resource class. A cold load downloads
+# and parses a session that isn't in the fastf1 cache yet, a warm load reads
+# one from the cache and a render builds a figure or table. Limits and queues
+# are per process: every gunicorn worker and every season pool worker has its
+# own, so the server-wide limit is the limit times the number of processes.
+# Cold fills of the same session are still serialized across processes by
+# the session file lock (see session_file_lock).
+RESOURCE_LIMITS = {
+    'cold_load': int(os.environ.get('F1_COLD_LOAD_LIMIT', '1')),
+    'warm_load': int(os.environ.get('F1_WARM_LOAD_LIMIT', '2')),
+    'render': int(os.environ.get('F1_RENDER_LIMIT', '4')),
+}
+
+# Operations allowed to wait for a slot per resource class; more are turned away
+QUEUE_SIZE = int(os.environ.get('F1_ADMISSION_QUEUE', '8'))
+
+# Longest an operation waits for a slot before it is turned away (seconds)
+QUEUE_TIMEOUT = float(os.environ.get('F1_ADMISSION_TIMEOUT', '30'))
+
+# Time after which a turned away request is retried by the browser (seconds)
+RETRY_AFTER = float(os.environ.get('F1_RETRY_AFTER', '5'))
+
+
+class ServerBusy(Exception):
+    """Raised when an operation can't be admitted because its queue is full."""
+
+    def __init__(self, resource, retry_after=RETRY_AFTER):
+        super().__init__(f"Server busy ({resource}), retrying in {retry_after:g}s")
+        self.resource = resource
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency and waiting queue for one resource class.
+
+    Up to limit operations run at once and up to queue_size more wait for
+    a slot, for at most timeout seconds. Anything beyond that fails fast
+    with ServerBusy, so a spike of requests is turned away with a retry
+    instead of every request timing out together.
+    """
+
+    def __init__(self, resource, limit, queue_size=QUEUE_SIZE, timeout=QUEUE_TIMEOUT):
+        self.resource = resource
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._peak_waiting = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot of this resource class for the duration of the block."""
+        start = time.monotonic()
+        acquired = self._slots.acquire(blocking=False)
+
+        if not acquired:
+            with self._lock:
+                if self._waiting >= self.queue_size:
+                    self._rejected += 1
+                    raise ServerBusy(self.resource)
+                self._waiting += 1
+                self._peak_waiting = max(self._peak_waiting, self._waiting)
+
+            try:
+                acquired = self._slots.acquire(timeout=self.timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        wait = time.monotonic() - start
+        with self._lock:
+            if not acquired:
+                self._rejected += 1
+            else:
+                self._active += 1
+                self._admitted += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+        if not acquired:
+            raise ServerBusy(self.resource)
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._slots.release()
+
+    def stats(self):
+        """Current queue depth and wait-time metrics of this resource class."""
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'active': self._active,
+                'waiting': self._waiting,
+                'peak_waiting': self._peak_waiting,
+                'admitted': self._admitted,
+                'rejected': self._rejected,
+                'mean_wait': round(self._wait_total / self._admitted, 3) if self._admitted else 0.0,
+                'max_wait': round(self._wait_max, 3),
+            }
+
+
+_controllers = {resource: AdmissionController(resource, limit) for resource, limit in RESOURCE_LIMITS.items()}
+
+
+def admit(resource):
+    """Hold a slot of a resource class ('cold_load', 'warm_load' or 'render').
+
+    Raises:
+        ServerBusy: If the resource class and its queue are full
+    """
+    return _controllers[resource].admit()
+
+
+def admission_stats():
+    """Metrics of every resource class of this process, keyed by resource."""
+    return {resource: controller.stats() for resource, controller in _controllers.items()}
@@ -0,0 +1,506 @@
+import numpy as np
+import pandas as pd
+
+# Lap time lost per lap of fuel still on board (seconds), used to fuel-correct
+# lap times: early laps are slower only because the car is heavier
+FUEL_EFFECT_PER_LAP = 0.06
+
+# Stints with fewer usable laps than this are not fitted
+MIN_STINT_LAPS = 3
+
+# Reasons a lap is not clean, in the order they are reported
+LAP_REASONS = ['no_time', 'first_lap', 'pit', 'safety_car', 'deleted', 'outlier']
+
+# Laps slower than this fraction of the session's fastest lap are outliers
+OUTLIER_CUTOFF = 1.07
+
+# Laps slower than a driver's median by this many robust standard deviations
+# (scaled median absolute deviations) are outliers
+OUTLIER_MAD = 3.5
+
+# TrackStatus codes of laps run behind the safety car (4) or under a VSC (6, 7)
+SAFETY_CAR_STATUS = '[467]'
+
+
+def classify_laps(laps):
+    """Classify every lap of a session as clean or not, and why.
+
+    All checks are whole-column operations. A lap is not clean if it has
+    no lap time, is the first lap, is a pit in/out lap, was run under a
+    safety car or VSC, was deleted, or is an outlier: slower than
+    OUTLIER_CUTOFF of the fastest remaining lap, or more than OUTLIER_MAD
+    scaled MADs slower than the driver's median.
+
+    Args:
+        laps (fastf1.core.Laps): Session laps
+
+    Returns:
+        pandas.DataFrame: Indexed like laps, one boolean column per reason
+            in LAP_REASONS, plus Clean (bool) and Reason (the first reason
+            that applies, '' for clean laps)
+    """
+    lap_times = laps['LapTime'].dt.total_seconds()
+    masks = pd.DataFrame(False, index=laps.index, columns=LAP_REASONS)
+
+    masks['no_time'] = lap_times.isna()
+    masks['first_lap'] = laps['LapNumber'] == 1
+    for column in ['PitInTime', 'PitOutTime']:
+        if column in laps.columns:
+            masks['pit'] |= laps[column].notna()
+    if 'TrackStatus' in laps.columns:
+        masks['safety_car'] = laps['TrackStatus'].fillna('').astype(str).str.contains(SAFETY_CAR_STATUS)
+    if 'Deleted' in laps.columns:
+        masks['deleted'] = laps['Deleted'].eq(True)
+
+    # Outliers are judged against the laps that passed every other check
+    candidates = ~masks.any(axis=1)
+    if candidates.any():
+        times = lap_times[candidates]
+        drivers = laps.loc[candidates, 'Driver']
+        deviation = times - times.groupby(drivers).transform('median')
+        mad = deviation.abs().groupby(drivers).transform('median') * 1.4826
+        slow = (times > times.min() * OUTLIER_CUTOFF) | ((mad > 0) & (deviation > OUTLIER_MAD * mad))
+        masks.loc[candidates, 'outlier'] = slow
+
+    not_clean = masks.any(axis=1)
+    masks['Clean'] = ~not_clean
+    masks['Reason'] = masks[LAP_REASONS].idxmax(axis=1).where(not_clean, '')
+    return masks
+
+
+def fit_tyre_degradation(laps, fuel_corrected=False):
+    """Fit lap time against tyre life for every stint of every driver.
+
+    Pit in/out laps are left out. Each stint gets a straight line
+    lap_time = intercept + slope * tyre_life. All stints are solved together
+    as one batched least-squares problem: the per-stint sums of the normal
+    equations are accumulated with np.bincount and the resulting stack of
+    2x2 systems is solved in a single np.linalg.solve call.
+
+    Args:
+        laps (fastf1.core.Laps): Session laps
+        fuel_corrected (bool): Remove the estimated fuel weight effect first
+
+    Returns:
+        tuple: (stints, points) DataFrames. stints has one row per stint with
+            Driver, Team, Stint, Compound, Laps, FirstLap, LastLap,
+            MinTyreLife, MaxTyreLife, Slope, Intercept and R2; points has the
+            fitted laps with Driver, Team, Stint, Compound, LapNumber,
+            TyreLife and LapTime (seconds).
+    """
+    usable = laps['LapTime'].notna() & laps['TyreLife'].notna() & laps['Stint'].notna()
+    for column in ['PitInTime', 'PitOutTime']:
+        if column in laps.columns:
+            usable &= laps[column].isna()
+
+    points = pd.DataFrame({
+        'Driver': laps.loc[usable, 'Driver'],
+        'Team': laps.loc[usable, 'Team'],
+        'Stint': laps.loc[usable, 'Stint'].astype(int),
+        'Compound': laps.loc[usable, 'Compound'].fillna('UNKNOWN'),
+        'LapNumber': laps.loc[usable, 'LapNumber'],
+        'TyreLife': laps.loc[usable, 'TyreLife'].astype(float),
+        'LapTime': laps.loc[usable, 'LapTime'].dt.total_seconds(),
+    })
+
+    if fuel_corrected and len(points) > 0:
+        remaining_laps = laps['LapNumber'].max() - points['LapNumber']
+        points['LapTime'] = points['LapTime'] - FUEL_EFFECT_PER_LAP * remaining_laps
+
+    if len(points) == 0:
+        columns = ['Driver', 'Team', 'Stint', 'Compound', 'Laps', 'FirstLap', 'LastLap',
+                   'MinTyreLife', 'MaxTyreLife', 'Slope', 'Intercept', 'R2']
+        return pd.DataFrame(columns=columns), points
+
+    codes = points.groupby(['Driver', 'Stint'], sort=True).ngroup().to_numpy()
+    n_stints = codes.max() + 1
+    x = points['TyreLife'].to_numpy()
+    y = points['LapTime'].to_numpy()
+
+    # Per-stint sums for the normal equations of y = a + b * x
+    n = np.bincount(codes, minlength=n_stints).astype(float)
+    sx = np.bincount(codes, weights=x, minlength=n_stints)
+    sy = np.bincount(codes, weights=y, minlength=n_stints)
+    sxx = np.bincount(codes, weights=x * x, minlength=n_stints)
+    sxy = np.bincount(codes, weights=x * y, minlength=n_stints)
+
+    normal = np.empty((n_stints, 2, 2))
+    normal[:, 0, 0] = n
+    normal[:, 0, 1] = sx
+    normal[:, 1, 0] = sx
+    normal[:, 1, 1] = sxx
+    rhs = np.stack([sy, sxy], axis=1)
+
+    # Short stints and stints without any tyre life spread have no unique fit
+    solvable = (n >= MIN_STINT_LAPS) & (n * sxx - sx * sx > 1e-9)
+    coefficients = np.full((n_stints, 2), np.nan)
+    if solvable.any():
+        coefficients[solvable] = np.linalg.solve(normal[solvable], rhs[solvable][..., None])[..., 0]
+    intercept, slope = coefficients[:, 0], coefficients[:, 1]
+
+    # Goodness of fit per stint
+    residuals = y - (intercept[codes] + slope[codes] * x)
+    mean_y = sy / np.maximum(n, 1)
+    ss_res = np.bincount(codes, weights=residuals * residuals, minlength=n_stints)
+    ss_tot = np.bincount(codes, weights=(y - mean_y[codes]) ** 2, minlength=n_stints)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+
+    points['StintCode'] = codes
+    stints = points.groupby('StintCode').agg(
+        Driver=('Driver', 'first'),
+        Team=('Team', 'first'),
+        Stint=('Stint', 'first'),
+        Compound=('Compound', 'first'),
+        Laps=('LapNumber', 'size'),
+        FirstLap=('LapNumber', 'min'),
+        LastLap=('LapNumber', 'max'),
+        MinTyreLife=('TyreLife', 'min'),
+        MaxTyreLife=('TyreLife', 'max'),
+    )
+    stints['Slope'] = slope[stints.index]
+    stints['Intercept'] = intercept[stints.index]
+    stints['R2'] = r2[stints.index]
+
+    return stints.reset_index(drop=True), points
+
+
+def summarize_degradation_by_compound(stints):
+    """Lap-weighted mean degradation per compound from fitted stints.
+
+    Returns:
+        pandas.DataFrame: Compound, Stints, Laps, Slope and R2
+    """
+    fitted = stints[stints['Slope'].notna()]
+    if len(fitted) == 0:
+        return pd.DataFrame(columns=['Compound', 'Stints', 'Laps', 'Slope', 'R2'])
+
+    weighted = fitted.assign(
+        WeightedSlope=fitted['Slope'] * fitted['Laps'],
+        WeightedR2=fitted['R2'].fillna(0) * fitted['Laps'],
+    )
+    summary = weighted.groupby('Compound').agg(
+        Stints=('Slope', 'size'),
+        Laps=('Laps', 'sum'),
+        WeightedSlope=('WeightedSlope', 'sum'),
+        WeightedR2=('WeightedR2', 'sum'),
+    )
+    summary['Slope'] = summary['WeightedSlope'] / summary['Laps']
+    summary['R2'] = summary['WeightedR2'] / summary['Laps']
+    return summary[['Stints', 'Laps', 'Slope', 'R2']].reset_index()
+
+
+def pivot_by_driver_and_lap(drivers, lap_numbers, values):
+    """Scatter per-lap values into a drivers x laps matrix.
+
+    Args:
+        drivers (array-like): Driver of each row
+        lap_numbers (array-like): Lap number of each row
+        values (array-like): Value of each row, as float
+
+    Returns:
+        tuple: (driver names, lap numbers, matrix) with NaN where a driver
+            has no value for a lap
+    """
+    driver_codes, driver_names = pd.factorize(pd.Series(drivers), sort=True)
+    laps = np.asarray(lap_numbers, dtype=float)
+    known = (driver_codes >= 0) & ~np.isnan(laps)
+
+    lap_index = laps[known].astype(int)
+    first_lap = lap_index.min() if len(lap_index) > 0 else 1
+    last_lap = lap_index.max() if len(lap_index) > 0 else 0
+
+    matrix = np.full((len(driver_names), last_lap - first_lap + 1), np.nan)
+    matrix[driver_codes[known], lap_index - first_lap] = np.asarray(values, dtype=float)[known]
+
+    return list(driver_names), np.arange(first_lap, last_lap + 1), matrix
+
+
+def compute_race_gaps(laps):
+    """Gap to the leader and interval to the car ahead after every lap.
+
+    The session time at which each driver completed each lap is pivoted
+    into one drivers x laps array. Where fastf1 has no Time stamp for a lap
+    it is rebuilt from LapStartTime + LapTime. The leader of a lap is the
+    first car to complete it; the car ahead is the previous car to cross
+    the line on the same lap, found by sorting every lap column at once.
+
+    Args:
+        laps (fastf1.core.Laps): Session laps
+
+    Returns:
+        dict: drivers (list), laps (lap numbers), gap and interval
+            (drivers x laps arrays, seconds, NaN where the driver didn't
+            complete the lap)
+    """
+    finish = laps['Time']
+    if 'LapStartTime' in laps.columns:
+        finish = finish.fillna(laps['LapStartTime'] + laps['LapTime'])
+
+    drivers, lap_numbers, times = pivot_by_driver_and_lap(
+        laps['Driver'], laps['LapNumber'], finish.dt.total_seconds()
+    )
+
+    if len(drivers) == 0:
+        return {'drivers': drivers, 'laps': lap_numbers, 'gap': times, 'interval': times}
+
+    # fmin skips the NaNs of drivers who didn't complete a lap
+    leader = np.fmin.reduce(times, axis=0)
+    gap = times - leader
+
+    # Order cars by crossing time on every lap (NaN sorts last) and take the
+    # difference to the car before; the leader's interval is zero
+    order = np.argsort(times, axis=0)
+    crossed = np.take_along_axis(times, order, axis=0)
+    sorted_interval = np.diff(crossed, axis=0, prepend=crossed[:1])
+    interval = np.empty_like(times)
+    np.put_along_axis(interval, order, sorted_interval, axis=0)
+    interval[np.isnan(times)] = np.nan
+
+    return {'drivers': drivers, 'laps': lap_numbers, 'gap': gap, 'interval': interval}
+
+
+def compute_race_positions(laps):
+    """Positions of the full field after every lap and the swaps between them.
+
+    The Position column is pivoted into a drivers x laps array. A swap is a
+    pair of drivers whose order flips from one lap to the next; all pairs
+    and laps are compared at once by broadcasting the array against itself.
+    Swaps where either driver was on an in or out lap are marked as pit
+    related, the others are on-track overtakes.
+
+    Args:
+        laps (fastf1.core.Laps): Session laps
+
+    Returns:
+        dict: drivers (list), laps (lap numbers), positions (drivers x laps
+            array, NaN where unknown) and events (DataFrame with Lap,
+            Driver, Overtaken, Position and Pit, one row per swap)
+    """
+    drivers, lap_numbers, positions = pivot_by_driver_and_lap(
+        laps['Driver'], laps['LapNumber'], laps['Position']
+    )
+
+    pit_lap = np.zeros(len(laps), dtype=bool)
+    for column in ['PitInTime', 'PitOutTime']:
+        if column in laps.columns:
+            pit_lap |= laps[column].notna().to_numpy()
+    _, _, pitted = pivot_by_driver_and_lap(laps['Driver'], laps['LapNumber'], pit_lap)
+    pitted = pitted == 1
+
+    # ahead[a, b, l]: a was ahead of b after lap l (NaN compares as False)
+    ahead = positions[:, None, :] < positions[None, :, :]
+    behind = positions[:, None, 1:] > positions[None, :, 1:]
+    overtaken, driver, lap = np.nonzero(ahead[:, :, :-1] & behind)
+    lap = lap + 1
+
+    pit = pitted[driver, lap] | pitted[overtaken, lap] | pitted[driver, lap - 1] | pitted[overtaken, lap - 1]
+
+    names = np.array(drivers, dtype=object)
+    events = pd.DataFrame({
+        'Lap': lap_numbers[lap],
+        'Driver': names[driver],
+        'Overtaken': names[overtaken],
+        'Position': positions[driver, lap],
+        'Pit': pit,
+    }).sort_values(['Lap', 'Position'], ignore_index=True)
+
+    return {'drivers': drivers, 'laps': lap_numbers, 'positions': positions, 'events': events}
+
+
+def compute_stints(laps):
+    """One row per stint of every driver, from a single groupby.
+
+    Args:
+        laps (fastf1.core.Laps): Session laps
+
+    Returns:
+        pandas.DataFrame: Driver, Team, Stint, Compound, FreshTyre,
+            StartLap, EndLap, Laps and StartTyreLife
+    """
+    stint_laps = laps[laps['Stint'].notna()]
+    stints = stint_laps.assign(
+        Stint=stint_laps['Stint'].astype(int),
+        Compound=stint_laps['Compound'].fillna('UNKNOWN'),
+    ).groupby(['Driver', 'Stint'], sort=True).agg(
+        Team=('Team', 'first'),
+        Compound=('Compound', 'first'),
+        FreshTyre=('FreshTyre', 'first'),
+        StartLap=('LapNumber', 'min'),
+        EndLap=('LapNumber', 'max'),
+        StartTyreLife=('TyreLife', 'min'),
+    ).reset_index()
+
+    stints['Laps'] = stints['EndLap'] - stints['StartLap'] + 1
+    return stints
+
+
+# Weather channels attached to every lap
+WEATHER_COLUMNS = ['TrackTemp', 'AirTemp', 'Humidity', 'Rainfall']
+
+
+def annotate_weather(laps, weather):
+    """Attach the weather reading closest to each lap's end.
+
+    One merge_asof of all laps against the weather samples, both keyed on
+    session time. Laps without a Time stamp use their LapStartTime.
+
+    Args:
+        laps (fastf1.core.Laps): Session laps
+        weather (pandas.DataFrame): session.weather_data, or None
+
+    Returns:
+        pandas.DataFrame: Indexed like laps, with the WEATHER_COLUMNS the
+            weather data has (all NaN if there is none)
+    """
+    columns = [column for column in WEATHER_COLUMNS if weather is not None and column in weather.columns]
+    if not columns or len(weather) == 0:
+        return pd.DataFrame(np.nan, index=laps.index, columns=WEATHER_COLUMNS)
+
+    stamps = laps['Time']
+    if 'LapStartTime' in laps.columns:
+        stamps = stamps.fillna(laps['LapStartTime'])
+
+    left = pd.DataFrame({'SessionTime': stamps, 'LapIndex': laps.index}).dropna(subset=['SessionTime'])
+    right = weather[['Time'] + columns].rename(columns={'Time': 'SessionTime'}).dropna(subset=['SessionTime'])
+
+    merged = pd.merge_asof(left.sort_values('SessionTime'), right.sort_values('SessionTime'),
+                           on='SessionTime', direction='nearest')
+    return merged.set_index('LapIndex')[columns].reindex(index=laps.index, columns=WEATHER_COLUMNS)
+
+
+def compute_sector_bests(laps):
+    """Best sectors, theoretical best lap and sector deltas of every driver.
+
+    A single groupby-min over the sector and lap time columns gives each
+    driver's best sectors and best lap. Deleted laps don't count.
+
+    Args:
+        laps (fastf1.core.Laps): Session laps
+
+    Returns:
+        pandas.DataFrame: Indexed by Driver, sorted by theoretical best, with
+            Team, Sector1-3 (best, seconds), BestLap, TheoreticalBest, Gap
+            (best lap minus theoretical best) and Sector1Delta-Sector3Delta
+            (best sector minus the session-best sector)
+    """
+    if 'Deleted' in laps.columns:
+        laps = laps[~laps['Deleted'].eq(True)]
+
+    times = pd.DataFrame({
+        'Driver': laps['Driver'],
+        'Team': laps['Team'],
+        'Sector1': laps['Sector1Time'].dt.total_seconds(),
+        'Sector2': laps['Sector2Time'].dt.total_seconds(),
+        'Sector3': laps['Sector3Time'].dt.total_seconds(),
+        'BestLap': laps['LapTime'].dt.total_seconds(),
+    })
+    sectors = ['Sector1', 'Sector2', 'Sector3']
+
+    bests = times.groupby('Driver').agg(
+        Team=('Team', 'first'),
+        Sector1=('Sector1', 'min'),
+        Sector2=('Sector2', 'min'),
+        Sector3=('Sector3', 'min'),
+        BestLap=('BestLap', 'min'),
+    )
+    bests['TheoreticalBest'] = bests[sectors].sum(axis=1, min_count=3)
+    bests['Gap'] = bests['BestLap'] - bests['TheoreticalBest']
+
+    deltas = bests[sectors] - bests[sectors].min()
+    for sector in sectors:
+        bests[f'{sector}Delta'] = deltas[sector]
+
+    return bests.sort_values('TheoreticalBest')
+
+
+# Points of the grid each violin's density is evaluated on. The outlines
+# are drawn as splines, so a coarse grid still looks smooth and keeps the
+# figure close to the size of a Plotly violin of the same laps.
+KDE_GRID_SIZE = 16
+
+# Bandwidths added beyond the smallest and largest value of a violin, like
+# Plotly's default 'soft' span
+KDE_SPAN = 2
+
+
+def lap_time_distributions(values, codes, n_groups):
+    """Gaussian KDE and box statistics of many groups of lap times at once.
+
+    Bandwidths follow Silverman's rule. Each group gets a fixed-size grid
+    spanning its values; the kernels of all laps are evaluated on their
+    group's grid in one array operation and summed per group with
+    np.add.reduceat. Quantiles come from a single groupby.
+
+    Args:
+        values (numpy.ndarray): Lap times in seconds
+        codes (numpy.ndarray): Group of each lap, 0 to n_groups - 1, every
+            group having at least one lap
+        n_groups (int): Number of groups
+
+    Returns:
+        dict: grid and density (n_groups x KDE_GRID_SIZE arrays, density
+            scaled to a peak of 1 per group) and stats (DataFrame indexed by
+            group with count, mean, q1, median, q3, lowerfence, upperfence)
+    """
+    series = pd.Series(values)
+    groups = series.groupby(codes)
+
+    quartiles = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    stats = pd.DataFrame({
+        'count': groups.size(),
+        'mean': groups.mean(),
+        'q1': quartiles[0.25],
+        'median': quartiles[0.5],
+        'q3': quartiles[0.75],
+    }).reindex(range(n_groups))
+
+    # Whiskers reach the most extreme laps within 1.5 IQR of the box
+    iqr = (stats['q3'] - stats['q1']).to_numpy()
+    low_limit = (stats['q1'].to_numpy() - 1.5 * iqr)[codes]
+    high_limit = (stats['q3'].to_numpy() + 1.5 * iqr)[codes]
+    stats['lowerfence'] = series.where(values >= low_limit).groupby(codes).min()
+    stats['upperfence'] = series.where(values <= high_limit).groupby(codes).max()
+
+    # Silverman's rule of thumb, falling back to the standard deviation and
+    # then to a tenth of a second for groups without spread
+    count = stats['count'].to_numpy(dtype=float)
+    std = groups.std().reindex(range(n_groups)).to_numpy()
+    spread = np.where(iqr > 0, np.fmin(std, iqr / 1.34), std)
+    bandwidth = 0.9 * spread * count ** -0.2
+    bandwidth = np.where(np.isfinite(bandwidth) & (bandwidth > 0), bandwidth, 0.1)
+
+    low = groups.min().to_numpy() - KDE_SPAN * bandwidth
+    high = groups.max().to_numpy() + KDE_SPAN * bandwidth
+    grid = low[:, None] + (high - low)[:, None] * np.linspace(0, 1, KDE_GRID_SIZE)[None, :]
+
+    # Kernel of every lap on its own group's grid, summed per group
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    scaled = (grid[sorted_codes] - values[order][:, None]) / bandwidth[sorted_codes][:, None]
+    kernels = np.exp(-0.5 * scaled * scaled)
+    starts = np.searchsorted(sorted_codes, np.arange(n_groups))
+    density = np.add.reduceat(kernels, starts, axis=0)
+    density /= density.max(axis=1, keepdims=True)
+
+    return {'grid': grid, 'density': density, 'stats': stats}
+
+
+def interpolate_positions(tracks, times):
+    """Car positions of every driver on a common time base.
+
+    Args:
+        tracks (dict): Driver -> (session time, X, Y) numpy arrays, sorted by time
+        times (numpy.ndarray): Session times (seconds) to interpolate at
+
+    Returns:
+        tuple: (x, y) drivers x times arrays in the order of tracks, NaN
+            outside a driver's position data
+    """
+    x = np.full((len(tracks), len(times)), np.nan)
+    y = np.full((len(tracks), len(times)), np.nan)
+    for i, (track_time, track_x, track_y) in enumerate(tracks.values()):
+        if len(track_time) > 0:
+            x[i] = np.interp(times, track_time, track_x, left=np.nan, right=np.nan)
+            y[i] = np.interp(times, track_time, track_y, left=np.nan, right=np.nan)
+    return x, y
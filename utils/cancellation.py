@@ -0,0 +1,68 @@
+import threading
+import contextvars
+from collections import OrderedDict
+
+# Number of (client id, channel) pairs tracked; the least recently active
+# are forgotten, which only means their running requests can't be cancelled
+MAX_TRACKED_CHANNELS = 10000
+
+# Latest request generation per (client id, channel), least recently active first
+_generations = OrderedDict()
+_generations_lock = threading.Lock()
+
+# Request the current callback is working for, as (key, generation)
+_current_request = contextvars.ContextVar('current_request', default=None)
+
+
+class RequestCancelled(Exception):
+    """Raised at a stage boundary when a newer request from the same client superseded this one."""
+
+
+def begin_request(client_id, channel):
+    """Start a new request generation for a client, superseding its previous one.
+
+    Channels keep independent callbacks of the same client (e.g. the figure
+    and the table) from cancelling each other.
+
+    Args:
+        client_id (str): Browser session id from the 'client-id' store
+        channel (str): Name of the work the request does
+
+    Returns:
+        contextvars.Token: Token to pass to end_request
+    """
+    if not client_id:
+        return _current_request.set(None)
+
+    key = (client_id, channel)
+    with _generations_lock:
+        generation = _generations.get(key, 0) + 1
+        _generations[key] = generation
+        _generations.move_to_end(key)
+        while len(_generations) > MAX_TRACKED_CHANNELS:
+            _generations.popitem(last=False)
+    return _current_request.set((key, generation))
+
+
+def end_request(token):
+    """Leave the request scope started by begin_request."""
+    _current_request.reset(token)
+
+
+def is_cancelled():
+    """Whether the current request has been superseded."""
+    request = _current_request.get()
+    if request is None:
+        return False
+
+    key, generation = request
+    with _generations_lock:
+        latest = _generations.get(key)
+    # A forgotten channel has had no newer request
+    return latest is not None and latest != generation
+
+
+def check_cancelled():
+    """Stage boundary: stop the current request if it has been superseded."""
+    if is_cancelled():
+        raise RequestCancelled()
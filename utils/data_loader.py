@@ -1,5 +1,89 @@
 import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where loads are only coordinated in-process
+    fcntl = None
+
 import fastf1
+import pandas as pd
+
+from utils.admission import QUEUE_TIMEOUT, ServerBusy, admit
+from utils.cancellation import check_cancelled
+from utils.session_context import session_context
+from utils.tracing import instrument_fastf1, span
+
+# Number of loaded sessions kept in memory per process
+SESSION_CACHE_SIZE = 8
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+_session_load_locks = {}
+
+# Requests waiting for or running the load of each session key
+_session_load_waiters = {}
+
+# Interval at which a session file lock held by another process is retried (seconds)
+FILE_LOCK_POLL = 0.1
+
+# Session types offered in the session dropdown and their names
+SESSION_NAMES = OrderedDict([
+    ('FP1', 'Practice 1'),
+    ('FP2', 'Practice 2'),
+    ('FP3', 'Practice 3'),
+    ('Q', 'Qualifying'),
+    ('S', 'Sprint'),
+    ('SQ', 'Sprint Qualifying'),
+    ('R', 'Race'),
+])
+
+# Label suffix of events and sessions that can be loaded from the local cache
+CACHED_MARK = ' \u2713'
+
+# Load profile the session views load (load_session's default). The dropdowns
+# mark and, offline, enable only sessions cached for it: a session cached
+# for a lighter profile (e.g. 'laps' by the season pace view) can't be shown.
+VIEW_PROFILE = 'full'
+
+# Serve only what is already in the fastf1 cache and never touch the network
+# (F1_OFFLINE=1), e.g. on machines without internet access
+OFFLINE_MODE = os.environ.get('F1_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+# Arguments passed to session.load() for each load profile. 'laps' skips
+# telemetry, weather and race control messages for views that only need
+# lap timing, which makes loading a session several times faster; 'results'
+# only loads the classification (e.g. qualifying Q1/Q2/Q3 times).
+LOAD_PROFILES = {
+    'full': {},
+    'laps': {'laps': True, 'telemetry': False, 'weather': False, 'messages': False},
+    'results': {'laps': False, 'telemetry': False, 'weather': False, 'messages': False},
+}
+
+# Responses each load profile needs from the fastf1 cache, stored as
+# cache/<season>/<event>/<session>/<name>.ff1pkl
+PROFILE_CACHE_FILES = {
+    'full': ['driver_info', '_extended_timing_data', 'timing_app_data', 'car_data', 'position_data'],
+    'laps': ['driver_info', '_extended_timing_data', 'timing_app_data'],
+    'results': ['driver_info'],
+}
+
+
+class SessionLockTimeout(Exception):
+    """Raised when another process held a session's file lock for too long."""
+
+
+class SessionNotCached(Exception):
+    """Raised in offline mode for sessions that aren't in the fastf1 cache."""
+
+    def __init__(self, season, event, session_type):
+        super().__init__(f"{season} {event} {session_type} is not cached locally and offline mode is on")
+
 
 def setup_fastf1_cache():
     """Create and configure the fastf1 cache."""
@@ -11,8 +95,66 @@ def setup_fastf1_cache():
     # Enable cache to speed up data loading
     fastf1.Cache.enable_cache(cache_dir)
 
+    # Answer every request from the cache only, so missing data fails at once
+    # instead of waiting for network timeouts
+    if OFFLINE_MODE:
+        fastf1.Cache.offline_mode(True)
+
+    # Time the stages of every session load (laps, car data, ...)
+    instrument_fastf1()
+
     return cache_dir
 
+@contextmanager
+def session_file_lock(season, event, session_type, shared=False, timeout=None):
+    """Hold a cross-process lock on a session while it is loaded.
+
+    Every process (gunicorn worker, season pool worker) serving the
+    dashboard shares the fastf1 cache directory. A cold load takes an
+    exclusive file lock per session in cache/locks, so one process fills
+    the cache while the others wait and then load the finished cache. Warm
+    loads only read the cache and take a shared lock, so they run side by
+    side and only wait for a cold load in progress.
+
+    Args:
+        season (int): Year of the season
+        event (str): Name of the event
+        session_type (str): Session type (e.g., 'FP1', 'Q', 'R')
+        shared (bool): Take a shared lock, for loads from a filled cache
+        timeout (float): Longest time to wait for the lock, None to wait forever
+
+    Raises:
+        SessionLockTimeout: If the lock wasn't acquired within timeout
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_dir = os.path.join(os.getcwd(), 'cache', 'locks')
+    os.makedirs(lock_dir, exist_ok=True)
+
+    # Event names aren't safe file names, so the lock file is named by a hash
+    name = hashlib.sha1(repr((season, event, session_type)).encode('utf-8')).hexdigest()
+    with open(os.path.join(lock_dir, f"{name}.lock"), 'a') as lock_file:
+        mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if timeout is None:
+            fcntl.flock(lock_file.fileno(), mode)
+        else:
+            # flock has no timeout, so poll a non-blocking lock until the deadline
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file.fileno(), mode | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise SessionLockTimeout(f"Timed out waiting for {season} {event} {session_type}")
+                    time.sleep(FILE_LOCK_POLL)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
 def get_events_for_season(season):
     """Get all events for a specific F1 season.
 
@@ -20,27 +162,240 @@ def get_events_for_season(season):
         season (int): Year of the season
 
     Returns:
-        list: List of event options for dropdown
+        list: List of event options for dropdown, events with a cached
+            session marked (and in offline mode, the others disabled)
     """
     # Get all events for the selected season
     events = fastf1.get_event_schedule(season)
-    event_options = [{'label': f"{event['EventName']} - {event['EventDate'].strftime('%d %b')}",
-                      'value': event['EventName']}
-                     for _, event in events.iterrows()]
+    event_options = []
+    for _, event in events.iterrows():
+        cached = bool(cached_session_types(event))
+        label = f"{event['EventName']} - {event['EventDate'].strftime('%d %b')}"
+        event_options.append({'label': label + (CACHED_MARK if cached else ''),
+                              'value': event['EventName'],
+                              'disabled': OFFLINE_MODE and not cached})
 
     return event_options
 
-def load_session(season, event, session_type):
+def get_sessions_for_event(season, event):
+    """Get the session options of an event, marking those in the local cache.
+
+    Args:
+        season (int): Year of the season
+        event (str): Name of the event
+
+    Returns:
+        list: List of session options for dropdown (in offline mode, the
+            sessions that aren't cached are disabled)
+    """
+    try:
+        cached = cached_session_types(fastf1.get_event(season, event))
+    except Exception as e:
+        print(f"Error resolving {season} {event}: {e}")
+        cached = []
+
+    return [{'label': name + (CACHED_MARK if session_type in cached else ''),
+             'value': session_type,
+             'disabled': OFFLINE_MODE and session_type not in cached}
+            for session_type, name in SESSION_NAMES.items()]
+
+def is_session_cached(session, profile='full'):
+    """Whether the fastf1 cache holds everything a load profile needs of a session.
+
+    Only the files on disk are checked, so this never touches the network.
+
+    Args:
+        session (fastf1.Session): Session object, loaded or not
+        profile (str): Data to load, a key of LOAD_PROFILES
+
+    Returns:
+        bool: True if every response in PROFILE_CACHE_FILES[profile] is cached
+    """
+    api_path = getattr(session, 'api_path', None)
+    if not api_path:
+        # Sessions the F1 API doesn't cover (e.g. testing) have nothing cached
+        return False
+
+    session_dir = os.path.join(os.getcwd(), 'cache', *api_path.strip('/').split('/')[1:])
+    return all(os.path.exists(os.path.join(session_dir, f"{name}.ff1pkl"))
+               for name in PROFILE_CACHE_FILES[profile])
+
+def cached_session_types(event, profile=VIEW_PROFILE):
+    """Session types of an event that can be loaded from the fastf1 cache.
+
+    Args:
+        event (fastf1.events.Event): Event of the season schedule
+        profile (str): Data that must be cached, a key of LOAD_PROFILES
+
+    Returns:
+        list: The cached session types, in SESSION_NAMES order
+    """
+    cached = []
+    for session_type in SESSION_NAMES:
+        try:
+            # Only builds the session object, nothing is loaded
+            session = event.get_session(session_type)
+        except Exception:
+            # The event doesn't have this session (e.g. no sprint)
+            continue
+        if is_session_cached(session, profile):
+            cached.append(session_type)
+    return cached
+
+def load_session(season, event, session_type, profile=VIEW_PROFILE):
     """Load a specific F1 session.
 
+    Loaded sessions are kept in memory, so the callbacks that need the same
+    session share a single load (and its per-session computation context).
+
     Args:
         season (int): Year of the season
         event (str): Name of the event
         session_type (str): Session type (e.g., 'FP1', 'Q', 'R')
+        profile (str): Data to load, a key of LOAD_PROFILES
 
     Returns:
         fastf1.Session: Loaded session object
+
+    Raises:
+        ServerBusy: If too many loads are already running and queued
+        SessionNotCached: In offline mode, if the session isn't cached
     """
-    session = fastf1.get_session(season, event, session_type)
-    session.load()
-    return session
\ No newline at end of file
+    key = (season, event, session_type, profile)
+
+    with _sessions_lock:
+        # A fully loaded session also serves every lighter profile
+        for candidate in [(season, event, session_type, 'full'), key]:
+            session = _sessions.get(candidate)
+            if session is not None:
+                _sessions.move_to_end(candidate)
+                return session
+        load_lock = _session_load_locks.setdefault(key, threading.Lock())
+        _session_load_waiters[key] = _session_load_waiters.get(key, 0) + 1
+
+    try:
+        return _load_session(key, load_lock)
+    finally:
+        with _sessions_lock:
+            _session_load_waiters[key] -= 1
+            if not _session_load_waiters[key]:
+                del _session_load_waiters[key]
+
+def check_load_cancelled(key):
+    """Stage boundary of a load: stop it if its request has been superseded.
+
+    A load that other requests are also waiting for carries on, so they
+    don't have to start it again from scratch.
+    """
+    with _sessions_lock:
+        shared = _session_load_waiters.get(key, 0) > 1
+    if not shared:
+        check_cancelled()
+
+def _load_session(key, load_lock):
+    season, event, session_type, profile = key
+
+    check_load_cancelled(key)
+    with span('schedule', season=season, event=event, session_type=session_type):
+        session = fastf1.get_session(season, event, session_type)
+
+    # Offline, a session missing from the cache fails here rather than
+    # in fastf1's request retries
+    cached = is_session_cached(session, profile)
+    if OFFLINE_MODE and not cached:
+        raise SessionNotCached(season, event, session_type)
+
+    # Cold loads download from the F1 API and are limited separately from
+    # warm loads out of the fastf1 cache. The slot is taken before waiting
+    # for the locks below, so requests piling up behind a slow load count
+    # against the queue, and every wait is bounded: when they are saturated
+    # this fails fast with ServerBusy.
+    resource = 'warm_load' if cached else 'cold_load'
+    with admit(resource):
+        # Only one thread loads a given session, the others wait for its result
+        if not load_lock.acquire(timeout=QUEUE_TIMEOUT):
+            raise ServerBusy(resource)
+        try:
+            with _sessions_lock:
+                loaded = _sessions.get(key)
+            if loaded is not None:
+                return loaded
+
+            # Across processes, only one populates the fastf1 cache for it
+            try:
+                with session_file_lock(season, event, session_type, shared=cached, timeout=QUEUE_TIMEOUT):
+                    # A single load() per profile: fastf1 post-processes laps on every
+                    # call, so loading telemetry in a second call would redo (and
+                    # corrupt) the timing data. Superseded loads stop before and after.
+                    check_load_cancelled(key)
+                    with span(f"load.{profile}", season=season, event=event, session_type=session_type,
+                              resource=resource):
+                        session.load(**LOAD_PROFILES[profile])
+            except SessionLockTimeout:
+                raise ServerBusy(resource)
+
+            # Stop before warming a session nobody is waiting for any more; its
+            # data is in the fastf1 cache for the next load
+            check_load_cancelled(key)
+
+            # Classify laps and build the lap frame once up front for every view
+            if LOAD_PROFILES[profile].get('laps', True):
+                session_context(session).warm()
+
+            with _sessions_lock:
+                _sessions[key] = session
+                while len(_sessions) > SESSION_CACHE_SIZE:
+                    _sessions.popitem(last=False)
+                _session_load_locks.pop(key, None)
+        finally:
+            load_lock.release()
+
+    return session
+
+def build_lap_dataset(season, event, session_type, session):
+    """Build a compact columnar copy of a session's laps for the browser.
+
+    Only laps with a lap time are included. Drivers, teams and compounds are
+    stored once in a shared string table and referenced by index, lap times
+    are plain seconds and clean laps are flagged with 1, so the whole session
+    fits in a small dcc.Store.
+
+    Args:
+        season (int): Year of the season
+        event (str): Name of the event
+        session_type (str): Session type (e.g., 'FP1', 'Q', 'R')
+        session (fastf1.Session): Loaded session object
+
+    Returns:
+        dict: Columnar lap data keyed by column name
+    """
+    context = session_context(session)
+    laps = context.valid_laps
+
+    strings = {}
+
+    def encode(column):
+        values = laps[column].fillna('UNKNOWN').astype(str) if column in laps.columns \
+            else pd.Series('UNKNOWN', index=laps.index)
+        codes, uniques = pd.factorize(values)
+        mapping = [strings.setdefault(value, len(strings)) for value in uniques]
+        return [mapping[code] for code in codes]
+
+    columns = {
+        'driver': encode('Driver'),
+        'team': encode('Team'),
+        'compound': encode('Compound'),
+        'lap_number': laps['LapNumber'].astype(int).tolist(),
+        'lap_time': laps['LapTime'].dt.total_seconds().round(3).tolist(),
+        'clean': context.lap_frame['Clean'].astype(int).tolist(),
+    }
+
+    palette = context.palette
+
+    return {
+        'key': [season, event, session_type],
+        'strings': list(strings),
+        'columns': columns,
+        'team_colors': palette.team_colors,
+        'compound_colors': palette.compound_colors,
+    }
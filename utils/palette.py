@@ -0,0 +1,112 @@
+import fastf1
+import fastf1.plotting
+import pandas as pd
+from fastf1.core import DataNotLoadedError
+
+# Color used when a team can't be resolved
+DEFAULT_TEAM_COLOR = '#333333'
+
+# Team names used in session data across the seasons offered by the season
+# dropdown (2018-2024). Used when a session doesn't carry team colors itself,
+# before asking fastf1 (whose name matching only knows the current teams).
+TEAM_COLORS = {
+    'Mercedes': '#27f4d2',
+    'Ferrari': '#e8002d',
+    'Red Bull Racing': '#3671c6',
+    'McLaren': '#ff8000',
+    'Alpine': '#0093cc',
+    'Renault': '#fff500',
+    'Aston Martin': '#229971',
+    'Racing Point': '#f596c8',
+    'Force India': '#f596c8',
+    'AlphaTauri': '#5e8faa',
+    'Toro Rosso': '#469bff',
+    'RB': '#6692ff',
+    'Alfa Romeo': '#c92d4b',
+    'Alfa Romeo Racing': '#9b0000',
+    'Sauber': '#9b0000',
+    'Kick Sauber': '#52e252',
+    'Williams': '#64c4ff',
+    'Haas F1 Team': '#b6babd',
+}
+
+
+# Helper function to convert hex color to RGB tuple
+def hex_to_rgb(hex_color):
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def _lookup_team_color(team, session):
+    """Resolve a team color from the static table, then from fastf1."""
+    if team in TEAM_COLORS:
+        return TEAM_COLORS[team]
+
+    # fastf1 >= 3.4 resolves colors per session, older versions by name
+    get_team_color = getattr(fastf1.plotting, 'get_team_color', None)
+    try:
+        if get_team_color is not None:
+            return get_team_color(team, session)
+        return fastf1.plotting.team_color(team)
+    except Exception:
+        return None
+
+
+class SessionPalette:
+    """Colors of a session, resolved once when it is first needed.
+
+    Attributes:
+        team_colors (dict): Team name -> hex color
+        driver_colors (dict): Driver abbreviation -> hex color of their team
+        team_fills (dict): Team name -> translucent rgba() string for bands
+        compound_colors (dict): Compound -> hex color
+    """
+
+    def __init__(self, session):
+        self.team_colors = {}
+        self.driver_colors = {}
+
+        # Session results carry the team colors of that season
+        results = session.results
+        if 'TeamName' in results.columns and 'TeamColor' in results.columns:
+            for team, color in zip(results['TeamName'], results['TeamColor']):
+                if isinstance(team, str) and isinstance(color, str) and color:
+                    self.team_colors.setdefault(team, f"#{color.lstrip('#')}")
+
+        # Sessions loaded with the results profile have no laps
+        try:
+            laps = session.laps
+        except DataNotLoadedError:
+            laps = pd.DataFrame()
+        teams = set(laps['Team'].dropna()) if 'Team' in laps.columns else set()
+        if 'TeamName' in results.columns:
+            teams.update(results['TeamName'].dropna())
+
+        for team in teams:
+            if team not in self.team_colors:
+                self.team_colors[team] = _lookup_team_color(team, session) or DEFAULT_TEAM_COLOR
+
+        # Drivers take the color of the team they drove for in this session
+        if 'Driver' in laps.columns and 'Team' in laps.columns:
+            driver_teams = laps[['Driver', 'Team']].dropna().drop_duplicates('Driver')
+            for driver, team in zip(driver_teams['Driver'], driver_teams['Team']):
+                self.driver_colors[driver] = self.team_colors.get(team, DEFAULT_TEAM_COLOR)
+        if 'Abbreviation' in results.columns and 'TeamName' in results.columns:
+            for driver, team in zip(results['Abbreviation'], results['TeamName']):
+                self.driver_colors.setdefault(driver, self.team_colors.get(team, DEFAULT_TEAM_COLOR))
+
+        self.team_fills = {team: f"rgba{(*hex_to_rgb(color), 0.2)}" for team, color in self.team_colors.items()}
+
+        self.compound_colors = dict(fastf1.plotting.COMPOUND_COLORS)
+
+    def team(self, team):
+        """Color of a team, or the default color if it is unknown."""
+        return self.team_colors.get(team, DEFAULT_TEAM_COLOR)
+
+    def team_fill(self, team):
+        """Translucent fill color of a team."""
+        return self.team_fills.get(team, f"rgba{(*hex_to_rgb(DEFAULT_TEAM_COLOR), 0.2)}")
+
+    def compound(self, compound, default=DEFAULT_TEAM_COLOR):
+        """Color of a tyre compound."""
+        return self.compound_colors.get(compound, default)
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import fastf1
+from plotly.io.json import to_json_plotly
+
+from utils.tracing import record, span
+
+# Bump when the shape of cached outputs changes so stale disk entries are ignored
+CACHE_SCHEMA_VERSION = 7
+
+# Number of serialized results kept in memory per process
+MEMORY_CACHE_SIZE = 128
+
+# Number of serialized results kept on disk before the oldest are pruned
+DISK_CACHE_SIZE = 2000
+
+
+def make_result_key(**inputs):
+    """Build a stable hash for a set of callback inputs.
+
+    List inputs (drivers, teams, compounds) are treated as sets, so the
+    order in which they were picked in a dropdown doesn't matter. The
+    fastf1 version is part of the key because it changes the parsed data.
+
+    Returns:
+        str: Hex digest identifying the inputs
+    """
+    normalized = {}
+    for name, value in inputs.items():
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(value)
+        normalized[name] = value
+
+    normalized['fastf1_version'] = fastf1.__version__
+    normalized['schema_version'] = CACHE_SCHEMA_VERSION
+
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache for serialized callback outputs.
+
+    Values are stored as JSON strings: an in-memory LRU answers repeated
+    views within a process and a disk tier shares results between
+    processes and restarts. A hit is decoded straight into the structure
+    Dash sends to the browser, without rebuilding any figure or table.
+    """
+
+    def __init__(self, cache_dir, memory_size=MEMORY_CACHE_SIZE, disk_size=DISK_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key, payload):
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the decoded value for a key, or None if it isn't cached."""
+        start = time.perf_counter()
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+
+        if payload is None:
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    payload = f.read()
+                # Touch the file so disk pruning evicts least recently used entries
+                os.utime(path)
+            except OSError:
+                record('result_cache.miss', time.perf_counter() - start)
+                return None
+            self._remember(key, payload)
+
+        value = json.loads(payload)
+        record('result_cache.hit', time.perf_counter() - start)
+        return value
+
+    def set(self, key, value):
+        """Serialize a value (components, figures, plain data) and cache it."""
+        with span('serialize'):
+            payload = to_json_plotly(value)
+        self._remember(key, payload)
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing result cache entry: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % 100 == 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except OSError:
+                        continue
+
+        if len(entries) <= self.disk_size:
+            return
+
+        entries.sort()
+        for _, path in entries[:len(entries) - self.disk_size]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Return the process-wide result cache, stored next to the fastf1 cache."""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(os.path.join(os.getcwd(), 'cache', 'results'))
+        return _result_cache
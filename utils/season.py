@@ -0,0 +1,233 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils.data_loader import setup_fastf1_cache, get_events_for_season, load_session
+from utils.result_cache import get_result_cache, make_result_key
+from utils.session_context import session_context
+
+# Worker processes loading the sessions of a season
+SEASON_WORKERS = min(4, os.cpu_count() or 1)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Qualifying segments, in the order they are run
+QUALIFYING_SEGMENTS = ['Q1', 'Q2', 'Q3']
+
+# Running and finished season jobs by (view, season, session_type)
+_jobs = {}
+
+# Seconds after which a finished job with events missing a result (failed,
+# or not run yet when the job started) is started again for those events
+SEASON_JOB_TTL = int(os.environ.get('F1_SEASON_JOB_TTL', '900'))
+_jobs_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return the process pool shared by all season jobs."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned workers don't inherit the locks of the threaded Dash server
+            _executor = ProcessPoolExecutor(
+                max_workers=SEASON_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=setup_fastf1_cache
+            )
+        return _executor
+
+
+def compute_session_pace(season, event, session_type):
+    """Median clean-lap pace of every driver and team in one session.
+
+    Runs in a worker process. Only lap timing is loaded, and only clean
+    laps (see classify_laps) count.
+
+    Args:
+        season (int): Year of the season
+        event (str): Name of the event
+        session_type (str): Session type (e.g., 'FP1', 'Q', 'R')
+
+    Returns:
+        dict: event, drivers and teams, where drivers and teams map to the
+            median lap time as a percentage off the session's fastest lap,
+            or None if the session has no lap data
+    """
+    session = load_session(season, event, session_type, profile='laps')
+    laps = session_context(session).clean_laps
+    if len(laps) == 0:
+        return None
+
+    lap_times = laps['LapTime'].dt.total_seconds()
+    pace = (lap_times / lap_times.min() - 1) * 100
+    return {
+        'event': event,
+        'drivers': pace.groupby(laps['Driver']).median().round(3).to_dict(),
+        'teams': pace.groupby(laps['Team']).median().round(3).to_dict(),
+    }
+
+
+def compute_teammate_deltas(season, event, session_type):
+    """Qualifying best-lap delta of every pair of teammates in one session.
+
+    Runs in a worker process. Only the results are loaded. Teammates are
+    compared on their best times in the last segment both set a time in,
+    so a driver knocked out in Q2 is compared on Q2 times.
+
+    Args:
+        season (int): Year of the season
+        event (str): Name of the event
+        session_type (str): Qualifying session type ('Q' or 'SQ')
+
+    Returns:
+        dict: event and pairs, a list of dicts with Team, Driver, Teammate
+            and Delta (seconds, Driver minus Teammate), or None if the
+            session has no qualifying times
+    """
+    session = load_session(season, event, session_type, profile='results')
+    results = session.results
+
+    segments = [segment for segment in QUALIFYING_SEGMENTS if segment in results.columns]
+    if not segments or 'TeamName' not in results.columns:
+        return None
+
+    times = pd.DataFrame({segment: results[segment].dt.total_seconds() for segment in segments})
+    times.index = results['Abbreviation']
+
+    pairs = []
+    for team, drivers in results.groupby('TeamName')['Abbreviation']:
+        drivers = sorted(drivers)
+        for i, driver in enumerate(drivers):
+            for teammate in drivers[i + 1:]:
+                both = times.loc[[driver, teammate]].dropna(axis=1)
+                if both.empty:
+                    continue
+                segment = both.columns[-1]
+                pairs.append({
+                    'Team': team,
+                    'Driver': driver,
+                    'Teammate': teammate,
+                    'Delta': round(both.at[driver, segment] - both.at[teammate, segment], 3),
+                })
+
+    return {'event': event, 'pairs': pairs} if pairs else None
+
+
+# What each season view computes per event, and the session type it uses
+# (None for the session type selected in the dashboard)
+SEASON_VIEWS = {
+    'season_pace': (compute_session_pace, None),
+    'quali_h2h': (compute_teammate_deltas, 'Q'),
+}
+
+
+class SeasonJob:
+    """Per-event results of a season view, filled in as sessions finish loading.
+
+    Events already in the result cache are available immediately; the
+    others are loaded in the process pool and their results cached.
+    """
+
+    def __init__(self, view, season, session_type):
+        self.view = view
+        self.season = season
+        self.session_type = session_type
+        self.started = time.monotonic()
+        self.events = []
+        self._results = {}
+        self._pending = 0
+        self._submitted = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Collect the cached results and submit the missing events to the pool.
+
+        Fetching the schedule and reading the result cache can be slow, so
+        this runs outside _jobs_lock; until it returns the job reports that
+        it is still loading.
+        """
+        compute = SEASON_VIEWS[self.view][0]
+        events = [option['value'] for option in get_events_for_season(self.season)]
+
+        result_cache = get_result_cache()
+        executor = _get_executor()
+        for event in events:
+            cache_key = self._cache_key(event)
+            cached = result_cache.get(cache_key)
+            with self._lock:
+                self.events.append(event)
+                if cached is not None:
+                    self._results[event] = cached
+                    continue
+                # Counted before submitting, as the pool may finish it right away
+                self._pending += 1
+
+            future = executor.submit(compute, self.season, event, self.session_type)
+            future.add_done_callback(lambda f, event=event, cache_key=cache_key: self._finish(event, cache_key, f))
+
+        with self._lock:
+            self._submitted = True
+
+    def _cache_key(self, event):
+        return make_result_key(dataset=self.view, season=self.season, event=event,
+                               session_type=self.session_type)
+
+    def _finish(self, event, cache_key, future):
+        try:
+            result = future.result()
+            if result is not None:
+                get_result_cache().set(cache_key, result)
+        except Exception as e:
+            # Cancelled events and sessions without data (e.g. testing) are skipped
+            print(f"Error loading {self.view} for {event}: {e}")
+            result = None
+
+        with self._lock:
+            self._results[event] = result
+            self._pending -= 1
+
+    def is_stale(self):
+        """Whether the job is finished, older than SEASON_JOB_TTL and missing results.
+
+        Finished events are in the result cache, so a new job for the same
+        view only loads the events that are missing.
+        """
+        with self._lock:
+            if not self._submitted or self._pending or time.monotonic() - self.started < SEASON_JOB_TTL:
+                return False
+            return any(not self._results.get(event) for event in self.events)
+
+    def snapshot(self):
+        """Return (results in calendar order, done), skipping events without data."""
+        with self._lock:
+            results = [self._results[event] for event in self.events if self._results.get(event)]
+            return results, self._submitted and self._pending == 0
+
+
+def get_season_results(view, season, session_type):
+    """Return (results, done) of a season view, starting its job on first use."""
+    session_type = SEASON_VIEWS[view][1] or session_type
+    key = (view, season, session_type)
+    with _jobs_lock:
+        job = _jobs.get(key)
+        created = job is None or job.is_stale()
+        if created:
+            job = SeasonJob(view, season, session_type)
+            _jobs[key] = job
+
+    # Started outside the lock, so other season views aren't held up meanwhile
+    if created:
+        try:
+            job.start()
+        except Exception:
+            # Let the next poll start over, e.g. after the schedule failed to load
+            with _jobs_lock:
+                if _jobs.get(key) is job:
+                    del _jobs[key]
+            raise
+    return job.snapshot()
@@ -0,0 +1,334 @@
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from utils.analysis import (
+    classify_laps, fit_tyre_degradation, compute_race_gaps, compute_race_positions, compute_stints,
+    annotate_weather, compute_sector_bests, interpolate_positions
+)
+from utils.palette import SessionPalette
+
+# Time between replay frames and length of the windows they are sent in (seconds)
+REPLAY_STEP = 0.5
+REPLAY_WINDOW = 60
+
+# Derived data for each loaded session, dropped together with the session
+_contexts = weakref.WeakKeyDictionary()
+_contexts_lock = threading.Lock()
+
+
+class SessionContext:
+    """Per-session computations shared by all figures and tables.
+
+    Values are computed on first use and kept for as long as the session
+    stays loaded, so e.g. the telemetry of a driver's fastest lap is
+    extracted once, whether the chart or the table asks for it first.
+    """
+
+    def __init__(self, session):
+        # A weak reference, so the context doesn't keep its session alive
+        self._session = weakref.ref(session)
+        self._values = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        return self._session()
+
+    def get(self, key, compute):
+        """Return the value cached under key, computing it on first use.
+
+        Concurrent callers asking for the same key wait for a single
+        computation. Failed computations are not cached.
+        """
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    return self._values[key]
+
+            value = compute()
+
+            with self._lock:
+                self._values[key] = value
+            return value
+
+    def warm(self):
+        """Classify laps and build the lap frame right after a load.
+
+        Every lap view starts from these, so none of them pays for it on
+        first render. Only for sessions loaded with laps.
+
+        Returns:
+            pandas.DataFrame: The lap frame
+        """
+        return self.lap_frame
+
+    @property
+    def valid_laps(self):
+        """All laps with a lap time."""
+        def compute():
+            laps = self.session.laps
+            return laps[laps['LapTime'].notna()]
+
+        return self.get('valid_laps', compute)
+
+    @property
+    def lap_classes(self):
+        """Clean-lap masks and reason codes of all laps, see classify_laps."""
+        return self.get('lap_classes', lambda: classify_laps(self.session.laps))
+
+    @property
+    def clean_laps(self):
+        """All laps that passed every clean-lap check."""
+        def compute():
+            laps = self.session.laps
+            return laps[self.lap_classes['Clean']]
+
+        return self.get('clean_laps', compute)
+
+    @property
+    def lap_frame(self):
+        """Valid laps as plot-ready columns, indexed like valid_laps.
+
+        Columns are Driver, Team, Compound (missing compounds as 'UNKNOWN'),
+        LapNumber, LapTime in seconds and Clean, all built with whole-column
+        operations.
+        """
+        def compute():
+            laps = self.valid_laps
+            frame = pd.DataFrame({
+                'Driver': laps['Driver'],
+                'Team': laps['Team'] if 'Team' in laps.columns else 'Unknown',
+                'Compound': laps['Compound'].fillna('UNKNOWN') if 'Compound' in laps.columns else 'UNKNOWN',
+                'LapNumber': laps['LapNumber'],
+                'LapTime': laps['LapTime'].dt.total_seconds(),
+                'Clean': self.lap_classes.loc[laps.index, 'Clean'],
+            }, index=laps.index)
+            return frame
+
+        return self.get('lap_frame', compute)
+
+    @property
+    def lap_weather(self):
+        """Track/air temperature, humidity and rainfall of every lap, see annotate_weather."""
+        def compute():
+            try:
+                weather = self.session.weather_data
+            except Exception:
+                # Sessions loaded without weather data
+                weather = None
+            return annotate_weather(self.session.laps, weather)
+
+        return self.get('lap_weather', compute)
+
+    @property
+    def palette(self):
+        """Team, driver and compound colors of the session."""
+        return self.get('palette', lambda: SessionPalette(self.session))
+
+    def team_lap_stats(self, compound_filter=None, by_compound=False, clean_only=False):
+        """Per-lap lap time statistics of every team in the session.
+
+        A single groupby over the lap frame collects count, sum, sum of
+        squares, min and max per (Team, Compound, LapNumber). These give
+        mean/min/max/std (in seconds) per compound directly, and per team
+        by summing the partials over compounds, so both variants come from
+        one pass over the laps. Results are cached per compound filter, so
+        adding a team to the selection is a lookup rather than a recompute.
+
+        Args:
+            compound_filter (list): Compounds to include, empty for all
+            by_compound (bool): Also group by compound
+            clean_only (bool): Only use clean laps
+
+        Returns:
+            pandas.DataFrame: Statistics indexed by Team, [Compound,] LapNumber
+        """
+        compounds = tuple(sorted(compound_filter)) if compound_filter else ()
+
+        def finish(partials, offset):
+            count = partials['count']
+            mean = partials['total'] / count
+            # Sample standard deviation like pandas' std(), NaN for single laps
+            variance = (partials['squares'] - partials['total'] * mean) / (count - 1)
+            return pd.DataFrame({
+                'mean': mean + offset,
+                'min': partials['min'],
+                'max': partials['max'],
+                'std': np.sqrt(variance.clip(lower=0)).where(count > 1),
+            })
+
+        def compute():
+            frame = self.lap_frame
+            if clean_only:
+                frame = frame[frame['Clean']]
+            if compounds:
+                frame = frame[frame['Compound'].isin(compounds)]
+
+            # Sums are taken around the overall mean, which keeps the sums of
+            # squares accurate for lap times of ~90s that differ by tenths
+            offset = frame['LapTime'].mean() if len(frame) else 0.0
+            shifted = frame['LapTime'] - offset
+            partials = frame.assign(Shifted=shifted, Squared=shifted ** 2).groupby(
+                ['Team', 'Compound', 'LapNumber']
+            ).agg(count=('Shifted', 'count'), total=('Shifted', 'sum'), squares=('Squared', 'sum'),
+                  min=('LapTime', 'min'), max=('LapTime', 'max'))
+
+            team_partials = partials.groupby(level=['Team', 'LapNumber']).agg(
+                {'count': 'sum', 'total': 'sum', 'squares': 'sum', 'min': 'min', 'max': 'max'}
+            )
+            return {False: finish(team_partials, offset), True: finish(partials, offset)}
+
+        return self.get(('team_lap_stats', compounds, clean_only), compute)[by_compound]
+
+    def tyre_degradation(self, fuel_corrected=False, clean_only=False):
+        """Lap time vs tyre life fits of every stint, see fit_tyre_degradation."""
+        def compute():
+            laps = self.clean_laps if clean_only else self.session.laps
+            return fit_tyre_degradation(laps, fuel_corrected)
+
+        return self.get(('tyre_degradation', fuel_corrected, clean_only), compute)
+
+    @property
+    def stints(self):
+        """Stints of every driver, see compute_stints."""
+        return self.get('stints', lambda: compute_stints(self.session.laps))
+
+    @property
+    def sector_bests(self):
+        """Best sectors and theoretical best lap of every driver, see compute_sector_bests."""
+        return self.get('sector_bests', lambda: compute_sector_bests(self.session.laps))
+
+    @property
+    def race_gaps(self):
+        """Gap to leader and interval of the full field, see compute_race_gaps."""
+        return self.get('race_gaps', lambda: compute_race_gaps(self.session.laps))
+
+    @property
+    def race_positions(self):
+        """Lap-by-lap positions and swaps of the full field, see compute_race_positions."""
+        return self.get('race_positions', lambda: compute_race_positions(self.session.laps))
+
+    @property
+    def replay_tracks(self):
+        """Raw car positions of every driver as (session time, X, Y) numpy arrays."""
+        def compute():
+            session = self.session
+            tracks = {}
+            for number, pos_data in session.pos_data.items():
+                pos_data = pos_data.dropna(subset=['SessionTime', 'X', 'Y']).sort_values('SessionTime')
+                try:
+                    driver = session.get_driver(number)['Abbreviation']
+                except Exception:
+                    driver = number
+                tracks[driver] = (pos_data['SessionTime'].dt.total_seconds().to_numpy(),
+                                  pos_data['X'].to_numpy(dtype=float), pos_data['Y'].to_numpy(dtype=float))
+            return tracks
+
+        return self.get('replay_tracks', compute)
+
+    @property
+    def replay_span(self):
+        """Session time span (start, end) of the replay, in seconds.
+
+        The replay starts with the first lap (or the first position sample)
+        and ends with the last position sample.
+        """
+        def compute():
+            tracks = [track[0] for track in self.replay_tracks.values() if len(track[0]) > 0]
+            if not tracks:
+                return None
+            start = min(track[0] for track in tracks)
+            laps = self.session.laps
+            if 'LapStartTime' in laps.columns and laps['LapStartTime'].notna().any():
+                start = max(start, laps['LapStartTime'].min().total_seconds())
+            return start, max(track[-1] for track in tracks)
+
+        return self.get('replay_span', compute)
+
+    def replay_window(self, window):
+        """Interpolated positions of all cars for one REPLAY_WINDOW of the replay.
+
+        Windows are built on request rather than cached, so a replay only
+        ever costs the windows that are actually played.
+
+        Returns:
+            dict: window, start (session time of the first frame), step,
+                window_length, replay_start, replay_end, drivers and x/y
+                (drivers x frames lists, None where a car has no position),
+                or None past the end of the replay
+        """
+        span = self.replay_span
+        if span is None:
+            return None
+
+        start = span[0] + window * REPLAY_WINDOW
+        if start > span[1]:
+            return None
+
+        times = np.arange(start, min(start + REPLAY_WINDOW, span[1]), REPLAY_STEP)
+        x, y = interpolate_positions(self.replay_tracks, times)
+
+        def as_lists(values):
+            # JSON has no NaN; cars without a position are sent as null
+            return pd.DataFrame(values.round(1)).astype(object).where(~np.isnan(values), None).values.tolist()
+
+        return {
+            'window': window,
+            'start': float(start),
+            'step': REPLAY_STEP,
+            'window_length': REPLAY_WINDOW,
+            'replay_start': float(span[0]),
+            'replay_end': float(span[1]),
+            'drivers': list(self.replay_tracks),
+            'x': as_lists(x),
+            'y': as_lists(y),
+        }
+
+    def driver_laps(self, driver):
+        """All laps of a driver."""
+        return self.get(('driver_laps', driver), lambda: self.session.laps.pick_drivers(driver))
+
+    def fastest_lap_telemetry(self, driver, clean_only=False):
+        """Fastest lap of a driver and its telemetry.
+
+        Args:
+            driver (str): Driver abbreviation
+            clean_only (bool): Only pick from the driver's clean laps
+
+        Returns:
+            tuple: (fastest lap, telemetry), or None if the driver has no laps
+                or the lap has no telemetry
+        """
+        def compute():
+            driver_laps = self.driver_laps(driver)
+            if clean_only:
+                driver_laps = driver_laps[self.lap_classes.loc[driver_laps.index, 'Clean']]
+            if len(driver_laps) == 0:
+                return None
+
+            fastest_lap = driver_laps.pick_fastest()
+            if not hasattr(fastest_lap, 'get_telemetry'):
+                return None
+
+            return fastest_lap, fastest_lap.get_telemetry()
+
+        return self.get(('fastest_lap_telemetry', driver, clean_only), compute)
+
+
+def session_context(session):
+    """Return the shared computation context of a loaded session."""
+    with _contexts_lock:
+        context = _contexts.get(session)
+        if context is None:
+            context = SessionContext(session)
+            _contexts[session] = context
+        return context
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+
+from fastf1 import api
+
+# Spans are appended to this JSON lines file, shared by all processes
+TRACE_FILE = os.environ.get('F1_TRACE_FILE', os.path.join(os.getcwd(), 'cache', 'traces.jsonl'))
+
+# Set F1_TRACING=0 to turn spans and histograms off
+TRACING = os.environ.get('F1_TRACING', '1').lower() not in ('0', 'false', 'no')
+
+# Size at which the trace file is rotated to <file>.1, replacing the previous
+# rotation, so tracing keeps at most twice this on disk (F1_TRACE_MAX_MB)
+TRACE_MAX_BYTES = int(float(os.environ.get('F1_TRACE_MAX_MB', '50')) * 1024 * 1024)
+
+# Upper bounds of the latency histogram buckets (seconds)
+HISTOGRAM_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# fastf1 API functions session.load() calls, by the load stage they belong to.
+# Session.load() parses lap timing with _extended_timing_data, not the public
+# timing_data wrapper.
+FASTF1_API_STAGES = {
+    'laps': ['_extended_timing_data', 'timing_app_data'],
+    'car_data': ['car_data'],
+    'position_data': ['position_data'],
+    'weather': ['weather_data'],
+    'messages': ['race_control_messages'],
+}
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+_trace_lock = threading.Lock()
+
+# Open trace file of this process as (pid, path, file), see _trace_file
+_trace = None
+
+
+class StageHistogram:
+    """Latency histogram of one stage, bucketed by HISTOGRAM_BUCKETS."""
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def snapshot(self):
+        """Count, mean and max (seconds) and the count of every bucket."""
+        labels = [f"<={bound:g}s" for bound in HISTOGRAM_BUCKETS] + [f">{HISTOGRAM_BUCKETS[-1]:g}s"]
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4) if self.count else 0.0,
+            'max': round(self.max, 4),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+def _trace_file():
+    """Line-buffered handle of the trace file, opened once per process.
+
+    A process forked with an open handle (or pointed at another trace file)
+    opens its own. Call with _trace_lock held.
+    """
+    global _trace
+    if _trace is not None:
+        pid, path, f = _trace
+        if pid == os.getpid() and path == TRACE_FILE:
+            return f
+        # Leave a handle inherited from the parent to the parent
+        if pid == os.getpid():
+            f.close()
+
+    os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+    f = open(TRACE_FILE, 'a', encoding='utf-8', buffering=1)
+    _trace = (os.getpid(), TRACE_FILE, f)
+    return f
+
+
+def _rotate_trace_file(f):
+    """Move a full trace file to <file>.1 and close this process's handle.
+
+    Other processes rotate the same file, so it is only moved if it is
+    still the one at TRACE_FILE; a handle already rotated away by another
+    process is just closed. Call with _trace_lock held.
+    """
+    global _trace
+    try:
+        current = os.path.samestat(os.fstat(f.fileno()), os.stat(TRACE_FILE))
+    except FileNotFoundError:
+        current = False
+    if current:
+        os.replace(TRACE_FILE, f"{TRACE_FILE}.1")
+    f.close()
+    _trace = None
+
+
+def record(stage, duration, **attrs):
+    """Add a finished span to the trace file and the stage's histogram.
+
+    Args:
+        stage (str): Name of the stage, e.g. 'schedule' or 'figure.build'
+        duration (float): Time the stage took, in seconds
+        **attrs: Extra JSON-serializable fields of the span
+    """
+    if not TRACING:
+        return
+
+    with _histograms_lock:
+        _histograms.setdefault(stage, StageHistogram()).add(duration)
+
+    entry = {
+        'start': round(time.time() - duration, 6),
+        'stage': stage,
+        'duration': round(duration, 6),
+        'pid': os.getpid(),
+        'thread': threading.get_ident(),
+    }
+    entry.update(attrs)
+    line = json.dumps(entry, default=str) + '\n'
+
+    try:
+        with _trace_lock:
+            # Single appends of a line don't interleave between processes
+            f = _trace_file()
+            f.write(line)
+            if f.tell() > TRACE_MAX_BYTES:
+                _rotate_trace_file(f)
+    except OSError as e:
+        print(f"Error writing trace span: {e}")
+
+
+@contextmanager
+def span(stage, **attrs):
+    """Time the enclosed block as a span of a stage.
+
+    The attributes are yielded, so the block can add to them. A block that
+    raises is recorded with the name of the exception as 'error'.
+    """
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, **attrs)
+
+
+def traced(stage, name=None):
+    """Decorator recording every call of a function as a span of a stage.
+
+    Args:
+        stage (str): Stage the calls belong to
+        name (str): Name recorded as the span's 'call', the function's name by default
+    """
+    def decorator(function):
+        call = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage, call=call):
+                return function(*args, **kwargs)
+        wrapper.traced = True
+        return wrapper
+    return decorator
+
+
+def instrument_fastf1():
+    """Trace the fastf1 API calls made by session.load(), see FASTF1_API_STAGES.
+
+    session.load() looks these functions up on the fastf1.api module when
+    it calls them, so wrapping them there splits a load into its stages.
+    Safe to call more than once.
+    """
+    if not TRACING:
+        return
+
+    for stage, names in FASTF1_API_STAGES.items():
+        for name in names:
+            function = getattr(api, name, None)
+            if function is None or getattr(function, 'traced', False):
+                continue
+            setattr(api, name, traced(stage, name)(function))
+
+
+def stage_histograms():
+    """Latency histograms of every stage traced in this process, keyed by stage."""
+    with _histograms_lock:
+        return {stage: histogram.snapshot() for stage, histogram in sorted(_histograms.items())}
+
+
+def summarize_trace(path=TRACE_FILE):
+    """Latency histograms of every stage in a trace file, across all processes.
+
+    Args:
+        path (str): JSON lines trace file written by record()
+
+    Returns:
+        dict: Histogram snapshots keyed by stage
+    """
+    histograms = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Skip a line cut short by a crash
+                continue
+            histograms.setdefault(entry['stage'], StageHistogram()).add(entry['duration'])
+
+    return {stage: histogram.snapshot() for stage, histogram in sorted(histograms.items())}
+
+
+# Print the per-stage histograms of a trace file:
+#     python -m utils.tracing [trace file]
+if __name__ == '__main__':
+    for stage, summary in summarize_trace(*sys.argv[1:2]).items():
+        print(f"{stage}: {summary['count']} spans, mean {summary['mean']}s, max {summary['max']}s")
+        for bucket, count in summary['buckets'].items():
+            if count:
+                print(f"    {bucket:>8} {count}")
@@ -1,48 +1,157 @@
+import numpy as np
 import pandas as pd
-import fastf1
-import fastf1.plotting
 import plotly.graph_objects as go
-import plotly.express as px
+from plotly.subplots import make_subplots
 from dash import html, dcc, dash_table
 
-# Helper function to convert hex color to RGB tuple
-def hex_to_rgb(hex_color):
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+from utils.analysis import summarize_degradation_by_compound, lap_time_distributions
+from utils.palette import hex_to_rgb
+from utils.session_context import session_context
+
+# Plotly trace mode of the telemetry plot styles
+TELEMETRY_MODES = {'line': 'lines', 'scatter': 'markers'}
+
+# Whether a compound passes the compound filter (an empty filter shows everything)
+def compound_visible(compound, compound_filter):
+    return not compound_filter or compound in compound_filter
+
+# Mask of the laps in a lap frame that pass the compound filter
+def compound_mask(frame, compound_filter):
+    if not compound_filter:
+        return pd.Series(True, index=frame.index)
+    return frame['Compound'].isin(compound_filter)
+
+# Mask of the laps in a lap frame to show with the "clean laps only" toggle
+def clean_mask(frame, clean_only):
+    if not clean_only:
+        return pd.Series(True, index=frame.index)
+    return frame['Clean']
+
+# Box and violin plots drawn from statistics computed here, so only the
+# outlines and quartiles are sent to the browser instead of every lap.
+# Violins are filled outlines of a server-side KDE, one trace per color with
+# all its violins separated by gaps; boxes use Plotly's precomputed-statistics
+# mode. Groups are placed on a numeric axis labelled with the x categories,
+# offset per color like Plotly's grouped mode. Traces colored by compound are
+# built for every compound, with the filtered-out ones hidden and tagged with
+# their compound so the callbacks can toggle the filter with a patch.
+def create_distribution_figure(df, x, color, plot_style, color_map, x_order=None, compound_filter=None,
+                               show_points=False, title=None):
+    x_order = x_order or sorted(df[x].unique())
+    color_order = list(pd.unique(df[color]))
+
+    # One group per (x, color) pair present in the data
+    codes = df.groupby([x, color], sort=False).ngroup().to_numpy()
+    key_frame = pd.DataFrame({'code': codes, 'x': df[x].to_numpy(), 'color': df[color].to_numpy()})
+    key_frame = key_frame.drop_duplicates('code').sort_values('code')
+    keys = list(zip(key_frame['x'], key_frame['color']))
+    values = df['LapTime'].to_numpy(dtype=float)
+    distributions = lap_time_distributions(values, codes, len(keys))
+    stats = distributions['stats']
+
+    slot_width = 0.8 / len(color_order)
+    x_position = {value: i for i, value in enumerate(x_order)}
+    centers = np.array([x_position[x_value] - 0.4 + slot_width * (color_order.index(color_value) + 0.5)
+                        for x_value, color_value in keys])
+
+    fig = go.Figure()
+
+    for color_value in color_order:
+        members = [i for i, key in enumerate(keys) if key[1] == color_value]
+        trace_color = color_map.get(color_value)
+        fill_color = f"rgba{(*hex_to_rgb(trace_color), 0.5)}" if trace_color else None
+        trace_options = dict(legendgroup=color_value)
+        if color == 'Compound':
+            trace_options.update(visible=compound_visible(color_value, compound_filter),
+                                 meta={'compound': color_value})
+
+        if plot_style == 'violin':
+            # Mirror each density around its center, closed by a gap between violins
+            half_width = 0.45 * slot_width * distributions['density'][members]
+            grid = distributions['grid'][members]
+            gap = np.full((len(members), 1), np.nan)
+            outline_x = np.hstack([centers[members][:, None] + half_width,
+                                   (centers[members][:, None] - half_width)[:, ::-1], gap]).ravel()
+            outline_y = np.hstack([grid, grid[:, ::-1], gap]).ravel()
+
+            # Widths to a thousandth of a category, lap times to a hundredth of a second
+            fig.add_trace(go.Scatter(
+                x=outline_x.round(3),
+                y=outline_y.round(2),
+                mode='lines',
+                fill='toself',
+                fillcolor=fill_color,
+                line=dict(color=trace_color, width=1, shape='spline'),
+                name=color_value,
+                hoverinfo='skip',
+                **trace_options
+            ))
+
+        fig.add_trace(go.Box(
+            x=centers[members],
+            q1=stats['q1'].to_numpy()[members],
+            median=stats['median'].to_numpy()[members],
+            q3=stats['q3'].to_numpy()[members],
+            lowerfence=stats['lowerfence'].to_numpy()[members],
+            upperfence=stats['upperfence'].to_numpy()[members],
+            mean=stats['mean'].to_numpy()[members],
+            width=slot_width * (0.15 if plot_style == 'violin' else 0.8),
+            marker=dict(color=trace_color),
+            fillcolor=fill_color if plot_style == 'box' else 'rgba(255, 255, 255, 0.8)',
+            line=dict(color=trace_color if plot_style == 'box' else 'white', width=1),
+            name=color_value,
+            showlegend=plot_style == 'box',
+            **trace_options
+        ))
+
+        # Raw laps only when asked for, jittered across the group's slot
+        if show_points:
+            point_mask = np.isin(codes, members)
+            jitter = np.random.default_rng(0).uniform(-0.3, 0.3, point_mask.sum()) * slot_width
+            fig.add_trace(go.Scattergl(
+                x=(centers[codes[point_mask]] + jitter).round(3),
+                y=values[point_mask].round(3),
+                mode='markers',
+                marker=dict(color=trace_color, size=4, opacity=0.6),
+                name=color_value,
+                showlegend=False,
+                customdata=df.loc[point_mask, x],
+                hovertemplate='%{customdata}<br>Time: %{y:.3f}s<extra></extra>',
+                **trace_options
+            ))
 
-def create_laptimes_table(session, drivers, compound_filter):
-    # Collect lap data for the selected drivers
-    all_laps = []
-
-    for driver in drivers:
-        driver_laps = session.laps.pick_drivers(driver)
-
-        # Apply compound filter if provided
-        if compound_filter and len(compound_filter) > 0:
-            driver_laps = driver_laps[driver_laps['Compound'].isin(compound_filter)]
+    fig.update_layout(
+        title=title,
+        xaxis=dict(tickmode='array', tickvals=list(range(len(x_order))), ticktext=x_order,
+                   range=[-0.5, len(x_order) - 0.5]),
+        template='plotly_dark',
+        height=600
+    )
 
-        # Filter for valid laps with times
-        valid_laps = driver_laps[driver_laps['LapTime'].notna()]
+    return fig
 
-        if len(valid_laps) > 0:
-            all_laps.append(valid_laps)
+def create_laptimes_table(session, drivers, compound_filter, clean_only=False):
+    # Select the valid laps of all selected drivers at once, with the compound and clean-lap filters
+    context = session_context(session)
+    frame = context.lap_frame
+    selected = frame['Driver'].isin(drivers) & compound_mask(frame, compound_filter) & clean_mask(frame, clean_only)
+    combined_laps = context.valid_laps[selected]
 
-    if not all_laps:
+    if len(combined_laps) == 0:
         return html.Div("No lap data available for the selected drivers and filters")
 
-    # Combine all laps
-    combined_laps = pd.concat(all_laps)
-
-    # Select and format columns for display
+    # Select columns for display, sorted by driver and lap number
     display_columns = ['Driver', 'LapNumber', 'LapTime', 'Compound', 'TyreLife', 'FreshTyre', 'Team']
     display_df = combined_laps[display_columns].copy()
 
-    # Format lap times to strings
-    display_df['LapTime'] = display_df['LapTime'].apply(lambda x: str(x))
-
-    # Sort by driver and lap number
+    # Why a lap is not clean, if it isn't, and the weather during the lap
+    display_df['Status'] = context.lap_classes.loc[combined_laps.index, 'Reason'].replace('', 'clean')
+    display_df = display_df.join(context.lap_weather.loc[combined_laps.index])
     display_df = display_df.sort_values(['Driver', 'LapNumber'])
 
+    # Format lap times to strings
+    display_df['LapTime'] = display_df['LapTime'].astype(str)
+
     # Create data table
     return dash_table.DataTable(
         id='lap-times-table',
@@ -75,50 +184,22 @@ def create_laptimes_table(session, drivers, compound_filter):
     )
 
 # Function to create a data table for team comparison
-def create_team_comparison_table(session, teams, compound_filter):
-    # Collect all team drivers
-    all_team_laps = []
-
-    for team in teams:
-        # Get all drivers from this team
-        team_drivers = []
-
-        if 'Team' in session.results:
-            team_drivers = session.results.loc[session.results['Team'] == team, 'Abbreviation'].tolist()
-
-        # If no drivers found in results, try from laps
-        if not team_drivers and hasattr(session, 'laps') and 'Team' in session.laps.columns:
-            team_drivers = session.laps.loc[session.laps['Team'] == team, 'Driver'].unique().tolist()
-
-        # Collect laps from all team drivers
-        for driver in team_drivers:
-            driver_laps = session.laps.pick_drivers(driver)
-
-            # Apply compound filter if provided
-            if compound_filter and len(compound_filter) > 0:
-                driver_laps = driver_laps[driver_laps['Compound'].isin(compound_filter)]
-
-            # Filter for valid laps
-            valid_laps = driver_laps[driver_laps['LapTime'].notna()]
-
-            if len(valid_laps) > 0:
-                all_team_laps.append(valid_laps)
-
-    if not all_team_laps:
+def create_team_comparison_table(session, teams, compound_filter, clean_only=False):
+    # Select the valid laps of all selected teams at once, with the compound and clean-lap filters
+    context = session_context(session)
+    frame = context.lap_frame
+    selected = frame['Team'].isin(teams) & compound_mask(frame, compound_filter) & clean_mask(frame, clean_only)
+    combined_laps = context.valid_laps[selected]
+
+    if len(combined_laps) == 0:
         return html.Div("No lap data available for the selected teams and filters")
 
-    # Combine all laps
-    combined_laps = pd.concat(all_team_laps)
-
-    # Select and format columns for display
+    # Select columns for display, sorted by team, driver and lap number
     display_columns = ['Team', 'Driver', 'LapNumber', 'LapTime', 'Compound', 'TyreLife', 'FreshTyre']
-    display_df = combined_laps[display_columns].copy()
+    display_df = combined_laps[display_columns].sort_values(['Team', 'Driver', 'LapNumber'])
 
     # Format lap times to strings
-    display_df['LapTime'] = display_df['LapTime'].apply(lambda x: str(x))
-
-    # Sort by team, driver and lap number
-    display_df = display_df.sort_values(['Team', 'Driver', 'LapNumber'])
+    display_df['LapTime'] = display_df['LapTime'].astype(str)
 
     # Create data table
     return dash_table.DataTable(
@@ -152,27 +233,24 @@ def create_team_comparison_table(session, teams, compound_filter):
     )
 
 # Function to create a data table for telemetry data
-def create_telemetry_table(session, drivers, channel):
+def create_telemetry_table(session, drivers, channel, clean_only=False):
     if len(drivers) < 1:
         return html.Div("Please select at least one driver")
 
     all_telemetry = []
+    context = session_context(session)
 
     for driver in drivers:
         try:
-            # Get fastest lap for driver
-            driver_laps = session.laps.pick_drivers(driver)
-
-            if len(driver_laps) == 0:
-                continue
+            # Get fastest lap and its telemetry for driver (shared with the chart)
+            lap_telemetry = context.fastest_lap_telemetry(driver, clean_only)
 
-            fastest_lap = driver_laps.pick_fastest()
+            if lap_telemetry is not None:
+                fastest_lap, telemetry = lap_telemetry
+                driver_laps = context.driver_laps(driver)
 
-            # Get telemetry data
-            if hasattr(fastest_lap, 'get_telemetry'):
-                telemetry = fastest_lap.get_telemetry()
-
-                # Add driver info
+                # Add driver info to a copy, the cached telemetry is shared
+                telemetry = telemetry.copy()
                 telemetry['Driver'] = driver
                 telemetry['Team'] = driver_laps.iloc[0]['Team'] if 'Team' in driver_laps.columns else 'Unknown'
                 telemetry['LapNumber'] = fastest_lap['LapNumber']
@@ -230,27 +308,22 @@ def create_telemetry_table(session, drivers, channel):
     )
 
 # Function to create a data table for lap distribution
-def create_lap_distribution_table(session, compound_filter):
-    # Get all laps with valid lap times
-    laps = session.laps[session.laps['LapTime'].notna()]
-
-    # Apply compound filter if provided
-    if compound_filter and len(compound_filter) > 0:
-        laps = laps[laps['Compound'].isin(compound_filter)]
+def create_lap_distribution_table(session, compound_filter, clean_only=False):
+    # Get all laps with valid lap times, filtered the same way as the chart
+    context = session_context(session)
+    frame = context.lap_frame
+    laps = context.valid_laps[compound_mask(frame, compound_filter) & clean_mask(frame, clean_only)]
 
     # Skip if no valid laps
     if len(laps) == 0:
         return html.Div("No valid lap data available")
 
-    # Select and format columns for display
+    # Select columns for display, sorted by driver and lap time
     display_columns = ['Driver', 'Team', 'LapNumber', 'LapTime', 'Compound', 'TyreLife', 'Stint', 'TrackStatus']
-    display_df = laps[display_columns].copy()
+    display_df = laps[display_columns].sort_values(['Driver', 'LapTime'])
 
     # Format lap times to strings
-    display_df['LapTime'] = display_df['LapTime'].apply(lambda x: str(x))
-
-    # Sort by driver and lap time
-    display_df = display_df.sort_values(['Driver', 'LapTime'])
+    display_df['LapTime'] = display_df['LapTime'].astype(str)
 
     # Create data table
     return dash_table.DataTable(
@@ -283,164 +356,152 @@ def create_lap_distribution_table(session, compound_filter):
         sort_action="native",
     )
 
-def create_laptimes_chart(session, drivers, plot_style='line', compound_filter=None):
-    if plot_style == 'line' or plot_style == 'scatter':
-        fig = go.Figure()
-
-        for driver in drivers:
-            # Get laps for the driver
-            driver_laps = session.laps.pick_drivers(driver)
-
-            # Apply compound filter if provided
-            if compound_filter and len(compound_filter) > 0:
-                driver_laps = driver_laps[driver_laps['Compound'].isin(compound_filter)]
-
-            # Filter for valid laps with times
-            valid_laps = driver_laps[driver_laps['LapTime'].notna()]
-
-            if len(valid_laps) > 0:
-                # Get team for the driver
-                team = valid_laps.iloc[0]['Team'] if 'Team' in valid_laps.columns else None
-
-                # Convert lap times to seconds for plotting
-                lap_times = valid_laps['LapTime'].dt.total_seconds()
-                lap_numbers = valid_laps['LapNumber']
-
-                # Get team color if available
-                try:
-                    team_color = fastf1.plotting.get_team_color(team) if team else None
-                except:
-                    team_color = None
+# Shared styling for the data tables of the newer analysis views
+def create_styled_table(table_id, display_df, page_size=10):
+    return dash_table.DataTable(
+        id=table_id,
+        columns=[{"name": col, "id": col} for col in display_df.columns],
+        data=display_df.to_dict('records'),
+        style_table={'overflowX': 'auto'},
+        style_header={
+            'backgroundColor': '#2c3e50',
+            'color': 'white',
+            'fontWeight': 'bold',
+            'textAlign': 'left'
+        },
+        style_cell={
+            'backgroundColor': '#1e2130',
+            'color': 'white',
+            'textAlign': 'left',
+            'fontFamily': 'Arial, sans-serif',
+            'fontSize': '14px',
+            'padding': '8px'
+        },
+        style_data_conditional=[
+            {
+                'if': {'row_index': 'odd'},
+                'backgroundColor': '#283747'
+            }
+        ],
+        page_size=page_size,
+        filter_action="native",
+        sort_action="native",
+    )
 
-                # Create trace based on plot style
-                if plot_style == 'line':
-                    fig.add_trace(go.Scatter(
-                        x=lap_numbers,
-                        y=lap_times,
-                        mode='lines+markers',
-                        name=f"{driver} ({team})" if team else driver,
-                        marker=dict(color=team_color),
-                        line=dict(color=team_color),
-                        hovertemplate='Lap %{x}<br>Time: %{text}<extra></extra>',
-                        text=[str(time) for time in valid_laps['LapTime']]
-                    ))
-                else:  # scatter
-                    # Group by compound if available
-                    if 'Compound' in valid_laps.columns:
-                        compounds = valid_laps['Compound'].unique()
-                        for compound in compounds:
-                            compound_laps = valid_laps[valid_laps['Compound'] == compound]
-                            if len(compound_laps) > 0:
-                                c_lap_times = compound_laps['LapTime'].dt.total_seconds()
-                                c_lap_numbers = compound_laps['LapNumber']
-
-                                # Use compound color as primary, team color as secondary
-                                compound_color = fastf1.plotting.COMPOUND_COLORS.get(compound, team_color)
-
-                                fig.add_trace(go.Scatter(
-                                    x=c_lap_numbers,
-                                    y=c_lap_times,
-                                    mode='markers',
-                                    name=f"{driver} - {compound}",
-                                    marker=dict(
-                                        size=10,
-                                        symbol='circle',
-                                        color=compound_color
-                                    ),
-                                    hovertemplate='Lap %{x}<br>Time: %{text}<br>Compound: ' + compound + '<extra></extra>',
-                                    text=[str(time) for time in compound_laps['LapTime']]
-                                ))
-                    else:
-                        fig.add_trace(go.Scatter(
-                            x=lap_numbers,
-                            y=lap_times,
-                            mode='markers',
-                            name=f"{driver} ({team})" if team else driver,
-                            marker=dict(color=team_color, size=10),
-                            hovertemplate='Lap %{x}<br>Time: %{text}<extra></extra>',
-                            text=[str(time) for time in valid_laps['LapTime']]
-                        ))
+# Function to create data tables for tyre degradation fits
+def create_tyre_degradation_table(session, drivers=None, compound_filter=None, fuel_corrected=False,
+                                  clean_only=False):
+    stints, _ = session_context(session).tyre_degradation(fuel_corrected, clean_only)
+
+    # Apply driver and compound filters if provided
+    if drivers:
+        stints = stints[stints['Driver'].isin(drivers)]
+    stints = stints[compound_mask(stints, compound_filter)]
+
+    if len(stints) == 0:
+        return html.Div("No stint data available for the selected drivers and compounds")
+
+    # One row per stint, sorted by driver and stint
+    display_df = stints[['Driver', 'Team', 'Stint', 'Compound', 'Laps', 'FirstLap', 'LastLap',
+                         'Slope', 'Intercept', 'R2']].sort_values(['Driver', 'Stint'])
+    display_df = display_df.round({'Slope': 3, 'Intercept': 3, 'R2': 3})
+
+    # Lap-weighted degradation per compound
+    compound_df = summarize_degradation_by_compound(stints).round({'Slope': 3, 'R2': 3})
+
+    return html.Div([
+        create_styled_table('tyre-degradation-table', display_df),
+        html.H5("Degradation by Compound (s/lap)", className="mt-3"),
+        create_styled_table('tyre-degradation-compound-table', compound_df)
+    ])
+
+# Function to create data tables for race gaps
+def create_race_gaps_table(session, drivers=None):
+    gaps = session_context(session).race_gaps
+
+    # Selected drivers, or the whole field
+    rows = [i for i, driver in enumerate(gaps['drivers']) if not drivers or driver in drivers]
+    if not rows or len(gaps['laps']) == 0:
+        return html.Div("No gap data available for the selected drivers")
+
+    # One row per driver and completed lap, straight from the matrices
+    gap = gaps['gap'][rows]
+    interval = gaps['interval'][rows]
+    display_df = pd.DataFrame({
+        'Driver': np.repeat(np.array(gaps['drivers'], dtype=object)[rows], len(gaps['laps'])),
+        'Lap': np.tile(gaps['laps'], len(rows)),
+        'Gap to Leader (s)': gap.ravel().round(3),
+        'Interval (s)': interval.ravel().round(3),
+    })
+    display_df = display_df[~np.isnan(gap.ravel())]
+
+    return create_styled_table('race-gaps-table', display_df)
+
+# Function to create data tables for position changes
+def create_positions_table(session, drivers=None):
+    events = session_context(session).race_positions['events']
+
+    # Swaps involving the selected drivers, or all of them
+    if drivers:
+        events = events[events['Driver'].isin(drivers) | events['Overtaken'].isin(drivers)]
+
+    if len(events) == 0:
+        return html.Div("No position changes for the selected drivers")
+
+    display_df = pd.DataFrame({
+        'Lap': events['Lap'],
+        'Driver': events['Driver'],
+        'Passed': events['Overtaken'],
+        'New Position': events['Position'].astype(int),
+        'Type': np.where(events['Pit'], 'Pit stop', 'On track'),
+    })
+
+    return create_styled_table('positions-table', display_df)
+
+def create_laptimes_chart(session, drivers, plot_style='line', compound_filter=None, clean_only=False,
+                          color_by=None, show_points=False):
+    # Colors resolved once per session
+    context = session_context(session)
+    palette = context.palette
+
+    # Valid laps as plot-ready columns, with the clean-lap mask applied
+    frame = context.lap_frame
+    frame = frame[clean_mask(frame, clean_only)]
+
+    # Plain line and scatter charts are drawn in the browser from the lap
+    # dataset (renderLapFigure in assets/clientside.js); only the variant
+    # colored by track temperature, which needs the weather data, is built here
+    if plot_style == 'line' or plot_style == 'scatter':
+        if color_by == 'track_temp':
+            return create_laptimes_weather_chart(session, frame, drivers, plot_style, compound_filter)
+        return html.Div("Unsupported plot style")
 
-        fig.update_layout(
-            title='Lap Times Comparison',
-            xaxis_title='Lap Number',
-            yaxis_title='Lap Time (seconds)',
-            template='plotly_dark',
-            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
-            margin=dict(l=40, r=40, t=60, b=40),
-            height=600
-        )
+    if plot_style == 'box' or plot_style == 'violin':
+        # Select the valid laps of all requested drivers at once (lap time in seconds)
+        df = frame.loc[frame['Driver'].isin(drivers), ['Driver', 'Team', 'Compound', 'LapTime']]
 
-    elif plot_style == 'box' or plot_style == 'violin':
-        # Prepare data for box or violin plot
-        all_data = []
+        # Apply compound filter if provided
+        filtered_df = df[compound_mask(df, compound_filter)]
+
+        if len(filtered_df) > 0:
+            # Drivers in name order, so the figure doesn't depend on the order
+            # they were picked in (the result cache key doesn't either)
+            driver_order = sorted(set(df['Driver']))
+
+            # With several compounds, every compound is plotted and the filter only
+            # hides traces; otherwise color by team using the filtered laps
+            by_compound = df['Compound'].nunique() > 1
+            if by_compound:
+                color = 'Compound'
+                color_map = palette.compound_colors
+            else:
+                df = filtered_df
+                color = 'Team'
+                color_map = palette.team_colors
 
-        for driver in drivers:
-            driver_laps = session.laps.pick_drivers(driver)
-
-            # Apply compound filter if provided
-            if compound_filter and len(compound_filter) > 0:
-                driver_laps = driver_laps[driver_laps['Compound'].isin(compound_filter)]
-
-            valid_laps = driver_laps[driver_laps['LapTime'].notna()]
-
-            if len(valid_laps) > 0:
-                lap_times = valid_laps['LapTime'].dt.total_seconds()
-                team = valid_laps.iloc[0]['Team'] if 'Team' in valid_laps.columns else 'Unknown'
-
-                # For each lap, add its details
-                for i, time in enumerate(lap_times):
-                    compound = valid_laps.iloc[i]['Compound'] if 'Compound' in valid_laps.columns else 'Unknown'
-
-                    all_data.append({
-                        'Driver': driver,
-                        'Team': team,
-                        'Compound': compound,
-                        'LapTime': time
-                    })
-
-        # Convert to DataFrame for plotting
-        df = pd.DataFrame(all_data)
-
-        if len(df) > 0:
-            # Create team color mapping
-            team_colors = {}
-            for team in df['Team'].unique():
-                try:
-                    team_colors[team] = fastf1.plotting.get_team_color(team)
-                except:
-                    team_colors[team] = '#333333'
-
-            if plot_style == 'box':
-                if 'Compound' in df.columns and len(df['Compound'].unique()) > 1:
-                    # Use compound as color if available
-                    fig = px.box(df, x='Driver', y='LapTime', color='Compound',
-                                 title='Lap Time Distribution by Driver',
-                                 template='plotly_dark',
-                                 color_discrete_map=fastf1.plotting.COMPOUND_COLORS,
-                                 height=600)
-                else:
-                    # Use team as color
-                    fig = px.box(df, x='Driver', y='LapTime', color='Team',
-                                 title='Lap Time Distribution by Driver',
-                                 template='plotly_dark',
-                                 color_discrete_map=team_colors,
-                                 height=600)
-            else:  # violin
-                if 'Compound' in df.columns and len(df['Compound'].unique()) > 1:
-                    # Use compound as color if available
-                    fig = px.violin(df, x='Driver', y='LapTime', color='Compound',
-                                    title='Lap Time Distribution by Driver',
-                                    box=True, points="all", template='plotly_dark',
-                                    color_discrete_map=fastf1.plotting.COMPOUND_COLORS,
-                                    height=600)
-                else:
-                    # Use team as color
-                    fig = px.violin(df, x='Driver', y='LapTime', color='Team',
-                                    title='Lap Time Distribution by Driver',
-                                    box=True, points="all", template='plotly_dark',
-                                    color_discrete_map=team_colors,
-                                    height=600)
+            fig = create_distribution_figure(df, 'Driver', color, plot_style, color_map, driver_order,
+                                             compound_filter, show_points,
+                                             title='Lap Time Distribution by Driver')
 
             fig.update_layout(
                 xaxis_title='Driver',
@@ -456,121 +517,143 @@ def create_laptimes_chart(session, drivers, plot_style='line', compound_filter=N
 
     return dcc.Graph(figure=fig)
 
-def create_team_comparison(session, teams, plot_style='box', compound_filter=None):
-    # Get all laps by team
-    team_laps = {}
-    team_colors = {}
-
-    for team in teams:
-        # Get all drivers from this team
-        team_drivers = []
+# Lap times colored by track temperature, next to a lap time vs track temperature regression
+def create_laptimes_weather_chart(session, frame, drivers, plot_style, compound_filter):
+    context = session_context(session)
+    palette = context.palette
+
+    # Selected laps with the track temperature of each lap
+    df = frame[frame['Driver'].isin(drivers) & compound_mask(frame, compound_filter)]
+    df = df.assign(TrackTemp=context.lap_weather.loc[df.index, 'TrackTemp'])
+
+    if len(df) == 0:
+        return html.Div("No valid lap data available for the selected drivers and compound filter")
+    if df['TrackTemp'].isna().all():
+        return html.Div("No weather data available for this session")
+
+    fig = make_subplots(rows=1, cols=2, column_widths=[0.65, 0.35], horizontal_spacing=0.08,
+                        subplot_titles=('Lap Times by Track Temperature', 'Lap Time vs Track Temperature'))
+
+    temp_range = dict(cmin=df['TrackTemp'].min(), cmax=df['TrackTemp'].max())
+    groups = df.groupby('Driver', sort=False)
+
+    for i, driver in enumerate(driver for driver in drivers if driver in groups.groups):
+        driver_df = groups.get_group(driver)
+        driver_color = palette.driver_colors.get(driver)
+
+        fig.add_trace(go.Scatter(
+            x=driver_df['LapNumber'],
+            y=driver_df['LapTime'],
+            mode='lines+markers' if plot_style == 'line' else 'markers',
+            name=driver,
+            legendgroup=driver,
+            line=dict(color=driver_color, width=1),
+            marker=dict(size=8, color=driver_df['TrackTemp'], colorscale='Thermal',
+                        showscale=i == 0, colorbar=dict(title='Track °C', x=0.6), **temp_range),
+            customdata=driver_df['TrackTemp'],
+            hovertemplate=f"{driver}<br>Lap %{{x}}<br>Time: %{{y:.3f}}s<br>Track: %{{customdata:.1f}}°C<extra></extra>"
+        ), row=1, col=1)
+
+        # Least-squares line of lap time against track temperature
+        fit_df = driver_df.dropna(subset=['TrackTemp'])
+        fig.add_trace(go.Scatter(
+            x=fit_df['TrackTemp'],
+            y=fit_df['LapTime'],
+            mode='markers',
+            name=driver,
+            legendgroup=driver,
+            showlegend=False,
+            marker=dict(size=6, color=driver_color, opacity=0.6),
+            hovertemplate=f"{driver}<br>Track: %{{x:.1f}}°C<br>Time: %{{y:.3f}}s<extra></extra>"
+        ), row=1, col=2)
+
+        if fit_df['TrackTemp'].nunique() > 1:
+            slope, intercept = np.polyfit(fit_df['TrackTemp'], fit_df['LapTime'], 1)
+            temps = np.array([fit_df['TrackTemp'].min(), fit_df['TrackTemp'].max()])
+            fig.add_trace(go.Scatter(
+                x=temps,
+                y=intercept + slope * temps,
+                mode='lines',
+                name=f"{driver} fit",
+                legendgroup=driver,
+                showlegend=False,
+                line=dict(color=driver_color, width=2),
+                hovertemplate=f"{driver}: {slope:+.3f} s/°C<extra></extra>"
+            ), row=1, col=2)
+
+    fig.update_xaxes(title_text='Lap Number', row=1, col=1)
+    fig.update_xaxes(title_text='Track Temperature (°C)', row=1, col=2)
+    fig.update_yaxes(title_text='Lap Time (seconds)', row=1, col=1)
 
-        if 'Team' in session.results:
-            team_drivers = session.results.loc[session.results['Team'] == team, 'Abbreviation'].tolist()
-
-        # If no drivers found in results, try from laps
-        if not team_drivers and hasattr(session, 'laps') and 'Team' in session.laps.columns:
-            team_drivers = session.laps.loc[session.laps['Team'] == team, 'Driver'].unique().tolist()
-
-        # Collect laps from all team drivers
-        all_team_laps = []
-        for driver in team_drivers:
-            driver_laps = session.laps.pick_drivers(driver)
+    fig.update_layout(
+        title='Lap Times and Track Temperature',
+        template='plotly_dark',
+        legend=dict(orientation='h', yanchor='bottom', y=1.06, xanchor='right', x=1),
+        margin=dict(l=40, r=40, t=80, b=40),
+        height=600
+    )
 
-            # Apply compound filter if provided
-            if compound_filter and len(compound_filter) > 0:
-                driver_laps = driver_laps[driver_laps['Compound'].isin(compound_filter)]
+    return dcc.Graph(figure=fig)
 
-            # Filter for valid laps
-            valid_laps = driver_laps[driver_laps['LapTime'].notna()]
+def create_team_comparison(session, teams, plot_style='box', compound_filter=None, clean_only=False,
+                           show_points=False):
+    # Select the valid laps of all requested teams at once (lap time in seconds)
+    frame = session_context(session).lap_frame
+    team_frame = frame[frame['Team'].isin(teams) & clean_mask(frame, clean_only)]
 
-            if len(valid_laps) > 0:
-                all_team_laps.append(valid_laps)
+    # Apply compound filter if provided. Charts split by compound keep every
+    # compound and hide the filtered ones instead.
+    filtered_frame = team_frame[compound_mask(team_frame, compound_filter)]
 
-                # Get team color if not already set - FIXED METHOD
-                if team not in team_colors:
-                    try:
-                        team_colors[team] = fastf1.plotting.team_color(team) # Corrected method
-                    except:
-                        team_colors[team] = '#333333'
+    if len(filtered_frame) == 0:
+        return html.Div("No valid lap data available for the selected teams")
 
-        if all_team_laps:
-            team_laps[team] = pd.concat(all_team_laps, ignore_index=True)
+    # Teams in name order, so the figure doesn't depend on the order they
+    # were picked in (the result cache key doesn't either)
+    team_order = sorted(set(team_frame['Team']))
 
-    if not team_laps:
-        return html.Div("No valid lap data available for the selected teams")
+    # Colors resolved once per session
+    palette = session_context(session).palette
 
     # Prepare data based on plot style
     if plot_style == 'box' or plot_style == 'violin':
-        # Prepare data for box/violin plot
-        all_data = []
-
-        for team, laps in team_laps.items():
-            lap_times = laps['LapTime'].dt.total_seconds()
-
-            # For each lap, add to dataset
-            for i, time in enumerate(lap_times):
-                compound = laps.iloc[i]['Compound'] if 'Compound' in laps.columns else 'Unknown'
-                driver = laps.iloc[i]['Driver'] if 'Driver' in laps.columns else 'Unknown'
-
-                all_data.append({
-                    'Team': team,
-                    'Driver': driver,
-                    'LapTime': time,
-                    'Compound': compound
-                })
-
-        # Convert to DataFrame for plotting
-        df = pd.DataFrame(all_data)
-
-        if len(df) > 0:
-            # If multiple compounds are available, use them for color
-            if 'Compound' in df.columns and len(df['Compound'].unique()) > 1:
-                if plot_style == 'box':
-                    fig = px.box(df, x='Team', y='LapTime', color='Compound',
-                                 title='Lap Time Distribution by Team',
-                                 template='plotly_dark',
-                                 color_discrete_map=fastf1.plotting.COMPOUND_COLORS,
-                                 height=600)
-                else:  # violin
-                    fig = px.violin(df, x='Team', y='LapTime', color='Compound',
-                                    box=True, points="all",
-                                    title='Lap Time Distribution by Team',
-                                    template='plotly_dark',
-                                    color_discrete_map=fastf1.plotting.COMPOUND_COLORS,
-                                    height=600)
-            else:
-                # Use team colors
-                if plot_style == 'box':
-                    fig = px.box(df, x='Team', y='LapTime', color='Team',
-                                 title='Lap Time Distribution by Team',
-                                 template='plotly_dark',
-                                 color_discrete_map=team_colors,
-                                 height=600)
-                else:  # violin
-                    fig = px.violin(df, x='Team', y='LapTime', color='Team',
-                                    box=True, points="all",
-                                    title='Lap Time Distribution by Team',
-                                    template='plotly_dark',
-                                    color_discrete_map=team_colors,
-                                    height=600)
+        df = team_frame[['Team', 'Driver', 'LapTime', 'Compound']]
+
+        # If multiple compounds are available, use them for color
+        by_compound = df['Compound'].nunique() > 1
+        if by_compound:
+            color = 'Compound'
+            color_map = palette.compound_colors
         else:
-            return html.Div("No valid lap data for plotting")
+            # Use team colors on the filtered laps
+            df = filtered_frame[['Team', 'Driver', 'LapTime', 'Compound']]
+            color = 'Team'
+            color_map = palette.team_colors
+
+        fig = create_distribution_figure(df, 'Team', color, plot_style, color_map, team_order,
+                                         compound_filter, show_points,
+                                         title='Lap Time Distribution by Team')
 
     else:  # line or scatter
         fig = go.Figure()
 
-        for team, laps in team_laps.items():
-            team_color = team_colors.get(team, '#333333')
+        if plot_style == 'line':
+            # Per-lap statistics of every team, computed once per compound filter
+            team_stats = session_context(session).team_lap_stats(compound_filter, clean_only=clean_only)
+            stats_teams = set(team_stats.index.get_level_values('Team'))
+        else:
+            team_groups = dict(tuple(team_frame.groupby('Team', sort=False)))
+
+        for team in team_order:
+            team_color = palette.team(team)
 
             if plot_style == 'line':
-                # Calculate lap time statistics per lap number
-                lap_stats = laps.groupby('LapNumber')['LapTime'].agg(['mean', 'min', 'max']).reset_index()
+                # Min/max bands are computed from the filtered laps only
+                if team not in stats_teams:
+                    continue
 
-                # Convert timedeltas to seconds
-                lap_stats['mean'] = lap_stats['mean'].dt.total_seconds()
-                lap_stats['min'] = lap_stats['min'].dt.total_seconds()
-                lap_stats['max'] = lap_stats['max'].dt.total_seconds()
+                # Lap time statistics per lap number (in seconds)
+                lap_stats = team_stats.xs(team, level='Team').reset_index()
 
                 # Add trace for mean lap time
                 fig.add_trace(go.Scatter(
@@ -598,47 +681,30 @@ def create_team_comparison(session, teams, plot_style='box', compound_filter=Non
                     mode='lines',
                     line=dict(width=0),
                     fill='tonexty',
-                    fillcolor=f"rgba{(*hex_to_rgb(team_color), 0.2)}",
+                    fillcolor=palette.team_fill(team),
                     showlegend=False,
                     hoverinfo='skip'
                 ))
 
             else:  # scatter
-                # Group by compound if available
-                if 'Compound' in laps.columns:
-                    compounds = laps['Compound'].unique()
-                    for compound in compounds:
-                        compound_laps = laps[laps['Compound'] == compound]
-                        if len(compound_laps) > 0:
-                            lap_times = compound_laps['LapTime'].dt.total_seconds()
-                            lap_numbers = compound_laps['LapNumber']
-
-                            # Use compound color instead of team color
-                            compound_color = fastf1.plotting.COMPOUND_COLORS.get(compound, team_color)
-
-                            fig.add_trace(go.Scatter(
-                                x=lap_numbers,
-                                y=lap_times,
-                                mode='markers',
-                                name=f"{team} - {compound}",
-                                marker=dict(
-                                    size=10,
-                                    symbol='circle',
-                                    color=compound_color
-                                ),
-                                hovertemplate='Lap %{x}<br>Time: %{y:.3f}s<br>Compound: ' + compound + '<extra></extra>'
-                            ))
-                else:
-                    lap_times = laps['LapTime'].dt.total_seconds()
-                    lap_numbers = laps['LapNumber']
+                # Group by compound
+                for compound, compound_laps in team_groups[team].groupby('Compound', sort=False):
+                    # Use compound color instead of team color
+                    compound_color = palette.compound(compound, team_color)
 
                     fig.add_trace(go.Scatter(
-                        x=lap_numbers,
-                        y=lap_times,
+                        x=compound_laps['LapNumber'],
+                        y=compound_laps['LapTime'],
                         mode='markers',
-                        name=team,
-                        marker=dict(color=team_color, size=10),
-                        hovertemplate='Lap %{x}<br>Time: %{y:.3f}s<extra></extra>'
+                        name=f"{team} - {compound}",
+                        marker=dict(
+                            size=10,
+                            symbol='circle',
+                            color=compound_color
+                        ),
+                        hovertemplate='Lap %{x}<br>Time: %{y:.3f}s<br>Compound: ' + compound + '<extra></extra>',
+                        visible=compound_visible(compound, compound_filter),
+                        meta={'compound': compound}
                     ))
 
     # Additional layout improvements for better readability - FIXED GRID LINES
@@ -687,27 +753,25 @@ def create_team_comparison(session, teams, plot_style='box', compound_filter=Non
 
     return dcc.Graph(figure=fig)
 
-def create_telemetry_visualization(session, drivers, channel, track_map='no', plot_style='line'):
+def create_telemetry_visualization(session, drivers, channel, track_map='no', plot_style='line', clean_only=False):
     if len(drivers) < 1:
         return html.Div("Please select at least one driver")
 
+    context = session_context(session)
+    palette = context.palette
+
     if track_map == 'yes':
         # Create track map visualization with telemetry data
         fig = go.Figure()
 
         for driver in drivers:
             try:
-                # Get fastest lap for driver
-                driver_laps = session.laps.pick_drivers(driver)
-
-                if len(driver_laps) == 0:
-                    continue
+                # Get fastest lap and its telemetry for driver (shared with the table)
+                lap_telemetry = context.fastest_lap_telemetry(driver, clean_only)
 
-                fastest_lap = driver_laps.pick_fastest()
-
-                # Get telemetry data
-                if hasattr(fastest_lap, 'get_telemetry'):
-                    telemetry = fastest_lap.get_telemetry()
+                if lap_telemetry is not None:
+                    fastest_lap, telemetry = lap_telemetry
+                    driver_laps = context.driver_laps(driver)
 
                     # Check if required channels exist
                     if 'X' in telemetry.columns and 'Y' in telemetry.columns and channel in telemetry.columns:
@@ -715,10 +779,7 @@ def create_telemetry_visualization(session, drivers, channel, track_map='no', pl
                         team = driver_laps.iloc[0]['Team'] if 'Team' in driver_laps.columns else None
 
                         # Get team color if available
-                        try:
-                            team_color = fastf1.plotting.get_team_color(team) if team else None
-                        except:
-                            team_color = None
+                        team_color = palette.team(team) if team else None
 
                         # Create scatter plot colored by the selected channel
                         fig.add_trace(go.Scatter(
@@ -733,6 +794,7 @@ def create_telemetry_visualization(session, drivers, channel, track_map='no', pl
                                 colorbar=dict(title=channel)
                             ),
                             name=f"{driver} ({team})" if team else driver,
+                            meta={'driver': driver},
                             hovertemplate=f"X: %{{x:.1f}}<br>Y: %{{y:.1f}}<br>{channel}: %{{marker.color}}<extra>{driver}</extra>"
                         ))
             except Exception as e:
@@ -756,17 +818,12 @@ def create_telemetry_visualization(session, drivers, channel, track_map='no', pl
 
         for driver in drivers:
             try:
-                # Get fastest lap for driver
-                driver_laps = session.laps.pick_drivers(driver)
-
-                if len(driver_laps) == 0:
-                    continue
+                # Get fastest lap and its telemetry for driver (shared with the table)
+                lap_telemetry = context.fastest_lap_telemetry(driver, clean_only)
 
-                fastest_lap = driver_laps.pick_fastest()
-
-                # Get telemetry data
-                if hasattr(fastest_lap, 'get_telemetry'):
-                    telemetry = fastest_lap.get_telemetry()
+                if lap_telemetry is not None:
+                    fastest_lap, telemetry = lap_telemetry
+                    driver_laps = context.driver_laps(driver)
 
                     # Check if selected channel exists
                     if channel in telemetry.columns:
@@ -777,30 +834,19 @@ def create_telemetry_visualization(session, drivers, channel, track_map='no', pl
                         team = driver_laps.iloc[0]['Team'] if 'Team' in driver_laps.columns else None
 
                         # Get team color if available
-                        try:
-                            team_color = fastf1.plotting.get_team_color(team) if team else None
-                        except:
-                            team_color = None
+                        team_color = palette.team(team) if team else None
 
-                        # Add to plot based on style
-                        if plot_style == 'line':
+                        # Line and scatter traces carry both styles and differ only in
+                        # mode, so the callbacks can switch between them with a patch
+                        if plot_style in TELEMETRY_MODES:
                             fig.add_trace(go.Scatter(
                                 x=x_data,
                                 y=telemetry[channel],
-                                mode='lines',
+                                mode=TELEMETRY_MODES[plot_style],
                                 name=f"{driver} ({team})" if team else driver,
                                 line=dict(color=team_color),
-                                hovertemplate=f"{channel}: %{{y}}<br>Distance: %{{x:.0f}}m<extra>{driver}</extra>"
-                                if 'Distance' in telemetry.columns else
-                                f"{channel}: %{{y}}<extra>{driver}</extra>"
-                            ))
-                        elif plot_style == 'scatter':
-                            fig.add_trace(go.Scatter(
-                                x=x_data,
-                                y=telemetry[channel],
-                                mode='markers',
-                                name=f"{driver} ({team})" if team else driver,
                                 marker=dict(size=5, color=team_color),
+                                meta={'driver': driver, 'modes': True},
                                 hovertemplate=f"{channel}: %{{y}}<br>Distance: %{{x:.0f}}m<extra>{driver}</extra>"
                                 if 'Distance' in telemetry.columns else
                                 f"{channel}: %{{y}}<extra>{driver}</extra>"
@@ -823,126 +869,509 @@ def create_telemetry_visualization(session, drivers, channel, track_map='no', pl
 
     return dcc.Graph(figure=fig)
 
-def create_lap_distribution(session, compound_filter=None, plot_style='violin'):
-    # Prepare data
-    all_data = []
-
-    # Get all laps with valid lap times
-    laps = session.laps[session.laps['LapTime'].notna()]
-
-    # Apply compound filter if provided
-    if compound_filter and len(compound_filter) > 0:
-        laps = laps[laps['Compound'].isin(compound_filter)]
+def create_lap_distribution(session, compound_filter=None, plot_style='violin', clean_only=False,
+                            show_points=False):
+    # All valid (or clean) laps as plot-ready columns (lap time in seconds).
+    # Traces are split by compound, so every compound is plotted and the
+    # compound filter only decides which of them are visible.
+    context = session_context(session)
+    frame = context.lap_frame
+    df = frame.loc[clean_mask(frame, clean_only), ['Driver', 'Team', 'Compound', 'LapTime']]
+    palette = context.palette
 
     # Skip if no valid laps
-    if len(laps) == 0:
+    if not compound_mask(df, compound_filter).any():
         return html.Div("No valid lap data available")
 
-    # Prepare data structure for plotting
-    for i, lap in laps.iterrows():
-        driver = lap['Driver']
-        team = lap['Team'] if 'Team' in lap else 'Unknown'
-        compound = lap['Compound'] if 'Compound' in lap else 'Unknown'
-        lap_time = lap['LapTime'].total_seconds()
-
-        all_data.append({
-            'Driver': driver,
-            'Team': team,
-            'Compound': compound,
-            'LapTime': lap_time
-        })
-
-    # Convert to DataFrame
-    df = pd.DataFrame(all_data)
-
-    # Create team color mapping
-    team_colors = {}
-    for team in df['Team'].unique():
-        try:
-            team_colors[team] = fastf1.plotting.get_team_color(team)
-        except:
-            team_colors[team] = '#333333'
-
-    # Create visualization based on plot style
-    if plot_style == 'violin':
-        # Always prioritize compound colors for violin plots
-        fig = px.violin(df, x='Driver', y='LapTime', color='Compound',
-                        box=True, points="all",
-                        title='Lap Time Distribution by Driver and Compound',
-                        template='plotly_dark',
-                        color_discrete_map=fastf1.plotting.COMPOUND_COLORS,
-                        height=600)
-    elif plot_style == 'box':
-        # Always prioritize compound colors for box plots
-        fig = px.box(df, x='Driver', y='LapTime', color='Compound',
-                     title='Lap Time Distribution by Driver and Compound',
-                     template='plotly_dark',
-                     color_discrete_map=fastf1.plotting.COMPOUND_COLORS,
-                     height=600)
-    elif plot_style == 'line' or plot_style == 'scatter':
-        # For line/scatter, we'll create a grouped visualization
+    # Line and scatter are drawn in the browser from the lap dataset
+    # (renderLapFigure in assets/clientside.js)
+    if plot_style != 'violin' and plot_style != 'box':
+        return html.Div("Unsupported plot style")
 
-        if plot_style == 'line':
-            # Group data by driver and compound, calculate statistics
-            driver_stats = df.groupby(['Driver', 'Compound', 'Team']).agg({
-                'LapTime': ['mean', 'min', 'max', 'std']
-            }).reset_index()
+    # Always prioritize compound colors for box and violin plots
+    fig = create_distribution_figure(df, 'Driver', 'Compound', plot_style, palette.compound_colors,
+                                     compound_filter=compound_filter, show_points=show_points,
+                                     title='Lap Time Distribution by Driver and Compound')
 
-            # Flatten the multi-index columns
-            driver_stats.columns = ['Driver', 'Compound', 'Team', 'Mean', 'Min', 'Max', 'Std']
+    fig.update_layout(
+        xaxis_title='Driver',
+        yaxis_title='Lap Time (seconds)',
+        template='plotly_dark',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        margin=dict(l=40, r=40, t=60, b=40),
+        height=600
+    )
 
-            # Sort by mean lap time
-            driver_stats = driver_stats.sort_values('Mean')
+    return dcc.Graph(figure=fig)
 
-            fig = go.Figure()
+def create_tyre_degradation_chart(session, drivers=None, compound_filter=None, fuel_corrected=False,
+                                  clean_only=False):
+    context = session_context(session)
+    palette = context.palette
+
+    # Fits of every stint in the session, computed once per fuel correction setting
+    stints, points = context.tyre_degradation(fuel_corrected, clean_only)
+
+    # Limit to the selected drivers if provided
+    if drivers:
+        stints = stints[stints['Driver'].isin(drivers)]
+        points = points[points['Driver'].isin(drivers)]
+
+    if not compound_mask(points, compound_filter).any():
+        return html.Div("No stint data available for the selected drivers and compounds")
+
+    fig = go.Figure()
+
+    # One points trace and one fit trace per compound; the compound filter only hides them
+    for compound, compound_points in points.groupby('Compound', sort=False):
+        compound_color = palette.compound(compound)
+        visible = compound_visible(compound, compound_filter)
+
+        fig.add_trace(go.Scatter(
+            x=compound_points['TyreLife'],
+            y=compound_points['LapTime'],
+            mode='markers',
+            name=compound,
+            legendgroup=compound,
+            marker=dict(color=compound_color, size=7, opacity=0.6),
+            customdata=compound_points[['Driver', 'Stint', 'LapNumber']],
+            hovertemplate='%{customdata[0]} - Stint %{customdata[1]}, Lap %{customdata[2]}<br>'
+                          'Tyre Life: %{x}<br>Time: %{y:.3f}s<extra></extra>',
+            visible=visible,
+            meta={'compound': compound}
+        ))
+
+        # Fitted lines of all stints on this compound, separated by gaps
+        fitted = stints[(stints['Compound'] == compound) & stints['Slope'].notna()]
+        if len(fitted) > 0:
+            x = np.column_stack([fitted['MinTyreLife'], fitted['MaxTyreLife'],
+                                 np.full(len(fitted), np.nan)]).ravel()
+            y = (np.repeat(fitted['Intercept'].to_numpy(), 3) + np.repeat(fitted['Slope'].to_numpy(), 3) * x)
+            labels = np.repeat((fitted['Driver'] + ' - Stint ' + fitted['Stint'].astype(str)
+                                + ': ' + fitted['Slope'].round(3).astype(str) + ' s/lap').to_numpy(), 3)
+
+            fig.add_trace(go.Scatter(
+                x=x,
+                y=y,
+                mode='lines',
+                name=f"{compound} fit",
+                legendgroup=compound,
+                showlegend=False,
+                line=dict(color=compound_color, width=2),
+                text=labels,
+                hovertemplate='%{text}<extra></extra>',
+                visible=visible,
+                meta={'compound': compound}
+            ))
 
-            for compound in df['Compound'].unique():
-                compound_data = driver_stats[driver_stats['Compound'] == compound]
+    fig.update_layout(
+        title='Tyre Degradation by Stint' + (' (Fuel-corrected)' if fuel_corrected else ''),
+        xaxis_title='Tyre Life (laps)',
+        yaxis_title='Fuel-corrected Lap Time (seconds)' if fuel_corrected else 'Lap Time (seconds)',
+        template='plotly_dark',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        margin=dict(l=40, r=40, t=60, b=40),
+        height=600
+    )
 
-                # Use compound colors for different compounds
-                compound_color = fastf1.plotting.COMPOUND_COLORS.get(compound, '#333333')
+    return dcc.Graph(figure=fig)
 
-                fig.add_trace(go.Scatter(
-                    x=compound_data['Driver'],
-                    y=compound_data['Mean'],
-                    mode='lines+markers',
-                    name=compound,
-                    line=dict(color=compound_color),
-                    marker=dict(color=compound_color, size=8),
-                    error_y=dict(
-                        type='data',
-                        array=compound_data['Std'],
-                        visible=True
-                    )
-                ))
-        else:  # scatter
-            fig = go.Figure()
+def create_race_gaps_chart(session, drivers=None):
+    context = session_context(session)
+    palette = context.palette
+    gaps = context.race_gaps
+
+    # Gaps are computed for the full field; show the selected drivers or everyone
+    rows = [i for i, driver in enumerate(gaps['drivers']) if not drivers or driver in drivers]
+    if not rows or len(gaps['laps']) == 0:
+        return html.Div("No gap data available for the selected drivers")
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                        subplot_titles=('Gap to Leader', 'Interval to Car Ahead'))
+
+    for i in rows:
+        driver = gaps['drivers'][i]
+        driver_color = palette.driver_colors.get(driver)
+
+        # WebGL traces keep full-field, full-distance charts responsive
+        for row, values in ((1, gaps['gap'][i]), (2, gaps['interval'][i])):
+            fig.add_trace(go.Scattergl(
+                x=gaps['laps'],
+                y=values,
+                mode='lines',
+                name=driver,
+                legendgroup=driver,
+                showlegend=row == 1,
+                line=dict(color=driver_color, width=2),
+                hovertemplate=f"{driver}<br>Lap %{{x}}<br>%{{y:.3f}}s<extra></extra>"
+            ), row=row, col=1)
+
+    fig.update_yaxes(title_text='Gap (seconds)', autorange='reversed', row=1, col=1)
+    fig.update_yaxes(title_text='Interval (seconds)', autorange='reversed', row=2, col=1)
+    fig.update_xaxes(title_text='Lap Number', row=2, col=1)
 
-            for compound in df['Compound'].unique():
-                compound_data = df[df['Compound'] == compound]
+    fig.update_layout(
+        title=f'Race Gaps - {session.event["EventName"]} {session.name}',
+        template='plotly_dark',
+        legend=dict(orientation='h', yanchor='bottom', y=1.04, xanchor='right', x=1),
+        margin=dict(l=40, r=40, t=80, b=40),
+        height=800
+    )
 
-                # Use compound colors
-                compound_color = fastf1.plotting.COMPOUND_COLORS.get(compound, '#333333')
+    return dcc.Graph(figure=fig)
 
-                fig.add_trace(go.Scatter(
-                    x=compound_data['Driver'],
-                    y=compound_data['LapTime'],
-                    mode='markers',
-                    name=compound,
-                    marker=dict(
-                        color=compound_color,
-                        size=8
-                    ),
-                    hovertemplate='Driver: %{x}<br>Time: %{y:.3f}s<br>Compound: ' + compound + '<extra></extra>'
-                ))
+def create_positions_chart(session, drivers=None):
+    context = session_context(session)
+    palette = context.palette
+    positions = context.race_positions
+
+    if len(positions['drivers']) == 0 or len(positions['laps']) == 0:
+        return html.Div("No position data available for this session")
+
+    fig = go.Figure()
+
+    # Every driver's line in one figure; unselected drivers are dimmed
+    for i, driver in enumerate(positions['drivers']):
+        highlighted = not drivers or driver in drivers
+        fig.add_trace(go.Scattergl(
+            x=positions['laps'],
+            y=positions['positions'][i],
+            mode='lines',
+            name=driver,
+            line=dict(color=palette.driver_colors.get(driver), width=3 if highlighted else 1),
+            opacity=1.0 if highlighted else 0.3,
+            hovertemplate=f"{driver}<br>Lap %{{x}}<br>P%{{y}}<extra></extra>"
+        ))
+
+    # On-track overtakes by the selected drivers
+    events = positions['events']
+    overtakes = events[~events['Pit']]
+    if drivers:
+        overtakes = overtakes[overtakes['Driver'].isin(drivers)]
+    if len(overtakes) > 0:
+        fig.add_trace(go.Scattergl(
+            x=overtakes['Lap'],
+            y=overtakes['Position'],
+            mode='markers',
+            name='Overtakes',
+            marker=dict(symbol='triangle-up', size=10, color='white'),
+            text=overtakes['Driver'] + ' passes ' + overtakes['Overtaken'],
+            hovertemplate='Lap %{x}: %{text}<extra></extra>'
+        ))
 
     fig.update_layout(
-        xaxis_title='Driver',
-        yaxis_title='Lap Time (seconds)',
+        title=f'Positions - {session.event["EventName"]} {session.name}',
+        xaxis_title='Lap Number',
+        yaxis=dict(title='Position', autorange='reversed', dtick=1),
+        template='plotly_dark',
+        margin=dict(l=40, r=40, t=60, b=40),
+        height=700
+    )
+
+    return dcc.Graph(figure=fig)
+
+def season_pace_frame(results, drivers=None, teams=None):
+    """Long-format season pace of the selected drivers and teams."""
+    rows = []
+    for round_number, result in enumerate(results, start=1):
+        for kind, names in (('drivers', drivers or []), ('teams', teams or [])):
+            for name in names:
+                if name in result[kind]:
+                    rows.append((round_number, result['event'], name, result[kind][name]))
+    return pd.DataFrame(rows, columns=['Round', 'Event', 'Name', 'Pace'])
+
+def create_season_pace_table(results, drivers=None, teams=None):
+    df = season_pace_frame(results, drivers, teams)
+    if len(df) == 0:
+        return html.Div("No season data loaded yet for the selected drivers and teams")
+
+    # One row per event, one column per driver/team
+    display_df = df.pivot(index=['Round', 'Event'], columns='Name', values='Pace').reset_index()
+    display_df.columns = [str(col) for col in display_df.columns]
+
+    return create_styled_table('season-pace-table', display_df, page_size=25)
+
+def create_season_pace_chart(results, season, session_type, palette=None, drivers=None, teams=None, done=True):
+    df = season_pace_frame(results, drivers, teams)
+    if len(df) == 0:
+        return html.Div("Loading season data..." if not done else
+                        "No season data available for the selected drivers and teams")
+
+    fig = go.Figure()
+
+    for name, name_df in df.groupby('Name', sort=False):
+        color = None
+        if palette is not None:
+            color = palette.driver_colors.get(name) or palette.team_colors.get(name)
+
+        fig.add_trace(go.Scatter(
+            x=name_df['Event'],
+            y=name_df['Pace'],
+            mode='lines+markers',
+            name=name,
+            line=dict(color=color),
+            marker=dict(color=color, size=8),
+            hovertemplate=f"{name}<br>%{{x}}<br>+%{{y:.3f}}%<extra></extra>"
+        ))
+
+    title = f'{season} Season Pace ({session_type})'
+    if not done:
+        title += f' - loaded {len(results)} events so far'
+
+    fig.update_layout(
+        title=title,
+        # Keep calendar order even while events arrive out of order
+        xaxis=dict(title='Event', categoryorder='array', categoryarray=[result['event'] for result in results]),
+        yaxis_title='Median Clean Lap vs Session Fastest (%)',
         template='plotly_dark',
         legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
         margin=dict(l=40, r=40, t=60, b=40),
         height=600
     )
 
-    return dcc.Graph(figure=fig)
\ No newline at end of file
+    return dcc.Graph(figure=fig)
+
+def teammate_delta_frame(results):
+    """Long-format teammate qualifying deltas, one row per pair and event."""
+    rows = [dict(pair, Event=result['event'], Round=round_number)
+            for round_number, result in enumerate(results, start=1) for pair in result['pairs']]
+    df = pd.DataFrame(rows, columns=['Round', 'Event', 'Team', 'Driver', 'Teammate', 'Delta'])
+    df['Pair'] = df['Driver'] + ' vs ' + df['Teammate']
+    return df
+
+def create_teammate_h2h_table(results):
+    df = teammate_delta_frame(results)
+    if len(df) == 0:
+        return html.Div("No qualifying data loaded yet")
+
+    # Head-to-head record and deltas per pair over the season
+    summary = df.groupby(['Team', 'Pair'], sort=False).agg(
+        Events=('Delta', 'size'),
+        Ahead=('Delta', lambda delta: int((delta < 0).sum())),
+        Behind=('Delta', lambda delta: int((delta > 0).sum())),
+        MedianDelta=('Delta', 'median'),
+        MeanDelta=('Delta', 'mean'),
+    ).reset_index().round({'MedianDelta': 3, 'MeanDelta': 3})
+    summary = summary.rename(columns={'Ahead': 'First Driver Ahead', 'Behind': 'Teammate Ahead',
+                                      'MedianDelta': 'Median Delta (s)', 'MeanDelta': 'Mean Delta (s)'})
+
+    return create_styled_table('teammate-h2h-table', summary, page_size=15)
+
+def create_teammate_h2h_chart(results, season, done=True):
+    df = teammate_delta_frame(results)
+    if len(df) == 0:
+        return html.Div("Loading qualifying data..." if not done else "No qualifying data available")
+
+    # Pairs x events matrix in a single heatmap trace
+    events = [result['event'] for result in results]
+    pairs = df.drop_duplicates('Pair').sort_values(['Team', 'Pair'])
+    matrix = df.pivot_table(index='Pair', columns='Event', values='Delta', aggfunc='first')
+    matrix = matrix.reindex(index=pairs['Pair'], columns=events)
+
+    # Symmetric color range so "ahead" and "behind" read the same, clipped at one second
+    limit = min(max(float(np.nanmax(np.abs(matrix.to_numpy()))), 0.1), 1.0)
+
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(),
+        x=events,
+        y=(pairs['Pair'] + ' (' + pairs['Team'] + ')').tolist(),
+        colorscale='RdBu_r',
+        zmid=0,
+        zmin=-limit,
+        zmax=limit,
+        colorbar=dict(title='Delta (s)'),
+        hovertemplate='%{y}<br>%{x}<br>Delta: %{z:.3f}s<extra></extra>'
+    ))
+
+    title = f'{season} Qualifying Teammate Head-to-Head'
+    if not done:
+        title += f' - loaded {len(results)} events so far'
+
+    fig.update_layout(
+        title=title,
+        xaxis=dict(title='Event', tickangle=-45),
+        yaxis=dict(title='', autorange='reversed'),
+        template='plotly_dark',
+        margin=dict(l=40, r=40, t=60, b=120),
+        height=max(500, 28 * len(pairs) + 200)
+    )
+
+    return dcc.Graph(figure=fig)
+
+def create_strategy_table(session, drivers=None):
+    stints = session_context(session).stints
+    if drivers:
+        stints = stints[stints['Driver'].isin(drivers)]
+
+    if len(stints) == 0:
+        return html.Div("No stint data available for the selected drivers")
+
+    display_df = stints[['Driver', 'Team', 'Stint', 'Compound', 'FreshTyre', 'StartLap', 'EndLap', 'Laps',
+                         'StartTyreLife']].copy()
+    display_df['FreshTyre'] = display_df['FreshTyre'].map({True: 'New', False: 'Used'}).fillna('Unknown')
+
+    return create_styled_table('strategy-table', display_df)
+
+def create_strategy_chart(session, drivers=None):
+    context = session_context(session)
+    palette = context.palette
+    stints = context.stints
+
+    if drivers:
+        stints = stints[stints['Driver'].isin(drivers)]
+
+    if len(stints) == 0:
+        return html.Div("No stint data available for the selected drivers")
+
+    # Drivers top to bottom in classification order, if the session has one
+    results = session.results
+    if 'Abbreviation' in results.columns and len(results) > 0:
+        classified = [driver for driver in results['Abbreviation'] if driver in set(stints['Driver'])]
+    else:
+        classified = []
+    driver_order = classified + sorted(set(stints['Driver']) - set(classified))
+
+    # All stints in one horizontal bar trace: each bar starts at its first lap
+    # and spans the laps of the stint; used tyres are hatched
+    used = stints['FreshTyre'].eq(False)
+    fig = go.Figure(go.Bar(
+        y=stints['Driver'],
+        x=stints['Laps'],
+        base=stints['StartLap'] - 1,
+        orientation='h',
+        marker=dict(
+            color=[palette.compound(compound) for compound in stints['Compound']],
+            line=dict(color='#1a1a1a', width=1),
+            pattern=dict(shape=np.where(used, '/', ''), fillmode='overlay', fgcolor='#1a1a1a')
+        ),
+        text=stints['Compound'].str[0],
+        textposition='inside',
+        insidetextanchor='middle',
+        customdata=np.column_stack([stints['Compound'], stints['StartLap'], stints['EndLap'],
+                                    np.where(used, 'Used', 'New')]),
+        hovertemplate='%{y} - %{customdata[0]} (%{customdata[3]})<br>'
+                      'Laps %{customdata[1]}-%{customdata[2]}<extra></extra>',
+        showlegend=False
+    ))
+
+    fig.update_layout(
+        title=f'Tyre Strategy - {session.event["EventName"]} {session.name}',
+        xaxis_title='Lap Number',
+        yaxis=dict(title='', categoryorder='array', categoryarray=driver_order, autorange='reversed'),
+        barmode='overlay',
+        template='plotly_dark',
+        margin=dict(l=40, r=40, t=60, b=40),
+        height=max(400, 28 * len(driver_order) + 150)
+    )
+
+    return dcc.Graph(figure=fig)
+
+def create_sector_table(session, drivers=None):
+    bests = session_context(session).sector_bests
+    if drivers:
+        bests = bests[bests.index.isin(drivers)]
+
+    if len(bests) == 0:
+        return html.Div("No sector data available for the selected drivers")
+
+    display_df = bests[['Team', 'Sector1', 'Sector2', 'Sector3', 'TheoreticalBest', 'BestLap', 'Gap']]
+    display_df = display_df.round(3).reset_index()
+    display_df = display_df.rename(columns={'Sector1': 'Best S1', 'Sector2': 'Best S2', 'Sector3': 'Best S3',
+                                            'TheoreticalBest': 'Theoretical Best', 'BestLap': 'Best Lap',
+                                            'Gap': 'Gap to Theoretical'})
+
+    return create_styled_table('sector-table', display_df, page_size=20)
+
+def create_sector_chart(session, drivers=None):
+    bests = session_context(session).sector_bests
+    if drivers:
+        bests = bests[bests.index.isin(drivers)]
+    bests = bests.dropna(subset=['TheoreticalBest'])
+
+    if len(bests) == 0:
+        return html.Div("No sector data available for the selected drivers")
+
+    # Drivers x sectors deltas to the session-best sector, in one heatmap trace
+    deltas = bests[['Sector1Delta', 'Sector2Delta', 'Sector3Delta']].to_numpy()
+    labels = [f"{driver} (+{gap:.3f})" for driver, gap in
+              zip(bests.index, bests['TheoreticalBest'] - bests['TheoreticalBest'].min())]
+
+    fig = go.Figure(go.Heatmap(
+        z=deltas,
+        x=['Sector 1', 'Sector 2', 'Sector 3'],
+        y=labels,
+        colorscale='Viridis',
+        zmin=0,
+        text=np.char.mod('+%.3f', deltas),
+        texttemplate='%{text}',
+        customdata=bests[['Sector1', 'Sector2', 'Sector3']].to_numpy(),
+        colorbar=dict(title='Delta (s)'),
+        hovertemplate='%{y}<br>%{x}: %{customdata:.3f}s (%{text})<extra></extra>'
+    ))
+
+    fig.update_layout(
+        title=f'Sector Deltas to Session Best - {session.event["EventName"]} {session.name}',
+        xaxis=dict(side='top'),
+        yaxis=dict(title='Driver (gap to best theoretical lap)', autorange='reversed'),
+        template='plotly_dark',
+        margin=dict(l=40, r=40, t=100, b=40),
+        height=max(400, 30 * len(bests) + 180)
+    )
+
+    return dcc.Graph(figure=fig)
+
+def create_replay_chart(session):
+    context = session_context(session)
+    palette = context.palette
+
+    first_window = context.replay_window(0)
+    if first_window is None:
+        return html.Div("No position data available for this session")
+
+    # pick_fastest() returns an empty lap (None from fastf1 3.3) when no lap
+    # has a time, e.g. a session stopped before any lap was completed
+    fastest_lap = session.laps.pick_fastest()
+    if fastest_lap is None or pd.isna(fastest_lap.get('Driver')):
+        return html.Div("No lap data available for this session")
+
+    fig = go.Figure()
+
+    # Track outline from the X/Y telemetry of the fastest lap, like the track map.
+    # It is always trace 0 (empty without telemetry), so cars start at trace 1.
+    lap_telemetry = context.fastest_lap_telemetry(fastest_lap['Driver'])
+    telemetry = lap_telemetry[1] if lap_telemetry is not None else pd.DataFrame({'X': [], 'Y': []})
+    fig.add_trace(go.Scatter(
+        x=telemetry['X'],
+        y=telemetry['Y'],
+        mode='lines',
+        line=dict(color='#555555', width=8),
+        name='Track',
+        hoverinfo='skip',
+        showlegend=False
+    ))
+
+    # One single-point trace per car; the replay moves them with extendData
+    for i, driver in enumerate(first_window['drivers']):
+        fig.add_trace(go.Scatter(
+            x=[first_window['x'][i][0]],
+            y=[first_window['y'][i][0]],
+            mode='markers+text',
+            name=driver,
+            text=[driver],
+            textposition='top center',
+            marker=dict(size=12, color=palette.driver_colors.get(driver), line=dict(color='white', width=1)),
+            hovertemplate=f"{driver}<extra></extra>"
+        ))
+
+    fig.update_layout(
+        title=f'Replay - {session.event["EventName"]} {session.name}',
+        template='plotly_dark',
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False, scaleanchor='x', scaleratio=1),
+        # Keep zoom and legend selections while the cars move
+        uirevision='replay',
+        margin=dict(l=20, r=20, t=60, b=20),
+        height=700
+    )
+
+    return dcc.Graph(id='replay-graph', figure=fig)
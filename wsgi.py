@@ -0,0 +1,58 @@
+"""Production entry point for the F1 dashboard.
+
+Serve with gunicorn (see gunicorn.conf.py):
+
+    gunicorn -c gunicorn.conf.py
+
+The app, its heavy dependencies and any warmed sessions are loaded once in
+the gunicorn master before it forks its workers (preload_app), so the
+workers share those pages copy-on-write instead of each loading them.
+
+Environment variables:
+    F1_WARM_SESSIONS: Sessions to load before accepting traffic, separated by
+        ';', each as 'season:event:session', e.g.
+        '2023:Bahrain Grand Prix:R;2023:Monaco Grand Prix:Q'
+"""
+import os
+
+# Heavy imports, loaded once in the master
+import numpy
+import pandas
+import plotly.graph_objects
+import fastf1
+import fastf1.plotting
+
+from app import app
+from utils.data_loader import load_session
+from utils.session_context import session_context
+
+# WSGI callable for gunicorn and other WSGI servers
+server = app.server
+
+
+def parse_warm_sessions(spec):
+    """Parse F1_WARM_SESSIONS into (season, event, session_type) tuples."""
+    sessions = []
+    for entry in filter(None, (entry.strip() for entry in spec.split(';'))):
+        try:
+            season, event, session_type = (part.strip() for part in entry.split(':'))
+            sessions.append((int(season), event, session_type))
+        except ValueError:
+            print(f"Ignoring invalid warm session '{entry}', expected 'season:event:session'")
+    return sessions
+
+
+def warm_sessions(sessions):
+    """Load sessions and their shared per-session data up front."""
+    for season, event, session_type in sessions:
+        try:
+            session = load_session(season, event, session_type)
+            context = session_context(session)
+            context.lap_frame
+            context.palette
+            print(f"Warmed {season} {event} {session_type}")
+        except Exception as e:
+            print(f"Error warming {season} {event} {session_type}: {e}")
+
+
+warm_sessions(parse_warm_sessions(os.environ.get('F1_WARM_SESSIONS', '')))